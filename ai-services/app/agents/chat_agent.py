@@ -8,14 +8,23 @@ Chat Agent — LangGraph 多步工作流
 
 from __future__ import annotations
 
-import json
 import operator
-from typing import Annotated, TypedDict
+import re
+from typing import TYPE_CHECKING, Annotated, TypedDict
 
 from langchain_core.messages import HumanMessage, SystemMessage
-from langgraph.graph import StateGraph, END
+from pydantic import BaseModel, field_validator
 
+from app.core.config import get_settings
+from app.core.graphs import lazy_graph
 from app.core.llm import get_chat_llm
+from app.core.resilience import mark_degraded, should_degrade
+from app.core.semantic_cache import SemanticCache, profile_traits
+from app.core.streaming import LineItemParser, collect_items
+from app.core.structured import clamp, invoke_structured
+
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
 
 
 # ── State ──────────────────────────────────────────────
@@ -36,30 +45,121 @@ class ChatAgentState(TypedDict):
     error: str
 
 
-# ── Nodes ──────────────────────────────────────────────
+# ── Schemas ────────────────────────────────────────────
 
-async def recognize_emotion(state: ChatAgentState) -> dict:
-    """节点1: 用 DeepSeek 识别聊天上下文中的情绪状态"""
-    llm = get_chat_llm()
-    try:
-        resp = await llm.ainvoke([
+EMOTIONS = ("happy", "sad", "angry", "anxious", "neutral", "excited", "loving", "confused")
+
+
+class EmotionResult(BaseModel):
+    """情绪识别: 情绪必须是约定的类型之一，置信度截断到 0-1"""
+    emotion: str
+    confidence: float = 0.5
+
+    @field_validator("emotion", mode="before")
+    @classmethod
+    def _emotion(cls, value):
+        emotion = str(value or "").strip().lower()
+        if emotion not in EMOTIONS:
+            raise ValueError(f"emotion 必须是 {', '.join(EMOTIONS)} 之一")
+        return emotion
+
+    @field_validator("confidence", mode="before")
+    @classmethod
+    def _confidence(cls, value):
+        return clamp(value, 0.0, 1.0, 0.5)
+
+
+# 近重复语义缓存: 上下文仅有空白、表情、语气词差异时复用已有结果，不再调用 LLM
+_emotion_caches = {node: SemanticCache(node) for node in ("recognize_emotion", "analyze_emotion")}
+_strategy_cache = SemanticCache("select_strategy")
+
+
+def _latest_line(text: str) -> str | None:
+    """多行上下文的最后一条消息；命中还要求它足够相似，避免只新增一条消息就复用上一条的情绪"""
+    lines = [line for line in text.strip().splitlines() if line.strip()]
+    return lines[-1] if len(lines) > 1 else None
+
+
+async def detect_emotion(text: str, label: str, node: str, scope: dict | None = None) -> EmotionResult:
+    """情绪识别的公共调用，Chat Agent 节点与独立情绪分析接口共用
+
+    scope 为缓存命中必须一致的条件（关系阶段、画像特质）。
+    情绪只是辅助信号: 修复后仍无法解析或上游调用失败时回退为 neutral，不中断主流程。
+    """
+    async def _detect() -> dict:
+        result = await invoke_structured(get_chat_llm(), [
             SystemMessage(content="你是情绪分析专家。分析文本情绪，返回纯 JSON。"),
             HumanMessage(content=(
-                f"分析以下聊天上下文中对方最新消息的情绪：\n\n{state['context']}\n\n"
+                f"{label}：\n\n{text}\n\n"
                 '返回格式: {"emotion": "类型", "confidence": 0.0-1.0}\n'
-                "情绪类型: happy, sad, angry, anxious, neutral, excited, loving, confused"
+                f"情绪类型: {', '.join(EMOTIONS)}"
             )),
-        ])
-        content = (resp.content or "").strip()
-        if content.startswith("```"):
-            content = content.split("\n", 1)[1].rsplit("```", 1)[0].strip()
-        result = json.loads(content)
-        return {
-            "emotion": result.get("emotion", "neutral"),
-            "emotion_confidence": result.get("confidence", 0.5),
-        }
+        ], EmotionResult, node, repair_llm=get_chat_llm)
+        return result.model_dump()
+
+    try:
+        cache = _emotion_caches.get(node)
+        if cache is None:
+            return EmotionResult(**await _detect())
+        return EmotionResult(**await cache.get_or_compute(
+            scope or {}, text, _detect,
+            focus=_latest_line(text), same=lambda a, b: a["emotion"] == b["emotion"],
+        ))
     except Exception:
-        return {"emotion": "neutral", "emotion_confidence": 0.5}
+        return EmotionResult(emotion="neutral", confidence=0.5)
+
+
+# ── Degraded Fallbacks ─────────────────────────────────
+
+DEFAULT_SUGGESTIONS = ["你好呀，最近怎么样？", "今天过得开心吗？", "有什么想聊的吗？"]
+
+# 降级时按对方情绪、其次按关系阶段查表选择策略，替代 select_strategy 的 LLM 调用
+_EMOTION_STRATEGIES = {
+    "sad": "共情倾听: 先理解对方感受再回应",
+    "anxious": "共情倾听: 先理解对方感受再回应",
+    "angry": "共情倾听: 先理解对方感受再回应",
+    "confused": "真诚关心: 表达真实的关心和好奇",
+    "happy": "分享互动: 分享自己的经历引发共鸣",
+    "excited": "温暖鼓励: 给予正面支持和鼓励",
+}
+_STAGE_STRATEGIES = {
+    "INITIAL": "轻松幽默: 用幽默化解紧张，拉近距离",
+    "GETTING_TO_KNOW": "真诚关心: 表达真实的关心和好奇",
+    "DATING": "分享互动: 分享自己的经历引发共鸣",
+    "COMMITTED": "深度对话: 引导有深度的价值观交流",
+}
+
+# 本地安全过滤（仅降级时使用）: 明显不当的措辞，以及初识阶段过度亲密的称呼。
+# 只收录几乎不会出现在正常回复中的完整说法，避免「滚烫」「早点上床休息」这类误伤
+_UNSAFE_RE = re.compile(r"滚开|滚蛋|给我滚|闭嘴|傻[逼瓜]|蠢货|神经病|约炮|开房|裸照|不回就拉黑|除了我没人")
+_INTIMATE_RE = re.compile(r"宝贝|亲爱的|老婆|老公|想你|爱你|抱抱|亲亲")
+
+
+def lookup_strategy(relationship_stage: str, emotion: str) -> str:
+    return _EMOTION_STRATEGIES.get(emotion) or _STAGE_STRATEGIES.get(relationship_stage, "真诚关心: 表达真实的关心和好奇")
+
+
+def local_safety_filter(candidates: list[str], relationship_stage: str) -> list[str]:
+    """不调用 LLM 的规则过滤，LLM 审核节点被降级时使用"""
+    safe = []
+    for text in candidates:
+        if _UNSAFE_RE.search(text):
+            continue
+        if relationship_stage == "INITIAL" and _INTIMATE_RE.search(text):
+            continue
+        safe.append(text)
+    return safe
+
+
+# ── Nodes ──────────────────────────────────────────────
+
+async def recognize_emotion(state: ChatAgentState) -> dict:
+    """节点1: 用 DeepSeek 识别聊天上下文中的情绪状态"""
+    result = await detect_emotion(
+        state["context"], "分析以下聊天上下文中对方最新消息的情绪", "recognize_emotion",
+        scope={"stage": state["relationship_stage"], **profile_traits(state.get("user_profile"))},
+    )
+    return {"emotion": result.emotion, "emotion_confidence": result.confidence}
 
 
 async def build_context(state: ChatAgentState) -> dict:
@@ -103,34 +203,51 @@ async def build_context(state: ChatAgentState) -> dict:
 
 
 async def select_strategy(state: ChatAgentState) -> dict:
-    """节点3: 根据关系阶段和情绪选择沟通策略"""
-    llm = get_chat_llm()
-    resp = await llm.ainvoke([
-        SystemMessage(content=(
-            "你是资深恋爱心理顾问。根据关系阶段和对方的情绪状态，"
-            "选择最合适的沟通策略。只返回策略名称和一句话描述，不要多余内容。"
-        )),
-        HumanMessage(content=(
-            f"关系阶段: {state['relationship_stage']}\n"
-            f"对方情绪: {state['emotion']}\n"
-            f"用户画像: {state.get('user_profile', {})}\n\n"
-            "可选策略:\n"
-            "- 轻松幽默: 用幽默化解紧张，拉近距离\n"
-            "- 真诚关心: 表达真实的关心和好奇\n"
-            "- 共情倾听: 先理解对方感受再回应\n"
-            "- 分享互动: 分享自己的经历引发共鸣\n"
-            "- 温暖鼓励: 给予正面支持和鼓励\n"
-            "- 深度对话: 引导有深度的价值观交流\n\n"
-            "选择最合适的策略并说明原因（一行即可）:"
-        )),
-    ])
-    return {"strategy": (resp.content or "真诚关心").strip()}
+    """节点3: 根据关系阶段和情绪选择沟通策略；降级时查表"""
+    if should_degrade("select_strategy", get_settings().deepseek_chat_model):
+        mark_degraded("select_strategy")
+        return {"strategy": lookup_strategy(state["relationship_stage"], state["emotion"])}
+
+    async def _select() -> str:
+        llm = get_chat_llm()
+        resp = await llm.ainvoke([
+            SystemMessage(content=(
+                "你是资深恋爱心理顾问。根据关系阶段和对方的情绪状态，"
+                "选择最合适的沟通策略。只返回策略名称和一句话描述，不要多余内容。"
+            )),
+            HumanMessage(content=(
+                f"关系阶段: {state['relationship_stage']}\n"
+                f"对方情绪: {state['emotion']}\n"
+                f"用户画像: {state.get('user_profile', {})}\n\n"
+                "可选策略:\n"
+                "- 轻松幽默: 用幽默化解紧张，拉近距离\n"
+                "- 真诚关心: 表达真实的关心和好奇\n"
+                "- 共情倾听: 先理解对方感受再回应\n"
+                "- 分享互动: 分享自己的经历引发共鸣\n"
+                "- 温暖鼓励: 给予正面支持和鼓励\n"
+                "- 深度对话: 引导有深度的价值观交流\n\n"
+                "选择最合适的策略并说明原因（一行即可）:"
+            )),
+        ])
+        return (resp.content or "真诚关心").strip()
+
+    # 策略只取决于阶段、情绪和画像: 前两者与画像特质须一致，画像其余内容近似即可复用
+    strategy = await _strategy_cache.get_or_compute(
+        {"stage": state["relationship_stage"], "emotion": state["emotion"], **profile_traits(state.get("user_profile"))},
+        str(state.get("user_profile", {})), _select, same=_same_strategy,
+    )
+    return {"strategy": strategy}
+
+
+def _same_strategy(a: str, b: str) -> bool:
+    """抽检时只比较策略名称，说明文字不同不算误命中"""
+    return re.split(r"[:：]", a, maxsplit=1)[0].strip() == re.split(r"[:：]", b, maxsplit=1)[0].strip()
 
 
 async def generate_replies(state: ChatAgentState) -> dict:
-    """节点4: 用 DeepSeek 生成候选回复"""
+    """节点4: 用 DeepSeek 流式生成候选回复，解析出 5 条后即停止生成"""
     llm = get_chat_llm()
-    resp = await llm.ainvoke([
+    cleaned = await collect_items(llm, [
         SystemMessage(content=(
             "你是 LinkSoul AI 恋爱助手。根据沟通策略和上下文，"
             "生成3条自然、真诚的回复建议。\n\n"
@@ -144,27 +261,22 @@ async def generate_replies(state: ChatAgentState) -> dict:
             f"沟通策略: {state['strategy']}\n\n"
             f"{state['enriched_context']}"
         )),
-    ])
-
-    content = resp.content or ""
-    lines = [ln.strip() for ln in content.strip().split("\n") if ln.strip()]
-    cleaned = []
-    for line in lines:
-        for prefix in ["1.", "2.", "3.", "1、", "2、", "3、", "-", "•", "*"]:
-            if line.startswith(prefix):
-                line = line[len(prefix):].strip()
-                break
-        if line:
-            cleaned.append(line)
-    return {"raw_suggestions": cleaned[:5]}
+    ], LineItemParser(), limit=5, name="chat_replies")
+    return {"raw_suggestions": cleaned}
 
 
 async def safety_filter(state: ChatAgentState) -> dict:
-    """节点5: 安全过滤 — 排除不当内容"""
-    llm = get_chat_llm()
+    """节点5: 安全过滤 — 排除不当内容；降级时只做本地规则过滤"""
+    if should_degrade("safety_filter", get_settings().deepseek_chat_model):
+        mark_degraded("safety_filter")
+        candidates = local_safety_filter(state.get("raw_suggestions", []), state["relationship_stage"])
+        return {"suggestions": candidates[:3] or list(DEFAULT_SUGGESTIONS)}
+
     candidates = state.get("raw_suggestions", [])
     if not candidates:
-        return {"suggestions": ["你好呀，最近怎么样？", "今天过得开心吗？", "有什么想聊的吗？"]}
+        return {"suggestions": list(DEFAULT_SUGGESTIONS)}
+
+    llm = get_chat_llm()
 
     numbered = "\n".join(f"{i+1}. {s}" for i, s in enumerate(candidates))
     resp = await llm.ainvoke([
@@ -195,6 +307,8 @@ async def safety_filter(state: ChatAgentState) -> dict:
 # ── Graph ──────────────────────────────────────────────
 
 def build_chat_agent_graph() -> StateGraph:
+    from langgraph.graph import StateGraph, END
+
     graph = StateGraph(ChatAgentState)
 
     graph.add_node("recognize_emotion", recognize_emotion)
@@ -213,7 +327,7 @@ def build_chat_agent_graph() -> StateGraph:
     return graph
 
 
-_chat_agent = build_chat_agent_graph().compile()
+_chat_agent = lazy_graph("chat_agent", build_chat_agent_graph)
 
 
 async def run_chat_agent(
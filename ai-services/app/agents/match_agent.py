@@ -2,20 +2,39 @@
 Match Agent — LangGraph 多步工作流
 
 流程: 画像分析 → 兼容性评估(DeepSeek R1) → 匹配理由生成
+（已加载且误差在上限内的蒸馏模型替代前两步，见 app.services.compatibility_model）
 
 使用 DeepSeek R1 (deepseek-reasoner) 做深度兼容性推理，
 使用 DeepSeek V3 (deepseek-chat) 生成用户可读的匹配理由。
+
+分级模式（tiered）: 先按画像规则本地预估分数，低于 match_prescreen_min_score 的配对直接用模板理由结束；
+其余进入画像分析与 R1 评估，R1 综合分低于 match_narrative_min_score 时同样用模板理由，不再调用 V3 生成文案。
 """
 
 from __future__ import annotations
 
+import asyncio
 import json
-from typing import TypedDict
+import logging
+import random
+import time
+from typing import TYPE_CHECKING, TypedDict
 
 from langchain_core.messages import HumanMessage, SystemMessage
-from langgraph.graph import StateGraph, END
+from pydantic import BaseModel, field_validator, model_validator
 
+from app.core import metrics, tracing
+from app.core.config import get_settings
+from app.core.graphs import lazy_graph
 from app.core.llm import get_chat_llm, get_reasoner_llm
+from app.core.resilience import overloaded
+from app.core.structured import StructuredOutputError, clamp, invoke_structured
+from app.services.compatibility_model import log_judgment, record_shadow, serving_model
+
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
+
+logger = logging.getLogger(__name__)
 
 
 # ── State ──────────────────────────────────────────────
@@ -31,9 +50,57 @@ class MatchAgentState(TypedDict):
     # 输出
     match_reason: str
     detailed_report: str
+    # 分级模式下结束的层级: prescreen | scored | full
+    tier: str
     error: str
 
 
+# ── Schemas ────────────────────────────────────────────
+
+class CompatibilityItem(BaseModel):
+    score: float
+    reason: str = ""
+
+    @model_validator(mode="before")
+    @classmethod
+    def _bare_score(cls, value):
+        return value if isinstance(value, dict) else {"score": value}
+
+    @field_validator("score", mode="before")
+    @classmethod
+    def _score(cls, value):
+        return clamp(value, 0.0, 100.0, 60.0)
+
+    @field_validator("reason", mode="before")
+    @classmethod
+    def _reason(cls, value):
+        return str(value or "")
+
+
+class CompatibilityResult(BaseModel):
+    """兼容性评估: 综合分必填（兼容 {"score": 分数} 写法），缺失的维度不输出"""
+    attachment_compatibility: CompatibilityItem | None = None
+    communication_compatibility: CompatibilityItem | None = None
+    personality_compatibility: CompatibilityItem | None = None
+    lifestyle_compatibility: CompatibilityItem | None = None
+    overall_score: float
+    key_insight: str = ""
+
+    @field_validator("overall_score", mode="before")
+    @classmethod
+    def _overall(cls, value):
+        if isinstance(value, dict):
+            value = value.get("score")
+        if value is None:
+            raise ValueError("overall_score 必须是 0-100 的数字")
+        return clamp(value, 0.0, 100.0, 60.0)
+
+    @field_validator("key_insight", mode="before")
+    @classmethod
+    def _insight(cls, value):
+        return str(value or "")
+
+
 # ── Nodes ──────────────────────────────────────────────
 
 async def analyze_profiles(state: MatchAgentState) -> dict:
@@ -76,9 +143,9 @@ async def analyze_profiles(state: MatchAgentState) -> dict:
 
 async def evaluate_compatibility(state: MatchAgentState) -> dict:
     """节点2: 用 DeepSeek R1 做深度兼容性推理评估"""
-    llm = get_reasoner_llm()
+    llm = get_reasoner_llm("evaluate_compatibility")
 
-    resp = await llm.ainvoke([
+    messages = [
         HumanMessage(content=(
             "你是关系心理学专家。基于以下两人的画像分析结果，"
             "进行深度兼容性推理评估。\n\n"
@@ -93,26 +160,25 @@ async def evaluate_compatibility(state: MatchAgentState) -> dict:
             '  "key_insight": "一句话核心洞察"\n'
             "}"
         )),
-    ])
-
-    content = (resp.content or "").strip()
-    if content.startswith("```"):
-        content = content.split("\n", 1)[1].rsplit("```", 1)[0].strip()
+    ]
 
     try:
-        scores = json.loads(content)
-        overall = scores.get("overall_score", 60)
-        if isinstance(overall, dict):
-            overall = overall.get("score", 60)
+        scores = await invoke_structured(
+            llm, messages, CompatibilityResult, "evaluate_compatibility", repair_llm=get_chat_llm,
+        )
+    except StructuredOutputError as exc:
         return {
-            "compatibility_scores": scores,
-            "overall_score": float(overall),
-        }
-    except (json.JSONDecodeError, ValueError):
-        return {
-            "compatibility_scores": {"raw_analysis": content},
+            "compatibility_scores": {"raw_analysis": exc.raw},
             "overall_score": 60.0,
         }
+    result = scores.model_dump(exclude_none=True)
+    # 记入蒸馏数据集，供训练本地兼容性模型；已加载模型时同时校验其漂移
+    await log_judgment(state["user_a_profile"], state["user_b_profile"], result)
+    record_shadow(state["user_a_profile"], state["user_b_profile"], result)
+    return {
+        "compatibility_scores": result,
+        "overall_score": scores.overall_score,
+    }
 
 
 async def generate_match_reason(state: MatchAgentState) -> dict:
@@ -148,32 +214,197 @@ async def generate_match_reason(state: MatchAgentState) -> dict:
     }
 
 
+# ── Distilled Model ────────────────────────────────────
+
+_shadows: set[asyncio.Task] = set()
+
+
+async def _shadow(state: MatchAgentState) -> None:
+    """影子运行画像分析与 R1 评估；evaluate_compatibility 会写入数据集并与本地模型比较"""
+    try:
+        await evaluate_compatibility({**state, **await analyze_profiles(state)})
+    except Exception:
+        logger.warning("compatibility shadow run failed", exc_info=True)
+
+
+async def local_compatibility(state: MatchAgentState) -> dict:
+    """用蒸馏的本地模型替代画像分析与 R1 评估；按 compat_shadow_rate 抽样后台运行 R1 影子"""
+    model = serving_model()
+    if model is None:
+        # 路由后模型因漂移被停用: 本次仍走 R1
+        return await evaluate_compatibility({**state, **await analyze_profiles(state)})
+    scores = model.predict(state["user_a_profile"], state["user_b_profile"])
+    metrics.incr("compat_model.served")
+    tracing.annotate(compat_model=model.version)
+    if random.random() < get_settings().compat_shadow_rate and not overloaded():
+        task = asyncio.create_task(_shadow(state))
+        _shadows.add(task)
+        task.add_done_callback(_shadows.discard)
+    return {"compatibility_scores": scores, "overall_score": scores["overall_score"]}
+
+
+def _route_compatibility(state: MatchAgentState) -> str:
+    return "local_compatibility" if serving_model() is not None else "analyze_profiles"
+
+
+# ── Tiered Mode ────────────────────────────────────────
+
+DIMENSION_LABELS = {
+    "attachment_compatibility": "依恋模式",
+    "communication_compatibility": "沟通风格",
+    "personality_compatibility": "性格特质",
+    "lifestyle_compatibility": "生活方式",
+}
+
+# 依恋类型两两组合的基础分（对称）；焦虑-回避组合容易陷入追逃循环
+_ATTACHMENT_PAIRS = {
+    ("SECURE", "SECURE"): 90, ("SECURE", "ANXIOUS"): 75, ("SECURE", "AVOIDANT"): 70, ("SECURE", "FEARFUL"): 65,
+    ("ANXIOUS", "ANXIOUS"): 55, ("ANXIOUS", "AVOIDANT"): 35, ("ANXIOUS", "FEARFUL"): 45,
+    ("AVOIDANT", "AVOIDANT"): 50, ("AVOIDANT", "FEARFUL"): 40, ("FEARFUL", "FEARFUL"): 40,
+}
+_COMMUNICATION_PAIRS = {
+    ("DIRECT", "DIRECT"): 80, ("DIRECT", "ANALYTICAL"): 75, ("DIRECT", "EMOTIONAL"): 65, ("DIRECT", "INDIRECT"): 50,
+    ("INDIRECT", "INDIRECT"): 80, ("INDIRECT", "EMOTIONAL"): 70, ("INDIRECT", "ANALYTICAL"): 60,
+    ("EMOTIONAL", "EMOTIONAL"): 80, ("EMOTIONAL", "ANALYTICAL"): 55, ("ANALYTICAL", "ANALYTICAL"): 80,
+}
+_WEIGHTS = {
+    "attachment_compatibility": 0.35,
+    "communication_compatibility": 0.25,
+    "personality_compatibility": 0.25,
+    "lifestyle_compatibility": 0.15,
+}
+
+
+def _pair_score(table: dict, a, b) -> float:
+    return float(table.get((a, b)) or table.get((b, a)) or 60)
+
+
+def prescreen_scores(user_a: dict, user_b: dict) -> dict:
+    """按画像规则预估四个维度与综合分，格式与 CompatibilityResult 一致（缺失信息按中性 60 分）"""
+    tags_a, tags_b = set(user_a.get("personalityTags") or []), set(user_b.get("personalityTags") or [])
+    city_a, city_b = user_a.get("city"), user_b.get("city")
+    dims = {
+        "attachment_compatibility": _pair_score(
+            _ATTACHMENT_PAIRS, user_a.get("attachmentType"), user_b.get("attachmentType")),
+        "communication_compatibility": _pair_score(
+            _COMMUNICATION_PAIRS, user_a.get("communicationStyle"), user_b.get("communicationStyle")),
+        "personality_compatibility": (
+            50 + 50 * len(tags_a & tags_b) / len(tags_a | tags_b) if tags_a and tags_b else 60.0
+        ),
+        "lifestyle_compatibility": (80.0 if city_a == city_b else 55.0) if city_a and city_b else 60.0,
+    }
+    overall = sum(dims[key] * weight for key, weight in _WEIGHTS.items())
+    return {
+        **{key: {"score": round(score, 1), "reason": "画像规则预估"} for key, score in dims.items()},
+        "overall_score": round(overall, 1),
+    }
+
+
+async def prescreen(state: MatchAgentState) -> dict:
+    """分级第一层: 本地规则预估，不调用 LLM"""
+    scores = prescreen_scores(state["user_a_profile"], state["user_b_profile"])
+    return {"compatibility_scores": scores, "overall_score": scores["overall_score"], "tier": "prescreen"}
+
+
+async def template_reason(state: MatchAgentState) -> dict:
+    """低分配对的模板理由，替代 generate_match_reason 的 V3 调用"""
+    scores = state.get("compatibility_scores", {})
+    dims = {key: scores[key]["score"] for key in DIMENSION_LABELS if isinstance(scores.get(key), dict)}
+    strongest = DIMENSION_LABELS[max(dims, key=dims.get)] if dims else "性格"
+    report = "；".join(f"{DIMENSION_LABELS[key]} {score:.0f} 分" for key, score in dims.items())
+    insight = scores.get("key_insight")
+    return {
+        "match_reason": f"你们在{strongest}上有一些共同点，可以先从轻松的话题聊起，慢慢了解彼此。",
+        "detailed_report": f"{insight}\n{report}" if insight else report,
+    }
+
+
+def _after_prescreen(state: MatchAgentState) -> str:
+    if state["overall_score"] >= get_settings().match_prescreen_min_score:
+        return _route_compatibility(state)
+    return "template_reason"
+
+
+def _after_compatibility(state: MatchAgentState) -> str:
+    if state["overall_score"] >= get_settings().match_narrative_min_score:
+        return "generate_match_reason"
+    return "template_reason"
+
+
+def _with_tier(node, tier: str):
+    """分级图中的节点完成后记录所达层级"""
+    async def run(state: MatchAgentState) -> dict:
+        return {**await node(state), "tier": tier}
+    return run
+
+
 # ── Graph ──────────────────────────────────────────────
 
 def build_match_agent_graph() -> StateGraph:
+    from langgraph.graph import StateGraph, END
+
     graph = StateGraph(MatchAgentState)
 
     graph.add_node("analyze_profiles", analyze_profiles)
     graph.add_node("evaluate_compatibility", evaluate_compatibility)
+    graph.add_node("local_compatibility", local_compatibility)
     graph.add_node("generate_match_reason", generate_match_reason)
 
-    graph.set_entry_point("analyze_profiles")
+    graph.set_conditional_entry_point(_route_compatibility, ["analyze_profiles", "local_compatibility"])
     graph.add_edge("analyze_profiles", "evaluate_compatibility")
     graph.add_edge("evaluate_compatibility", "generate_match_reason")
+    graph.add_edge("local_compatibility", "generate_match_reason")
+    graph.add_edge("generate_match_reason", END)
+
+    return graph
+
+
+def build_tiered_match_agent_graph() -> StateGraph:
+    """分级模式: 规则预估 →（达到阈值）画像分析 → R1 评估 →（达到阈值）V3 匹配理由，未达阈值处用模板理由结束"""
+    from langgraph.graph import StateGraph, END
+
+    graph = StateGraph(MatchAgentState)
+
+    graph.add_node("prescreen", prescreen)
+    graph.add_node("analyze_profiles", analyze_profiles)
+    graph.add_node("evaluate_compatibility", _with_tier(evaluate_compatibility, "scored"))
+    graph.add_node("local_compatibility", _with_tier(local_compatibility, "scored"))
+    graph.add_node("generate_match_reason", _with_tier(generate_match_reason, "full"))
+    graph.add_node("template_reason", template_reason)
+
+    graph.set_entry_point("prescreen")
+    graph.add_conditional_edges(
+        "prescreen", _after_prescreen, ["analyze_profiles", "local_compatibility", "template_reason"],
+    )
+    graph.add_edge("analyze_profiles", "evaluate_compatibility")
+    for node in ("evaluate_compatibility", "local_compatibility"):
+        graph.add_conditional_edges(node, _after_compatibility, ["generate_match_reason", "template_reason"])
     graph.add_edge("generate_match_reason", END)
+    graph.add_edge("template_reason", END)
 
     return graph
 
 
-_match_agent = build_match_agent_graph().compile()
+_match_agent = lazy_graph("match_agent", build_match_agent_graph, checkpoint=True)
+_tiered_match_agent = lazy_graph("match_agent_tiered", build_tiered_match_agent_graph, checkpoint=True)
+
+MATCH_AGENT_MODES = ("full", "tiered")
 
 
 async def run_match_agent(
     user_a_profile: dict,
     user_b_profile: dict,
+    mode: str | None = None,
 ) -> dict:
-    """运行匹配分析 Agent"""
-    result = await _match_agent.ainvoke({
+    """运行匹配分析 Agent
+
+    mode: "full"（画像分析→R1 评估→V3 匹配理由）或 "tiered"（按分数分级，低分配对提前结束），
+    默认取 Settings.match_agent_mode。结果的 tier 字段为结束的层级，full 模式恒为 full。
+    """
+    mode = mode or get_settings().match_agent_mode
+    agent = _tiered_match_agent if mode == "tiered" else _match_agent
+    started = time.perf_counter()
+    result = await agent.ainvoke({
         "user_a_profile": user_a_profile,
         "user_b_profile": user_b_profile,
         "profile_analysis": "",
@@ -181,6 +412,12 @@ async def run_match_agent(
         "overall_score": 0.0,
         "match_reason": "",
         "detailed_report": "",
+        "tier": "full",
         "error": "",
     })
+    tier = result.get("tier", "full")
+    metrics.incr("match.requests")
+    metrics.incr(f"match.tier.{tier}")
+    metrics.observe(f"match.tier.{tier}", time.perf_counter() - started)
+    tracing.annotate(match_tier=tier)
     return result
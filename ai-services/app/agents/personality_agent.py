@@ -8,13 +8,20 @@ Personality Agent — LangGraph 多步工作流
 
 from __future__ import annotations
 
-import json
-from typing import TypedDict
+from itertools import chain
+from typing import TYPE_CHECKING, TypedDict
 
+import numpy as np
 from langchain_core.messages import HumanMessage, SystemMessage
-from langgraph.graph import StateGraph, END
 
-from app.core.llm import get_chat_llm, get_reasoner_llm
+from app.core.config import get_settings
+from app.core.graphs import lazy_graph
+from app.core.llm import get_reasoner_llm
+from app.core.resilience import mark_degraded, should_degrade
+from app.services.personality_tags import get_or_generate_tags, tag_bucket
+
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
 
 
 class PersonalityState(TypedDict):
@@ -38,16 +45,23 @@ TRAIT_QUESTIONS = {
     "q15", "q16", "q17", "q18", "q19", "q20",
 }
 
+ANXIETY_KEYS = ["q1", "q2", "q3", "q4"]
+AVOIDANCE_KEYS = ["q5", "q6", "q7", "q8"]
+DIRECTNESS_KEYS = ["q9", "q10"]
+EMOTIONALITY_KEYS = ["q11", "q12"]
+ANALYTICITY_KEYS = ["q13", "q14"]
+
+ATTACHMENT_TYPES = np.array(["SECURE", "ANXIOUS", "AVOIDANT", "FEARFUL"])
+# 顺序与 score_communication 中 max() 的平局优先级一致
+COMMUNICATION_STYLES = np.array(["DIRECT", "EMOTIONAL", "ANALYTICAL", "INDIRECT"])
+
 
 def score_attachment(state: PersonalityState) -> dict:
     """基于 ECR-R 简化量表计算依恋维度分数"""
     answers = state["answers"]
 
-    anxiety_keys = ["q1", "q2", "q3", "q4"]
-    avoidance_keys = ["q5", "q6", "q7", "q8"]
-
-    anxiety = sum(answers.get(k, 3) for k in anxiety_keys) / len(anxiety_keys)
-    avoidance = sum(answers.get(k, 3) for k in avoidance_keys) / len(avoidance_keys)
+    anxiety = sum(answers.get(k, 3) for k in ANXIETY_KEYS) / len(ANXIETY_KEYS)
+    avoidance = sum(answers.get(k, 3) for k in AVOIDANCE_KEYS) / len(AVOIDANCE_KEYS)
 
     if anxiety <= 3 and avoidance <= 3:
         attachment_type = "SECURE"
@@ -71,9 +85,9 @@ def score_communication(state: PersonalityState) -> dict:
     """计算沟通风格维度"""
     answers = state["answers"]
 
-    directness = (answers.get("q9", 3) + answers.get("q10", 3)) / 2
-    emotionality = (answers.get("q11", 3) + answers.get("q12", 3)) / 2
-    analyticity = (answers.get("q13", 3) + answers.get("q14", 3)) / 2
+    directness = sum(answers.get(k, 3) for k in DIRECTNESS_KEYS) / len(DIRECTNESS_KEYS)
+    emotionality = sum(answers.get(k, 3) for k in EMOTIONALITY_KEYS) / len(EMOTIONALITY_KEYS)
+    analyticity = sum(answers.get(k, 3) for k in ANALYTICITY_KEYS) / len(ANALYTICITY_KEYS)
 
     scores = {
         "DIRECT": directness,
@@ -93,53 +107,82 @@ def score_communication(state: PersonalityState) -> dict:
     }
 
 
-async def generate_profile(state: PersonalityState) -> dict:
-    """使用 DeepSeek V3 生成性格标签"""
-    llm = get_chat_llm()
-    answers = state["answers"]
+_SCORED_KEYS = ANXIETY_KEYS + AVOIDANCE_KEYS + DIRECTNESS_KEYS + EMOTIONALITY_KEYS + ANALYTICITY_KEYS
 
-    trait_answers = {k: answers.get(k, 3) for k in ["q15", "q16", "q17", "q18", "q19", "q20"]}
 
-    prompt = f"""你是一位专业的心理分析师。根据以下用户的性格测试数据，生成 5-8 个中文性格标签。
+def score_answers_batch(answers_list: list[dict]) -> dict[str, np.ndarray]:
+    """向量化批量评分：一次计算所有用户的依恋与沟通维度，结果与逐个评分一致"""
+    defaults = [3] * len(_SCORED_KEYS)
+    matrix = np.fromiter(
+        chain.from_iterable(map(answers.get, _SCORED_KEYS, defaults) for answers in answers_list),
+        dtype=np.float64,
+        count=len(answers_list) * len(_SCORED_KEYS),
+    ).reshape(len(answers_list), len(_SCORED_KEYS))
+    return _score_matrix(matrix)
 
-依恋类型: {state["attachment_type"]}
-依恋维度分数: {json.dumps(state["attachment_scores"])}
-沟通风格: {state["communication_style"]}
-沟通维度分数: {json.dumps(state["communication_scores"])}
-特质问卷答案 (1-5分): {json.dumps(trait_answers)}
 
-问卷含义:
-- q15: 我喜欢尝试新事物 (高分=开放性高)
-- q16: 我享受独处的时光 (高分=内倾)
-- q17: 我容易感受到他人的情绪 (高分=共情力强)
-- q18: 我喜欢有计划地做事 (高分=条理性强)
-- q19: 我在社交场合感到自在 (高分=外向)
-- q20: 我重视深度关系而非广泛社交 (高分=深度社交偏好)
+def score_columns_batch(columns: dict[str, list[float]], count: int) -> dict[str, np.ndarray]:
+    """列式批量评分：columns 为 题号 → 各用户分数（长度均为 count），缺失的题按 3 分计"""
+    matrix = np.full((count, len(_SCORED_KEYS)), 3, dtype=np.float64)
+    for index, key in enumerate(_SCORED_KEYS):
+        if key in columns:
+            matrix[:, index] = columns[key]
+    return _score_matrix(matrix)
 
-请严格以 JSON 数组格式返回标签，例如: ["开放探索", "高共情力", "深度社交"]
-只返回 JSON 数组，不要其他内容。"""
 
-    resp = await llm.ainvoke([
-        SystemMessage(content="你是 LinkSoul 的 AI 心理分析师，专注于生成精准的中文性格标签。"),
-        HumanMessage(content=prompt),
-    ])
+def _score_matrix(matrix: np.ndarray) -> dict[str, np.ndarray]:
+    offset = 0
+    columns = {}
+    for name, keys in (
+        ("anxiety", ANXIETY_KEYS),
+        ("avoidance", AVOIDANCE_KEYS),
+        ("directness", DIRECTNESS_KEYS),
+        ("emotionality", EMOTIONALITY_KEYS),
+        ("analyticity", ANALYTICITY_KEYS),
+    ):
+        columns[name] = matrix[:, offset:offset + len(keys)].mean(axis=1)
+        offset += len(keys)
 
-    try:
-        text = resp.content.strip()
-        if text.startswith("```"):
-            text = text.split("\n", 1)[1].rsplit("```", 1)[0].strip()
-        tags = json.loads(text)
-        if not isinstance(tags, list):
-            tags = ["待分析"]
-    except (json.JSONDecodeError, IndexError):
-        tags = ["开放型", "高共情", "深度社交"]
+    anxious = columns["anxiety"] > 3
+    avoidant = columns["avoidance"] > 3
+    attachment_index = anxious.astype(np.intp) + 2 * avoidant.astype(np.intp)
 
-    return {"personality_tags": tags}
+    style_scores = np.stack([
+        columns["directness"],
+        columns["emotionality"],
+        columns["analyticity"],
+        6 - columns["directness"],
+    ], axis=1)
+
+    result = {name: np.round(values, 2) for name, values in columns.items()}
+    result["attachment_type"] = ATTACHMENT_TYPES[attachment_index]
+    result["communication_style"] = COMMUNICATION_STYLES[style_scores.argmax(axis=1)]
+    return result
+
+
+async def generate_profile(state: PersonalityState) -> dict:
+    """使用 DeepSeek V3 生成性格标签（按量化画像分桶缓存）"""
+    bucket = tag_bucket(
+        state["attachment_type"],
+        state["communication_style"],
+        state["attachment_scores"],
+        state["communication_scores"],
+        state["answers"],
+    )
+    return {"personality_tags": await get_or_generate_tags(bucket)}
 
 
 async def deep_analysis(state: PersonalityState) -> dict:
-    """使用 DeepSeek R1 进行深度性格分析"""
-    llm = get_reasoner_llm()
+    """使用 DeepSeek R1 进行深度性格分析；降级时只返回确定性维度分数，不生成报告"""
+    dimension_details = {
+        "attachment": state["attachment_scores"],
+        "communication": state["communication_scores"],
+    }
+    if should_degrade("deep_analysis", get_settings().deepseek_reasoner_model):
+        mark_degraded("deep_analysis")
+        return {"ai_summary": "", "dimension_details": dimension_details}
+
+    llm = get_reasoner_llm("deep_analysis")
 
     prompt = f"""作为一位资深心理咨询师，请根据以下心理测评数据，为用户撰写一段 200-300 字的深度性格分析报告。
 
@@ -163,21 +206,54 @@ async def deep_analysis(state: PersonalityState) -> dict:
         HumanMessage(content=prompt),
     ])
 
-    summary = resp.content.strip()
-    if summary.startswith("<think>"):
-        parts = summary.split("</think>")
-        summary = parts[-1].strip() if len(parts) > 1 else summary
-
-    return {
-        "ai_summary": summary,
-        "dimension_details": {
-            "attachment": state["attachment_scores"],
-            "communication": state["communication_scores"],
-        },
+    # 推理链已由 R1 客户端移入 additional_kwargs，content 只有报告正文
+    summary = (resp.content or "").strip()
+
+    return {"ai_summary": summary, "dimension_details": dimension_details}
+
+
+def quick_tags(answers: dict) -> list[str]:
+    """基于特质题的规则标签（与后端本地兜底规则一致），不调用 LLM"""
+    rules = [
+        ("q15", ">=", "开放探索"), ("q15", "<=", "稳重务实"),
+        ("q16", ">=", "享受独处"),
+        ("q17", ">=", "高共情力"),
+        ("q18", ">=", "条理清晰"),
+        ("q19", ">=", "社交达人"), ("q19", "<=", "内敛安静"),
+        ("q20", ">=", "深度社交"), ("q20", "<=", "广泛社交"),
+    ]
+    tags = []
+    for key, op, tag in rules:
+        value = answers.get(key, 3)
+        if (op == ">=" and value >= 4) or (op == "<=" and value <= 2):
+            tags.append(tag)
+    return tags or ["均衡型"]
+
+
+def score_personality(answers: dict) -> PersonalityState:
+    """只跑本地评分节点，得到可直接返回的类型与维度分数"""
+    state: PersonalityState = {
+        "answers": answers,
+        "attachment_scores": {},
+        "communication_scores": {},
+        "attachment_type": "",
+        "communication_style": "",
+        "personality_tags": [],
+        "ai_summary": "",
+        "dimension_details": {},
+    }
+    state.update(score_attachment(state))
+    state.update(score_communication(state))
+    state["dimension_details"] = {
+        "attachment": state["attachment_scores"],
+        "communication": state["communication_scores"],
     }
+    return state
+
 
+def build_personality_graph() -> StateGraph:
+    from langgraph.graph import StateGraph, END
 
-def build_personality_graph():
     graph = StateGraph(PersonalityState)
 
     graph.add_node("score_attachment", score_attachment)
@@ -191,10 +267,10 @@ def build_personality_graph():
     graph.add_edge("generate_profile", "deep_analysis")
     graph.add_edge("deep_analysis", END)
 
-    return graph.compile()
+    return graph
 
 
-personality_graph = build_personality_graph()
+personality_graph = lazy_graph("personality_agent", build_personality_graph, checkpoint=True)
 
 
 async def run_personality_agent(answers: dict) -> dict:
@@ -2,6 +2,7 @@
 Relation Agent — LangGraph 多步工作流
 
 流程: 阶段判断(DeepSeek R1) → 进展评估 → 建议生成(DeepSeek V3)
+融合模式: 阶段判断+进展评估(单次 DeepSeek R1) → 建议生成(DeepSeek V3)
 
 使用 DeepSeek R1 做关系阶段的逻辑推理判断，
 使用 DeepSeek V3 生成用户友好的进展报告和建议。
@@ -10,12 +11,20 @@ Relation Agent — LangGraph 多步工作流
 from __future__ import annotations
 
 import json
-from typing import TypedDict
+from typing import TYPE_CHECKING, TypedDict
 
 from langchain_core.messages import HumanMessage, SystemMessage
-from langgraph.graph import StateGraph, END
+from pydantic import BaseModel, field_validator
 
+from app.core.config import get_settings
+from app.core.graphs import lazy_graph
 from app.core.llm import get_chat_llm, get_reasoner_llm
+from app.core.streaming import LineItemParser, collect_items
+from app.core.structured import StructuredOutputError, clamp, invoke_structured
+from app.services.interaction_features import extract_interaction_features, format_interaction_features
+
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
 
 
 # ── State ──────────────────────────────────────────────
@@ -26,6 +35,7 @@ class RelationAgentState(TypedDict):
     partner_profile: dict
     current_stage: str
     interaction_history: str
+    interaction_features: dict
     # 中间结果
     stage_assessment: dict
     progress_evaluation: str
@@ -37,25 +47,138 @@ class RelationAgentState(TypedDict):
     error: str
 
 
+# ── Prompts ────────────────────────────────────────────
+
+RELATION_STAGES = ("INITIAL", "GETTING_TO_KNOW", "DATING", "COMMITTED", "ENDED")
+
+STAGE_DEFINITIONS = (
+    "关系阶段定义:\n"
+    "- INITIAL: 初识阶段，刚匹配，互相了解基本信息\n"
+    "- GETTING_TO_KNOW: 了解阶段，有持续对话，开始分享个人话题\n"
+    "- DATING: 约会阶段，有线下接触或深入的情感交流\n"
+    "- COMMITTED: 确定关系，双方明确恋爱关系\n"
+    "- ENDED: 关系结束\n"
+)
+
+PROGRESS_DIMENSIONS = (
+    "评估维度:\n"
+    "1. 沟通质量（对话频率、深度、互动性）\n"
+    "2. 情感投入（关心程度、情绪共鸣）\n"
+    "3. 边界尊重（是否尊重彼此节奏）\n"
+    "4. 发展趋势（是在积极发展还是停滞/倒退）\n"
+)
+
+PROGRESS_DIMENSION_KEYS = ("communication", "emotional_investment", "boundary_respect", "trend")
+
+
+# ── Schemas ────────────────────────────────────────────
+
+class StageAssessment(BaseModel):
+    """阶段判断: 阶段必须是合法枚举值，否则触发修复"""
+    recommended_stage: str
+    confidence: float = 0.5
+    reasoning: str = ""
+    signals: list[str] = []
+
+    @field_validator("recommended_stage", mode="before")
+    @classmethod
+    def _stage(cls, value):
+        stage = str(value or "").strip().upper()
+        if stage not in RELATION_STAGES:
+            raise ValueError(f"recommended_stage 必须是 {', '.join(RELATION_STAGES)} 之一")
+        return stage
+
+    @field_validator("confidence", mode="before")
+    @classmethod
+    def _confidence(cls, value):
+        return clamp(value, 0.0, 1.0, 0.5)
+
+    @field_validator("reasoning", mode="before")
+    @classmethod
+    def _reasoning(cls, value):
+        return str(value or "")
+
+    @field_validator("signals", mode="before")
+    @classmethod
+    def _signals(cls, value):
+        return [str(s) for s in value] if isinstance(value, list) else []
+
+
+class ProgressDimension(BaseModel):
+    score: float
+    note: str = ""
+
+    @field_validator("score", mode="before")
+    @classmethod
+    def _score(cls, value):
+        return clamp(value, 0.0, 100.0, 50.0)
+
+    @field_validator("note", mode="before")
+    @classmethod
+    def _note(cls, value):
+        return str(value or "")
+
+
+class ProgressEvaluation(BaseModel):
+    """进展评估: 总分必填，未知或缺少分数的维度直接丢弃"""
+    progress_score: float
+    dimensions: dict[str, ProgressDimension] = {}
+    summary: str = ""
+
+    @field_validator("progress_score", mode="before")
+    @classmethod
+    def _progress_score(cls, value):
+        if value is None or isinstance(value, (dict, list)):
+            raise ValueError("progress_score 必须是 0-100 的数字")
+        return clamp(value, 0.0, 100.0, 50.0)
+
+    @field_validator("dimensions", mode="before")
+    @classmethod
+    def _dimensions(cls, value):
+        if not isinstance(value, dict):
+            return {}
+        return {
+            key: value[key] for key in PROGRESS_DIMENSION_KEYS
+            if isinstance(value.get(key), dict) and "score" in value[key]
+        }
+
+    @field_validator("summary", mode="before")
+    @classmethod
+    def _summary(cls, value):
+        return str(value or "")
+
+
+class FusedRelationResult(BaseModel):
+    stage_assessment: StageAssessment
+    progress_evaluation: ProgressEvaluation
+
+
+def _history_block(state: RelationAgentState, label: str) -> str:
+    """有结构化特征时用紧凑的量化信号替代原始互动记录"""
+    features = state.get("interaction_features") or {}
+    if features:
+        return f"互动量化特征:\n{format_interaction_features(features)}"
+    return f"{label}:\n{state['interaction_history']}"
+
+
+def _baseline_score(state: RelationAgentState) -> float:
+    return float((state.get("interaction_features") or {}).get("baseline_progress_score", 50.0))
+
+
 # ── Nodes ──────────────────────────────────────────────
 
 async def assess_stage(state: RelationAgentState) -> dict:
     """节点1: 用 DeepSeek R1 推理判断当前真实的关系阶段"""
-    llm = get_reasoner_llm()
+    llm = get_reasoner_llm("assess_stage")
 
-    resp = await llm.ainvoke([
+    messages = [
         HumanMessage(content=(
             "你是关系心理学专家。根据以下信息，推理判断两人当前真实的关系阶段。\n\n"
             f"当前标记阶段: {state['current_stage']}\n"
             f"用户画像: {json.dumps(state['user_profile'], ensure_ascii=False)}\n"
             f"对方画像: {json.dumps(state['partner_profile'], ensure_ascii=False)}\n"
-            f"互动历史摘要:\n{state['interaction_history']}\n\n"
-            "关系阶段定义:\n"
-            "- INITIAL: 初识阶段，刚匹配，互相了解基本信息\n"
-            "- GETTING_TO_KNOW: 了解阶段，有持续对话，开始分享个人话题\n"
-            "- DATING: 约会阶段，有线下接触或深入的情感交流\n"
-            "- COMMITTED: 确定关系，双方明确恋爱关系\n"
-            "- ENDED: 关系结束\n\n"
+            f"{_history_block(state, '互动历史摘要')}\n\n"
+            f"{STAGE_DEFINITIONS}\n"
             "返回纯 JSON:\n"
             "{\n"
             '  "recommended_stage": "阶段枚举值",\n'
@@ -64,40 +187,32 @@ async def assess_stage(state: RelationAgentState) -> dict:
             '  "signals": ["支持判断的关键信号"]\n'
             "}"
         )),
-    ])
-
-    content = (resp.content or "").strip()
-    if content.startswith("```"):
-        content = content.split("\n", 1)[1].rsplit("```", 1)[0].strip()
+    ]
 
     try:
-        assessment = json.loads(content)
-        return {
-            "stage_assessment": assessment,
-            "recommended_stage": assessment.get("recommended_stage", state["current_stage"]),
-        }
-    except (json.JSONDecodeError, ValueError):
+        assessment = await invoke_structured(llm, messages, StageAssessment, "assess_stage", repair_llm=get_chat_llm)
+    except StructuredOutputError as exc:
         return {
-            "stage_assessment": {"raw": content},
+            "stage_assessment": {"raw": exc.raw},
             "recommended_stage": state["current_stage"],
         }
+    return {
+        "stage_assessment": assessment.model_dump(),
+        "recommended_stage": assessment.recommended_stage,
+    }
 
 
 async def evaluate_progress(state: RelationAgentState) -> dict:
     """节点2: 用 DeepSeek R1 评估关系进展健康度"""
-    llm = get_reasoner_llm()
+    llm = get_reasoner_llm("evaluate_progress")
 
-    resp = await llm.ainvoke([
+    messages = [
         HumanMessage(content=(
             "你是关系健康评估专家。根据以下信息，评估这段关系的进展健康度。\n\n"
             f"关系阶段: {state['recommended_stage']}\n"
             f"阶段判断详情: {json.dumps(state['stage_assessment'], ensure_ascii=False)}\n"
-            f"互动历史:\n{state['interaction_history']}\n\n"
-            "评估维度:\n"
-            "1. 沟通质量（对话频率、深度、互动性）\n"
-            "2. 情感投入（关心程度、情绪共鸣）\n"
-            "3. 边界尊重（是否尊重彼此节奏）\n"
-            "4. 发展趋势（是在积极发展还是停滞/倒退）\n\n"
+            f"{_history_block(state, '互动历史')}\n\n"
+            f"{PROGRESS_DIMENSIONS}\n"
             "返回纯 JSON:\n"
             "{\n"
             '  "progress_score": 0-100,\n'
@@ -110,30 +225,30 @@ async def evaluate_progress(state: RelationAgentState) -> dict:
             '  "summary": "一句话总结"\n'
             "}"
         )),
-    ])
-
-    content = (resp.content or "").strip()
-    if content.startswith("```"):
-        content = content.split("\n", 1)[1].rsplit("```", 1)[0].strip()
+    ]
 
     try:
-        evaluation = json.loads(content)
-        return {
-            "progress_evaluation": json.dumps(evaluation, ensure_ascii=False),
-            "progress_score": float(evaluation.get("progress_score", 50)),
-        }
-    except (json.JSONDecodeError, ValueError):
+        evaluation = await invoke_structured(
+            llm, messages, ProgressEvaluation, "evaluate_progress", repair_llm=get_chat_llm,
+        )
+    except StructuredOutputError as exc:
         return {
-            "progress_evaluation": content,
-            "progress_score": 50.0,
+            "progress_evaluation": exc.raw,
+            "progress_score": _baseline_score(state),
         }
+    return {
+        "progress_evaluation": evaluation.model_dump_json(),
+        "progress_score": evaluation.progress_score,
+    }
 
 
 async def generate_advice(state: RelationAgentState) -> dict:
-    """节点3: 用 DeepSeek V3 生成温暖的建议和阶段报告"""
+    """节点3: 用 DeepSeek V3 流式生成温暖的建议和阶段报告"""
     llm = get_chat_llm()
 
-    resp = await llm.ainvoke([
+    # 报告在分隔符之后，需要读完整个输出；建议条目边生成边解析
+    parser = LineItemParser(stop_marker="===")
+    advice_lines = await collect_items(llm, [
         SystemMessage(content=(
             "你是 LinkSoul 的关系顾问。根据关系评估结果，"
             "为用户生成温暖实用的关系建议。\n\n"
@@ -153,25 +268,9 @@ async def generate_advice(state: RelationAgentState) -> dict:
             "===\n"
             "2. 200-400字的阶段性小报告"
         )),
-    ])
-
-    content = (resp.content or "").strip()
-    parts = content.split("===", 1)
-
-    advice_text = parts[0].strip()
-    advice_lines = []
-    for line in advice_text.split("\n"):
-        line = line.strip()
-        if not line:
-            continue
-        for prefix in ["1.", "2.", "3.", "1、", "2、", "3、", "-", "•", "*"]:
-            if line.startswith(prefix):
-                line = line[len(prefix):].strip()
-                break
-        if line:
-            advice_lines.append(line)
-
-    report = parts[1].strip() if len(parts) > 1 else "暂时无法生成详细报告。"
+    ], parser, limit=None, name="relation_advice")
+
+    report = parser.tail.strip() or "暂时无法生成详细报告。"
 
     return {
         "advice": advice_lines[:3],
@@ -179,9 +278,68 @@ async def generate_advice(state: RelationAgentState) -> dict:
     }
 
 
+# ── Fused Mode ─────────────────────────────────────────
+
+async def assess_and_evaluate(state: RelationAgentState) -> dict:
+    """融合节点: 一次 DeepSeek R1 调用同时完成阶段判断与进展评估"""
+    llm = get_reasoner_llm("assess_and_evaluate")
+
+    messages = [
+        HumanMessage(content=(
+            "你是关系心理学专家。根据以下信息，先推理判断两人当前真实的关系阶段，"
+            "再基于该阶段评估这段关系的进展健康度。\n\n"
+            f"当前标记阶段: {state['current_stage']}\n"
+            f"用户画像: {json.dumps(state['user_profile'], ensure_ascii=False)}\n"
+            f"对方画像: {json.dumps(state['partner_profile'], ensure_ascii=False)}\n"
+            f"{_history_block(state, '互动历史摘要')}\n\n"
+            f"{STAGE_DEFINITIONS}\n"
+            f"{PROGRESS_DIMENSIONS}\n"
+            "返回纯 JSON:\n"
+            "{\n"
+            '  "stage_assessment": {\n'
+            '    "recommended_stage": "阶段枚举值",\n'
+            '    "confidence": 0.0-1.0,\n'
+            '    "reasoning": "推理过程",\n'
+            '    "signals": ["支持判断的关键信号"]\n'
+            "  },\n"
+            '  "progress_evaluation": {\n'
+            '    "progress_score": 0-100,\n'
+            '    "dimensions": {\n'
+            '      "communication": {"score": 分数, "note": "说明"},\n'
+            '      "emotional_investment": {"score": 分数, "note": "说明"},\n'
+            '      "boundary_respect": {"score": 分数, "note": "说明"},\n'
+            '      "trend": {"score": 分数, "note": "说明"}\n'
+            "    },\n"
+            '    "summary": "一句话总结"\n'
+            "  }\n"
+            "}"
+        )),
+    ]
+
+    try:
+        result = await invoke_structured(
+            llm, messages, FusedRelationResult, "assess_and_evaluate", repair_llm=get_chat_llm,
+        )
+    except StructuredOutputError as exc:
+        return {
+            "stage_assessment": {"raw": exc.raw},
+            "recommended_stage": state["current_stage"],
+            "progress_evaluation": exc.raw,
+            "progress_score": _baseline_score(state),
+        }
+    return {
+        "stage_assessment": result.stage_assessment.model_dump(),
+        "recommended_stage": result.stage_assessment.recommended_stage,
+        "progress_evaluation": result.progress_evaluation.model_dump_json(),
+        "progress_score": result.progress_evaluation.progress_score,
+    }
+
+
 # ── Graph ──────────────────────────────────────────────
 
 def build_relation_agent_graph() -> StateGraph:
+    from langgraph.graph import StateGraph, END
+
     graph = StateGraph(RelationAgentState)
 
     graph.add_node("assess_stage", assess_stage)
@@ -196,7 +354,28 @@ def build_relation_agent_graph() -> StateGraph:
     return graph
 
 
-_relation_agent = build_relation_agent_graph().compile()
+def build_fused_relation_agent_graph() -> StateGraph:
+    """融合模式: 阶段判断与进展评估合并为单次 R1 调用"""
+    from langgraph.graph import StateGraph, END
+
+    graph = StateGraph(RelationAgentState)
+
+    graph.add_node("assess_and_evaluate", assess_and_evaluate)
+    graph.add_node("generate_advice", generate_advice)
+
+    graph.set_entry_point("assess_and_evaluate")
+    graph.add_edge("assess_and_evaluate", "generate_advice")
+    graph.add_edge("generate_advice", END)
+
+    return graph
+
+
+_relation_agent = lazy_graph("relation_agent", build_relation_agent_graph, checkpoint=True)
+_fused_relation_agent = lazy_graph(
+    "relation_agent_fused", build_fused_relation_agent_graph, checkpoint=True,
+)
+
+RELATION_AGENT_MODES = ("staged", "fused")
 
 
 async def run_relation_agent(
@@ -204,13 +383,23 @@ async def run_relation_agent(
     partner_profile: dict,
     current_stage: str = "INITIAL",
     interaction_history: str = "",
+    mode: str | None = None,
+    interaction_messages: list[dict] | None = None,
 ) -> dict:
-    """运行关系推进 Agent"""
-    result = await _relation_agent.ainvoke({
+    """运行关系推进 Agent
+
+    mode: "staged"（阶段判断→进展评估→建议，两次 R1）或
+    "fused"（单次 R1 同时输出阶段与进展），默认取 Settings.relation_agent_mode。
+    interaction_messages: 结构化消息列表，提供时以量化特征替代原始互动记录。
+    """
+    mode = mode or get_settings().relation_agent_mode
+    agent = _fused_relation_agent if mode == "fused" else _relation_agent
+    result = await agent.ainvoke({
         "user_profile": user_profile,
         "partner_profile": partner_profile,
         "current_stage": current_stage,
         "interaction_history": interaction_history,
+        "interaction_features": extract_interaction_features(interaction_messages or []),
         "stage_assessment": {},
         "progress_evaluation": "",
         "recommended_stage": "",
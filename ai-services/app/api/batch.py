@@ -0,0 +1,149 @@
+"""批量接口 /api/v1/batch 的执行逻辑
+
+一个批量请求携带多个子请求（任一现有 POST 路由 + 请求体），在进程内直接调用路由处理函数，
+省去每个子请求的 HTTP 往返与中间件开销；子请求共享连接池、缓存和进行中的合并调用，
+同一批次内路由与请求体完全相同的子请求只执行一次。所有批次共用 batch_max_concurrency 个执行槽，
+每个执行中的子请求计入过载降级的并发数；携带 X-User-Id 时按子请求各自的路由消耗扣减令牌。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import json
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, NamedTuple
+
+from fastapi import APIRouter, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, ValidationError
+
+from app.core import metrics, rate_limit
+from app.core.config import get_settings
+from app.core.resilience import CircuitOpenError, track_request
+
+logger = logging.getLogger(__name__)
+
+
+class BatchTarget(NamedTuple):
+    path: str
+    model: type[BaseModel]
+    endpoint: Callable[[BaseModel], Awaitable[Any]]
+
+
+_targets: dict[str, BatchTarget] | None = None
+_semaphore: asyncio.Semaphore | None = None
+
+
+def batch_targets(router: APIRouter) -> dict[str, BatchTarget]:
+    """可批量调用的路由（只有一个 Pydantic 请求体参数的 POST 路由），键为去掉 /api/v1 前缀的路径"""
+    global _targets
+    if _targets is None:
+        targets = {}
+        for route in router.routes:
+            if not isinstance(route, APIRoute) or "POST" not in route.methods:
+                continue
+            params = list(inspect.signature(route.endpoint).parameters.values())
+            if len(params) != 1:
+                continue
+            model = params[0].annotation
+            if isinstance(model, type) and issubclass(model, BaseModel):
+                targets[route.path.removeprefix(router.prefix)] = BatchTarget(route.path, model, route.endpoint)
+        _targets = targets
+    return _targets
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(get_settings().batch_max_concurrency)
+    return _semaphore
+
+
+def _dedup_key(path: str, body: dict) -> str:
+    return path + "\n" + json.dumps(body, sort_keys=True, ensure_ascii=False, default=str)
+
+
+async def _charge(user_id: str | None, target: BatchTarget) -> dict | None:
+    """按子请求路由扣减令牌，超限时返回 429 结果"""
+    if not user_id or not get_settings().rate_limit_enabled:
+        return None
+    allowed, retry_after, _ = await rate_limit.acquire(user_id, rate_limit.route_cost(target.path))
+    if allowed:
+        return None
+    metrics.incr("batch.items.rate_limited")
+    return {"status": 429, "error": "rate limit exceeded", "retry_after": retry_after}
+
+
+async def _execute(target: BatchTarget, body: dict) -> dict:
+    """校验请求体并调用路由处理函数；异常按单个接口的状态码转换为子请求结果"""
+    try:
+        req = target.model.model_validate(body)
+    except ValidationError as exc:
+        errors = exc.errors(include_url=False, include_context=False, include_input=False)
+        return {"status": 422, "error": jsonable_encoder(errors)}
+
+    async with _get_semaphore():
+        with track_request() as degraded:
+            try:
+                outcome = {"status": 200, "result": jsonable_encoder(await target.endpoint(req))}
+            except HTTPException as exc:
+                outcome = {"status": exc.status_code, "error": exc.detail}
+            except CircuitOpenError as exc:
+                outcome = {
+                    "status": 503,
+                    "error": f"upstream model {exc.model} unavailable",
+                    "retry_after": get_settings().breaker_cooldown_seconds,
+                }
+            except Exception:
+                logger.exception("batch item %s failed", target.path)
+                outcome = {"status": 500, "error": "internal error"}
+    if degraded:
+        outcome["degraded"] = list(degraded)
+    return outcome
+
+
+async def iter_batch(
+    items: list[tuple[str, dict]], targets: dict[str, BatchTarget], user_id: str | None = None,
+) -> AsyncIterator[tuple[int, dict]]:
+    """并发执行 (路由, 请求体) 列表，按完成顺序产出 (下标, 结果)；调用方提前关闭时取消未完成的子请求"""
+    metrics.incr("batch.requests")
+    metrics.incr("batch.items", len(items))
+    immediate: list[tuple[int, dict]] = []
+    shared: dict[str, asyncio.Task] = {}
+    waiting: dict[asyncio.Task, list[int]] = {}
+
+    for index, (route, body) in enumerate(items):
+        target = targets.get(route.removeprefix("/api/v1"))
+        if target is None:
+            immediate.append((index, {"status": 404, "error": f"unknown route {route}"}))
+            continue
+        key = _dedup_key(target.path, body)
+        task = shared.get(key)
+        if task is not None:
+            metrics.incr("batch.items.deduplicated")
+        else:
+            limited = await _charge(user_id, target)
+            if limited is not None:
+                immediate.append((index, limited))
+                continue
+            task = asyncio.create_task(_execute(target, body))
+            shared[key] = task
+        waiting.setdefault(task, []).append(index)
+
+    try:
+        for index, outcome in immediate:
+            metrics.incr(f"batch.status.{outcome['status']}")
+            yield index, outcome
+        pending = set(waiting)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                outcome = task.result()
+                for index in waiting[task]:
+                    metrics.incr(f"batch.status.{outcome['status']}")
+                    yield index, outcome
+    finally:
+        for task in waiting:
+            task.cancel()
@@ -1,15 +1,31 @@
-from fastapi import APIRouter
-from pydantic import BaseModel
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Literal
 
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, FiniteFloat
+
+from app.services import chat_speculation as speculation
 from app.services.chat_service import generate_chat_suggestions
+from app.services.compatibility_model import model_state
 from app.services.emotion_service import analyze_emotion
-from app.services.screenshot_service import analyze_screenshot
+from app.services.screenshot_service import ScreenshotError, analyze_screenshot
 from app.services.play_service import generate_play_plans
+from app.services.relation_service import evaluate_relation
+from app.services.personality_service import analyze_personality_instant, get_personality_result
 from app.agents.match_agent import run_match_agent
-from app.agents.relation_agent import run_relation_agent
-from app.agents.personality_agent import run_personality_agent
+from app.agents.personality_agent import run_personality_agent, score_answers_batch, score_columns_batch
+from app.api.batch import batch_targets, iter_batch
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.graphs import all_warm, warm_state
+from app.core.rate_limit import current_user_id
+from app.core.resilience import brownout_state
+from app.core.responses import api_response_class
 
-router = APIRouter(prefix="/api/v1")
+router = APIRouter(prefix="/api/v1", default_response_class=api_response_class())
 
 
 # ── Chat Agent ─────────────────────────────────────────
@@ -18,6 +34,8 @@ class ChatSuggestionRequest(BaseModel):
     context: str
     user_profile: dict = {}
     relationship_stage: str = "INITIAL"
+    conversation_id: str | None = None
+    last_message_id: str | None = None
 
 
 class ChatSuggestionResponse(BaseModel):
@@ -29,15 +47,58 @@ class ChatSuggestionResponse(BaseModel):
 
 @router.post("/chat/suggestions", response_model=ChatSuggestionResponse)
 async def get_chat_suggestions(req: ChatSuggestionRequest):
-    """Chat Agent: 情绪识别→上下文构建→策略选择→回复生成→安全过滤"""
-    result = await generate_chat_suggestions(
-        context=req.context,
-        user_profile=req.user_profile,
-        relationship_stage=req.relationship_stage,
-    )
+    """Chat Agent: 情绪识别→上下文构建→策略选择→回复生成→安全过滤
+
+    携带 X-User-Id、conversation_id 与 last_message_id，且已为该用户按相同输入预生成建议时直接返回。
+    """
+    result = None
+    if req.conversation_id and req.last_message_id:
+        result = await speculation.lookup(
+            current_user_id(),
+            req.conversation_id,
+            req.last_message_id,
+            req.context,
+            req.user_profile,
+            req.relationship_stage,
+        )
+    if result is None:
+        result = await generate_chat_suggestions(
+            context=req.context,
+            user_profile=req.user_profile,
+            relationship_stage=req.relationship_stage,
+        )
     return ChatSuggestionResponse(**result)
 
 
+class ChatIngestRequest(BaseModel):
+    conversation_id: str
+    message_id: str
+    context: str
+    user_profile: dict = {}
+    relationship_stage: str = "INITIAL"
+
+
+class ChatIngestResponse(BaseModel):
+    status: str
+
+
+@router.post("/chat/ingest", response_model=ChatIngestResponse, status_code=202)
+async def ingest_chat_message(req: ChatIngestRequest):
+    """会话收到新消息时为 X-User-Id 登记，后台低优先级预生成回复建议
+
+    status: scheduled | pending | ready | skipped | disabled；未携带 X-User-Id 时为 skipped。
+    """
+    status = await speculation.ingest(
+        current_user_id(),
+        req.conversation_id,
+        req.message_id,
+        req.context,
+        req.user_profile,
+        req.relationship_stage,
+    )
+    return ChatIngestResponse(status=status)
+
+
 class PlayPlanRequest(BaseModel):
     mode: str
     instruction: str
@@ -91,8 +152,11 @@ class ScreenshotResponse(BaseModel):
 
 @router.post("/analysis/screenshot", response_model=ScreenshotResponse)
 async def get_screenshot_analysis(req: ScreenshotRequest):
-    """DeepSeek V3 聊天截图分析"""
-    result = await analyze_screenshot(req.image_url)
+    """视觉模型聊天截图分析；截图无法下载或不是有效图片时返回 422"""
+    try:
+        result = await analyze_screenshot(req.image_url)
+    except ScreenshotError as exc:
+        raise HTTPException(status_code=422, detail=f"invalid screenshot: {exc}") from exc
     return ScreenshotResponse(**result)
 
 
@@ -101,6 +165,7 @@ async def get_screenshot_analysis(req: ScreenshotRequest):
 class MatchAnalysisRequest(BaseModel):
     user_a_profile: dict
     user_b_profile: dict
+    mode: Literal["full", "tiered"] | None = None
 
 
 class MatchAnalysisResponse(BaseModel):
@@ -108,30 +173,47 @@ class MatchAnalysisResponse(BaseModel):
     match_reason: str
     detailed_report: str
     compatibility_scores: dict = {}
+    tier: str = "full"
 
 
 @router.post("/match/analyze", response_model=MatchAnalysisResponse)
 async def analyze_match(req: MatchAnalysisRequest):
-    """Match Agent: 画像分析→兼容性评估(R1)→匹配理由生成"""
+    """Match Agent: 画像分析→兼容性评估(R1)→匹配理由生成
+
+    mode=tiered 时按分数分级: 规则预估低分的配对不调用 LLM（tier=prescreen），
+    R1 评估低分的配对不生成 V3 文案（tier=scored），其余完整运行（tier=full）。
+    """
     result = await run_match_agent(
         user_a_profile=req.user_a_profile,
         user_b_profile=req.user_b_profile,
+        mode=req.mode,
     )
     return MatchAnalysisResponse(
         overall_score=result.get("overall_score", 0),
         match_reason=result.get("match_reason", ""),
         detailed_report=result.get("detailed_report", ""),
         compatibility_scores=result.get("compatibility_scores", {}),
+        tier=result.get("tier", "full"),
     )
 
 
 # ── Relation Agent ─────────────────────────────────────
 
+class InteractionMessage(BaseModel):
+    sender: Literal["user", "partner"]
+    content: str = ""
+    timestamp: datetime
+
+
 class RelationAnalysisRequest(BaseModel):
     user_profile: dict
     partner_profile: dict
     current_stage: str = "INITIAL"
     interaction_history: str = ""
+    interaction_messages: list[InteractionMessage] = []
+    mode: Literal["staged", "fused"] | None = None
+    relationship_id: str | None = None
+    force_refresh: bool = False
 
 
 class RelationAnalysisResponse(BaseModel):
@@ -140,16 +222,26 @@ class RelationAnalysisResponse(BaseModel):
     advice: list[str]
     stage_report: str
     stage_assessment: dict = {}
+    interaction_features: dict = {}
+    evaluation: str = "full"
 
 
 @router.post("/relation/analyze", response_model=RelationAnalysisResponse)
 async def analyze_relation(req: RelationAnalysisRequest):
-    """Relation Agent: 阶段判断(R1)→进展评估(R1)→建议生成"""
-    result = await run_relation_agent(
+    """Relation Agent: 阶段判断(R1)→进展评估(R1)→建议生成
+
+    传入 interaction_messages 时先在本地提取互动量化特征，以特征替代原始记录进入提示词；
+    同一 relationship_id 的历史仅少量追加时复用上次评估（evaluation=cached/updated）。
+    """
+    result = await evaluate_relation(
         user_profile=req.user_profile,
         partner_profile=req.partner_profile,
         current_stage=req.current_stage,
         interaction_history=req.interaction_history,
+        mode=req.mode,
+        interaction_messages=[m.model_dump() for m in req.interaction_messages],
+        relationship_id=req.relationship_id,
+        force_refresh=req.force_refresh,
     )
     return RelationAnalysisResponse(
         recommended_stage=result.get("recommended_stage", req.current_stage),
@@ -157,6 +249,8 @@ async def analyze_relation(req: RelationAnalysisRequest):
         advice=result.get("advice", []),
         stage_report=result.get("stage_report", ""),
         stage_assessment=result.get("stage_assessment", {}),
+        interaction_features=result.get("interaction_features", {}),
+        evaluation=result.get("evaluation", "full"),
     )
 
 
@@ -164,6 +258,9 @@ async def analyze_relation(req: RelationAnalysisRequest):
 
 class PersonalityAnalysisRequest(BaseModel):
     answers: dict
+    mode: Literal["full", "instant"] = "full"
+    # 后台结果推送给 BACKEND_INTERNAL_URL 下该用户的内部回调接口；回调地址不接受调用方指定
+    callback_user_id: str | None = Field(None, pattern=r"^[A-Za-z0-9_-]{1,64}$")
 
 
 class PersonalityAnalysisResponse(BaseModel):
@@ -172,11 +269,20 @@ class PersonalityAnalysisResponse(BaseModel):
     personality_tags: list[str]
     ai_summary: str
     dimension_details: dict = {}
+    analysis_id: str | None = None
+    summary_status: str = "done"
 
 
 @router.post("/personality/analyze", response_model=PersonalityAnalysisResponse)
 async def analyze_personality(req: PersonalityAnalysisRequest):
-    """Personality Agent: 维度评分→性格画像→AI深度分析(R1)→标签生成"""
+    """Personality Agent: 维度评分→性格画像→AI深度分析(R1)→标签生成
+
+    mode=instant 时立即返回类型、分数与标签（summary_status=pending），
+    R1 深度分析在后台完成后可按 analysis_id 查询，或推送到后端的内部回调接口（callback_user_id）。
+    """
+    if req.mode == "instant":
+        result = await analyze_personality_instant(req.answers, req.callback_user_id)
+        return PersonalityAnalysisResponse(**result)
     result = await run_personality_agent(answers=req.answers)
     return PersonalityAnalysisResponse(
         attachment_type=result.get("attachment_type", "SECURE"),
@@ -187,6 +293,122 @@ async def analyze_personality(req: PersonalityAnalysisRequest):
     )
 
 
+@router.get("/personality/analyze/{analysis_id}", response_model=PersonalityAnalysisResponse)
+async def get_personality_analysis(analysis_id: str):
+    """查询两阶段分析结果（summary_status: pending | done | failed）"""
+    result = await get_personality_result(analysis_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="analysis not found")
+    return PersonalityAnalysisResponse(**result)
+
+
+class PersonalityBatchScoreRequest(BaseModel):
+    # answers 与 columns 二选一: answers 每份答案为 题号 → 量表分；columns 为 题号 → 各用户量表分（列式，
+    # 各列等长，校验开销约为逐份写法的 1/3）。非数值、null、NaN/Inf 返回 422
+    answers: list[dict[str, FiniteFloat]] | None = None
+    columns: dict[str, list[FiniteFloat]] | None = None
+
+
+class PersonalityBatchScoreResponse(BaseModel):
+    """列式结果：第 i 个元素对应请求中第 i 份答案"""
+    count: int
+    attachment_type: list[str]
+    communication_style: list[str]
+    anxiety: list[float]
+    avoidance: list[float]
+    directness: list[float]
+    emotionality: list[float]
+    analyticity: list[float]
+
+
+@router.post("/personality/score/batch", response_model=PersonalityBatchScoreResponse)
+async def score_personality_batch(req: PersonalityBatchScoreRequest):
+    """批量维度评分（NumPy 向量化，不调用 LLM），用于量表调整后的全量重算"""
+    if (req.answers is None) == (req.columns is None):
+        raise HTTPException(status_code=422, detail="exactly one of answers and columns is required")
+    if req.answers is not None:
+        count = len(req.answers)
+    else:
+        lengths = {len(values) for values in req.columns.values()}
+        if len(lengths) > 1:
+            raise HTTPException(status_code=422, detail="columns must have the same length")
+        count = lengths.pop() if lengths else 0
+    limit = get_settings().personality_batch_max_items
+    if count > limit:
+        raise HTTPException(status_code=422, detail=f"too many answer sets (max {limit})")
+    # 评分与结果转换放到线程池，大批量时不阻塞事件循环
+    return await asyncio.to_thread(_score_batch, req, count)
+
+
+def _score_batch(req: PersonalityBatchScoreRequest, count: int) -> PersonalityBatchScoreResponse:
+    if req.answers is not None:
+        scores = score_answers_batch(req.answers)
+    else:
+        scores = score_columns_batch(req.columns, count)
+    return PersonalityBatchScoreResponse(
+        count=count,
+        **{name: values.tolist() for name, values in scores.items()},
+    )
+
+
+# ── Batch ──────────────────────────────────────────────
+
+class BatchItem(BaseModel):
+    id: str | None = None
+    route: str = Field(description="子请求路由，如 /chat/suggestions（可带 /api/v1 前缀）")
+    body: dict = {}
+
+
+class BatchRequest(BaseModel):
+    items: list[BatchItem] = Field(min_length=1)
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    id: str | None = None
+    status: int
+    result: Any = None
+    error: Any = None
+    degraded: list[str] = []
+    retry_after: float | None = None
+
+
+class BatchResponse(BaseModel):
+    results: list[BatchItemResult]
+
+
+def _item_result(req: BatchRequest, index: int, outcome: dict) -> BatchItemResult:
+    return BatchItemResult(index=index, id=req.items[index].id, **outcome)
+
+
+@router.post("/batch", response_model=BatchResponse)
+async def run_batch(req: BatchRequest, request: Request):
+    """批量调用现有 POST 路由: 子请求在服务内并发执行，按请求顺序返回各自的 status 与 result/error
+
+    请求头 Accept: application/x-ndjson 时改为流式返回，每个子请求完成即输出一行（带 index）。
+    """
+    if len(req.items) > get_settings().batch_max_items:
+        raise HTTPException(status_code=422, detail=f"too many items (max {get_settings().batch_max_items})")
+    results = iter_batch(
+        [(item.route, item.body) for item in req.items],
+        batch_targets(router),
+        request.headers.get("x-user-id") or None,
+    )
+
+    if "application/x-ndjson" in request.headers.get("accept", ""):
+        async def _lines():
+            async for index, outcome in results:
+                line = _item_result(req, index, outcome).model_dump(exclude_none=True)
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+
+        return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
+    ordered: list[BatchItemResult | None] = [None] * len(req.items)
+    async for index, outcome in results:
+        ordered[index] = _item_result(req, index, outcome)
+    return BatchResponse(results=ordered)
+
+
 # ── Health ─────────────────────────────────────────────
 
 @router.get("/health")
@@ -197,3 +419,37 @@ async def health_check():
         "agents": ["chat_agent", "match_agent", "relation_agent", "personality_agent"],
         "llm": "deepseek-chat (V3) + deepseek-reasoner (R1)",
     }
+
+
+@router.get("/ready")
+async def readiness_check():
+    """就绪检查: 全部 Agent 图编译完成前返回 503"""
+    ready = all_warm()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "graphs": warm_state()},
+    )
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """进程内运行指标（计数器与耗时）"""
+    data = metrics.snapshot()
+    data["ratios"] = {
+        "relation_skip_rate": metrics.ratio("relation.skipped", "relation.requests"),
+        "personality_tag_hit_rate": metrics.ratio("personality.tags.hits", "personality.tags.requests"),
+        "idempotency_replay_rate": metrics.ratio("idempotency.replayed", "idempotency.executed"),
+        "rate_limited_rate": metrics.ratio("rate_limit.limited", "rate_limit.requests"),
+        "screenshot_cache_hit_rate": metrics.ratio("screenshot.cache_hits", "screenshot.requests"),
+        "play_catalog_serve_rate": metrics.ratio("play.catalog.served", "play.requests"),
+        "chat_speculative_hit_rate": metrics.ratio("chat.speculative.hits", "chat.speculative.lookups"),
+        "chat_speculative_waste_rate": metrics.ratio("chat.speculative.wasted", "chat.speculative.generated"),
+        "batch_dedup_rate": metrics.ratio("batch.items.deduplicated", "batch.items"),
+        "match_prescreen_stop_rate": metrics.ratio("match.tier.prescreen", "match.requests"),
+        "compat_model_serve_rate": metrics.ratio("compat_model.served", "match.requests"),
+        "semantic_cache_hit_rate": metrics.ratio("semantic.hits", "semantic.lookups"),
+        "semantic_cache_false_hit_rate": metrics.ratio("semantic.false_hits", "semantic.audited"),
+    }
+    data["brownout"] = brownout_state()
+    data["compat_model"] = model_state()
+    return data
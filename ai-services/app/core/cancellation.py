@@ -0,0 +1,204 @@
+"""客户端断开时取消进行中的工作
+
+DisconnectMiddleware 让 /api/v1 请求在独立任务中执行，同时监听 http.disconnect：响应完成前客户端断开
+（App 关闭助手面板、后端 fetch 中止）即取消该任务，取消沿 await 链传到 Agent 图、LLM 调用和上游 HTTP 流。
+
+多个请求共享的工作（幂等层的同键合并、截图分析合并）用 Coalescer 管理：等待方取消时只是离开，
+其他等待方照常拿到结果；最后一个等待方也离开时才取消共享任务。
+
+被截断的 LLM 调用按「该模型已完成调用的平均输出 token − 已流式收到的 token」估算节省量，
+计入 cancel.llm_calls / cancel.tokens_saved（按模型另有 .<model> 细分）。尚未开始的节点不计入，估算偏保守。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from collections import Counter
+from contextvars import ContextVar
+from typing import Awaitable, Callable, TypeVar
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+from . import metrics, tracing
+from .config import get_settings
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("model", "task", "streamed")
+
+    def __init__(self, model: str, task: asyncio.Task | None):
+        self.model = model
+        self.task = task
+        self.streamed = 0
+
+
+# 当前请求（或共享任务）中尚未结束的 LLM 调用: run_id → _Call
+_ledger: ContextVar[dict[UUID, _Call] | None] = ContextVar("llm_call_ledger", default=None)
+# 各模型已完成调用的输出 token: 模型 → [次数, 总数]
+_output_tokens: dict[str, list[int]] = {}
+
+
+class CancellationCallback(AsyncCallbackHandler):
+    """把 LLM 调用登记到当前请求的账本，调用正常结束或出错时移除"""
+
+    # 在发起调用的任务中同步执行回调，current_task() 才是调用方的任务，而不是 gather 出的临时子任务
+    run_inline = True
+
+    def __init__(self, model: str):
+        self.model = model
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs) -> None:
+        ledger = _ledger.get()
+        if ledger is not None:
+            ledger[run_id] = _Call(self.model, asyncio.current_task())
+
+    async def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs) -> None:
+        call = (_ledger.get() or {}).get(run_id)
+        if call is not None:
+            call.streamed += 1
+
+    async def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        (_ledger.get() or {}).pop(run_id, None)
+        try:
+            output = (response.generations[0][0].message.usage_metadata or {}).get("output_tokens") or 0
+        except (AttributeError, IndexError):
+            output = 0
+        if output:
+            stat = _output_tokens.setdefault(self.model, [0, 0])
+            stat[0] += 1
+            stat[1] += int(output)
+
+    async def on_llm_error(self, error, *, run_id: UUID, **kwargs) -> None:
+        (_ledger.get() or {}).pop(run_id, None)
+
+
+def track_cancellation(model: str) -> CancellationCallback:
+    return CancellationCallback(model)
+
+
+def tally_cancelled(ledger: dict[UUID, _Call] | None) -> None:
+    """统计账本中所在任务已结束、调用却未结束（即被取消截断）的 LLM 调用"""
+    for run_id, call in list((ledger or {}).items()):
+        if call.task is not None and not call.task.done():
+            continue
+        del ledger[run_id]
+        count, total = _output_tokens.get(call.model, (0, 0))
+        saved = max(round(total / count) - call.streamed, 0) if count else 0
+        metrics.incr("cancel.llm_calls")
+        metrics.incr(f"cancel.llm_calls.{call.model}")
+        metrics.incr("cancel.tokens_saved", saved)
+        metrics.incr(f"cancel.tokens_saved.{call.model}", saved)
+
+
+# ── Shared work ────────────────────────────────────────
+
+class Coalescer:
+    """进程内同键并发调用共享一个任务；所有等待方都取消时才取消该任务"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._waiters: Counter[str] = Counter()
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+    def _on_done(self, key: str, task: asyncio.Task, ledger: dict[UUID, _Call] | None) -> None:
+        self._forget(key, task)
+        if task.cancelled():
+            # 共享任务的 LLM 调用登记在创建方请求的账本中，任务结束后才能确认哪些被截断
+            tally_cancelled(ledger)
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """执行或加入同键任务，返回 (结果, 是否加入了已有任务)"""
+        task = self._tasks.get(key)
+        joined = task is not None
+        if task is None:
+            task = asyncio.create_task(factory())
+            self._tasks[key] = task
+            ledger = _ledger.get()
+            task.add_done_callback(lambda done: self._on_done(key, done, ledger))
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task), joined
+        except asyncio.CancelledError:
+            if not task.done():
+                if self._waiters[key] > 1:
+                    metrics.incr(f"shared.{self.name}.detached")
+                else:
+                    metrics.incr(f"shared.{self.name}.cancelled")
+                    self._forget(key, task)
+                    task.cancel()
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if self._waiters[key] <= 0:
+                del self._waiters[key]
+
+
+# ── ASGI Middleware ────────────────────────────────────
+
+class DisconnectMiddleware:
+    """/api/v1 请求在独立任务中执行，响应完成前客户端断开即取消"""
+
+    def __init__(self, app, prefix: str = "/api/v1/"):
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not scope["path"].startswith(self.prefix)
+            or not get_settings().disconnect_cancel_enabled
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        queue: asyncio.Queue = asyncio.Queue()
+        disconnected = asyncio.Event()
+        finished = False
+
+        async def pump() -> None:
+            # 唯一读取 receive 的地方，下游从队列读取请求体与断开消息
+            while True:
+                message = await receive()
+                queue.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    return
+
+        async def send_tracked(message) -> None:
+            nonlocal finished
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                finished = True
+            await send(message)
+
+        ledger: dict[UUID, _Call] = {}
+        token = _ledger.set(ledger)
+        try:
+            app_task = asyncio.create_task(self.app(scope, queue.get, send_tracked))
+        finally:
+            _ledger.reset(token)
+        pump_task = asyncio.create_task(pump())
+        disconnect_task = asyncio.create_task(disconnected.wait())
+        try:
+            await asyncio.wait({app_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+            if not app_task.done() and not finished:
+                app_task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await app_task
+                metrics.incr("disconnect.cancelled")
+                tracing.annotate(disconnected=True)
+                tally_cancelled(ledger)
+                return
+            await app_task
+        finally:
+            pump_task.cancel()
+            disconnect_task.cancel()
+            if not app_task.done():
+                app_task.cancel()
@@ -0,0 +1,209 @@
+"""Agent 图的节点级检查点 — 失败或重试的运行从最后完成的节点继续
+
+运行 ID（LangGraph thread_id）取「图名 + 输入状态」的内容哈希，相同输入的重试命中同一组检查点：
+上次运行中途失败（如 generate_match_reason 出错）时，从失败节点继续，已完成的 R1 节点不再重跑；
+运行成功后删除检查点。检查点存放在 JsonStore（Redis，不可用时为进程内 TTL 字典），
+按 checkpoint_ttl_seconds 过期。每个运行只保留最新检查点及其待写入，不支持按历史检查点回放。
+
+同一运行 ID 同一时间只有一个执行者: 进程内的并发调用加入正在执行的运行；跨副本以 Redis 租约
+（checkpoint_lease_seconds，执行期间续期）标记持有者，只有持有者消失、租约过期后才会续跑其检查点。
+租约被其他副本持有时，以独立的运行 ID 从头执行，不读取也不清理对方的检查点。
+
+本模块依赖 langgraph，由 app.core.graphs 在编译图时按需导入。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import json
+import time
+import weakref
+from contextlib import nullcontext
+from typing import Any, AsyncIterator, Sequence
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+
+from redis.exceptions import RedisError
+
+from . import metrics, tracing
+from .cancellation import Coalescer
+from .config import get_settings
+from .redis import JsonStore, Lease, mark_redis_down, redis_available
+
+
+def run_id(graph_name: str, state: dict) -> str:
+    raw = json.dumps(state, sort_keys=True, ensure_ascii=False, default=str)
+    return f"{graph_name}:{hashlib.sha256(raw.encode()).hexdigest()[:32]}"
+
+
+class StoreCheckpointSaver(BaseCheckpointSaver):
+    """基于 JsonStore 的检查点存储: 每个 thread 一个键，按 checkpoint_ns 保存最新检查点与待写入"""
+
+    def __init__(self, store: JsonStore | None = None):
+        super().__init__()
+        self.store = store or JsonStore("checkpoint")
+        # 同一 thread 的读-改-写在进程内串行
+        self._locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+
+    def _lock(self, thread_id: str) -> asyncio.Lock:
+        lock = self._locks.get(thread_id)
+        if lock is None:
+            lock = self._locks[thread_id] = asyncio.Lock()
+        return lock
+
+    def _dump(self, value: Any) -> list[str]:
+        type_, data = self.serde.dumps_typed(value)
+        return [type_, base64.b64encode(data).decode()]
+
+    def _load(self, value: list[str]) -> Any:
+        return self.serde.loads_typed((value[0], base64.b64decode(value[1])))
+
+    async def _write(self, thread_id: str, entry: dict) -> None:
+        started = time.perf_counter()
+        await self.store.set(thread_id, entry, ttl=get_settings().checkpoint_ttl_seconds)
+        metrics.observe("checkpoint.write", time.perf_counter() - started)
+
+    async def aget_tuple(self, config: dict) -> CheckpointTuple | None:
+        started = time.perf_counter()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        entry = await self.store.get(thread_id)
+        metrics.observe("checkpoint.read", time.perf_counter() - started)
+        saved = (entry or {}).get(checkpoint_ns)
+        if not saved:
+            return None
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id and checkpoint_id != saved["id"]:
+            return None
+
+        def _config(cid: str) -> dict:
+            return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": cid}}
+
+        writes = sorted(saved["writes"].values(), key=lambda w: writes_sort_key(w[3], w[0], w[4]))
+        return CheckpointTuple(
+            config=_config(saved["id"]),
+            checkpoint=self._load(saved["checkpoint"]),
+            metadata=self._load(saved["metadata"]),
+            parent_config=_config(saved["parent"]) if saved["parent"] else None,
+            pending_writes=[(task_id, channel, self._load(value)) for task_id, channel, value, _, _ in writes],
+        )
+
+    async def alist(
+        self, config: dict | None, *, filter=None, before=None, limit=None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        if config is not None and (found := await self.aget_tuple(config)) is not None:
+            yield found
+
+    async def aput(
+        self, config: dict, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions,
+    ) -> dict:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        async with self._lock(thread_id):
+            entry = await self.store.get(thread_id) or {}
+            entry[checkpoint_ns] = {
+                "id": checkpoint["id"],
+                "parent": config["configurable"].get("checkpoint_id"),
+                "checkpoint": self._dump(checkpoint),
+                "metadata": self._dump(get_checkpoint_metadata(config, metadata)),
+                "writes": {},
+            }
+            await self._write(thread_id, entry)
+        return {
+            "configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]},
+        }
+
+    async def aput_writes(
+        self, config: dict, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        async with self._lock(thread_id):
+            entry = await self.store.get(thread_id) or {}
+            saved = entry.get(checkpoint_ns)
+            if not saved or saved["id"] != config["configurable"]["checkpoint_id"]:
+                return
+            for idx, (channel, value) in enumerate(writes):
+                write_idx = WRITES_IDX_MAP.get(channel, idx)
+                key = f"{task_id}:{write_idx}"
+                if write_idx >= 0 and key in saved["writes"]:
+                    continue
+                saved["writes"][key] = [task_id, channel, self._dump(value), task_path, write_idx]
+            await self._write(thread_id, entry)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self.store.delete(thread_id)
+
+
+_saver: StoreCheckpointSaver | None = None
+
+
+def get_checkpointer() -> StoreCheckpointSaver:
+    global _saver
+    if _saver is None:
+        _saver = StoreCheckpointSaver()
+    return _saver
+
+
+# 进程内同一运行 ID 的并发调用共享一次执行
+_shared = Coalescer("checkpoint")
+
+
+async def invoke_checkpointed(graph, name: str, state: dict, config: dict | None = None, **kwargs) -> dict:
+    """以输入哈希为运行 ID 调用已配置检查点的图；存在无人持有的未完成运行时从断点继续，成功后清理检查点"""
+    thread_id = run_id(name, state)
+    result, joined = await _shared.run(thread_id, lambda: _invoke_owned(graph, name, thread_id, state, config, kwargs))
+    if joined:
+        metrics.incr(f"checkpoint.{name}.joined")
+    return result
+
+
+async def _invoke_owned(graph, name: str, thread_id: str, state: dict, config: dict | None, kwargs: dict) -> dict:
+    lease = Lease(f"linksoul:checkpoint:{thread_id}:lease", get_settings().checkpoint_lease_seconds)
+    acquired = held = False
+    if redis_available():
+        try:
+            acquired = held = await lease.try_acquire()
+        except (RedisError, OSError):
+            mark_redis_down()
+            acquired = True
+    else:
+        # 没有 Redis 时检查点只在进程内，进程内的合并已保证唯一执行者
+        acquired = True
+
+    if not acquired:
+        metrics.incr(f"checkpoint.{name}.busy")
+        private_id = f"{thread_id}:{lease.owner}"
+        try:
+            return await _invoke(graph, name, private_id, state, config, kwargs, resume=False)
+        finally:
+            await graph.checkpointer.adelete_thread(private_id)
+
+    async with lease.hold() if held else nullcontext():
+        result = await _invoke(graph, name, thread_id, state, config, kwargs, resume=True)
+        await graph.checkpointer.adelete_thread(thread_id)
+    return result
+
+
+async def _invoke(graph, name: str, thread_id: str, state: dict, config: dict | None, kwargs: dict, resume: bool) -> dict:
+    config = dict(config or {})
+    config["configurable"] = {**config.get("configurable", {}), "thread_id": thread_id}
+    if resume:
+        snapshot = await graph.aget_state(config)
+        if snapshot.next:
+            metrics.incr(f"checkpoint.{name}.resumed")
+            tracing.annotate(checkpoint_resumed_at=",".join(snapshot.next))
+            return await graph.ainvoke(None, config, **kwargs)
+    return await graph.ainvoke(state, config, **kwargs)
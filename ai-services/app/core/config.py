@@ -1,6 +1,10 @@
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 
+# 未配置 default 时使用的 R1 预算
+DEFAULT_REASONER_BUDGET = {"reasoning": 1536, "output": 512}
+
 
 class Settings(BaseSettings):
     app_name: str = "LinkSoul AI Service"
@@ -13,6 +17,156 @@ class Settings(BaseSettings):
 
     redis_url: str = "redis://localhost:6379"
 
+    # Agent 图预热方式: background（启动后后台编译）| eager（启动时阻塞编译）| lazy（首次调用时编译）
+    graph_warmup: str = "background"
+
+    # POST 请求幂等去重: 租约时长（执行期间自动续租）、结果保留时长、重复请求最长等待时间
+    idempotency_enabled: bool = True
+    idempotency_lease_seconds: int = 30
+    idempotency_result_ttl_seconds: int = 600
+    idempotency_wait_seconds: int = 180
+    # 未携带 Idempotency-Key 时按请求体内容去重的路由（结果只取决于输入）；生成类路由不在其中
+    idempotency_hash_routes: list[str] = [
+        "/api/v1/match/analyze",
+        "/api/v1/relation/analyze",
+        "/api/v1/personality/analyze",
+        "/api/v1/analysis/screenshot",
+    ]
+    # 客户端断开时取消进行中的 Agent 图与模型调用（共享任务在其他等待方仍在时继续）
+    disconnect_cancel_enabled: bool = True
+
+    # 近重复语义缓存（recognize_emotion / analyze_emotion / select_strategy）: MinHash 估计的 Jaccard 相似度阈值、
+    # 保留时长、命中后台抽检比例（0 关闭，抽检会额外调用模型）
+    semantic_cache_enabled: bool = True
+    semantic_cache_threshold: float = 0.85
+    semantic_cache_ttl_seconds: int = 24 * 3600
+    semantic_cache_audit_rate: float = 0.0
+
+    # Relation Agent 执行模式: staged | fused
+    relation_agent_mode: str = "staged"
+    # 增量重评估: 新增消息/字符数均低于阈值且结果未过期时复用上次评估
+    relation_reeval_min_new_messages: int = 5
+    relation_reeval_min_new_chars: int = 300
+    relation_reeval_max_age_seconds: int = 24 * 3600
+    relation_cache_ttl_seconds: int = 7 * 24 * 3600
+
+    # Match Agent 执行模式: full | tiered
+    match_agent_mode: str = "full"
+    # 分级模式: 规则预估分低于前者时直接用模板理由结束；R1 综合分低于后者时不调用 V3 生成匹配理由
+    match_prescreen_min_score: float = 55.0
+    match_narrative_min_score: float = 70.0
+    # R1 兼容性评估蒸馏: 评估记录数据集（需显式开启，避免测试与基准的假数据混入训练集）、本地模型权重目录（启动时加载最新版本，或指定版本如 v3）；
+    # 本地模型留出集综合分 MAE 不超过上限时替代画像分析与 R1，按比例抽样后台运行 R1 影子，
+    # 最近 compat_shadow_window 次影子比较的 MAE 超过上限时回到 R1
+    compat_dataset_enabled: bool = False
+    compat_dataset_path: str = "data/compatibility.jsonl"
+    compat_model_enabled: bool = True
+    compat_model_dir: str = "models/compatibility"
+    compat_model_version: str = ""
+    compat_model_max_mae: float = 6.0
+    compat_shadow_rate: float = 0.05
+    compat_shadow_window: int = 200
+    compat_shadow_min_samples: int = 20
+
+    # 性格标签缓存（按量化画像分桶）
+    personality_tag_cache_ttl_seconds: int = 30 * 24 * 3600
+    # 两阶段性格分析: 后台结果保留时长与回调设置
+    personality_result_ttl_seconds: int = 24 * 3600
+    # 回调只发往 {backend_internal_url}/api/v1/internal/users/{id}/personality-analysis；留空不回调
+    backend_internal_url: str = ""
+    ai_callback_token: str = ""
+    ai_callback_timeout_seconds: float = 10.0
+
+    # 上游模型熔断: 滑动窗口内调用数达到下限后，错误率或慢调用比例超过阈值即熔断，冷却后放行探测请求
+    breaker_window_seconds: int = 60
+    breaker_min_calls: int = 10
+    breaker_error_rate: float = 0.5
+    breaker_slow_call_rate: float = 0.8
+    breaker_cooldown_seconds: int = 30
+    breaker_chat_slow_seconds: float = 20.0
+    breaker_reasoner_slow_seconds: float = 60.0
+    # 过载降级: 单进程 /api/v1 并发请求数超过该值时，可选节点改用本地规则
+    brownout_enabled: bool = True
+    brownout_max_inflight: int = 32
+
+    # 按用户令牌桶限流（X-User-Id）: 桶容量、每秒补充令牌数、各路由消耗（未列出的路由为 1，R1 路由更贵）
+    rate_limit_enabled: bool = True
+    rate_limit_capacity: int = 30
+    rate_limit_refill_per_second: float = 0.5
+    rate_limit_route_costs: dict[str, int] = {
+        "/api/v1/analysis/screenshot": 2,
+        "/api/v1/match/analyze": 5,
+        "/api/v1/relation/analyze": 5,
+        "/api/v1/personality/analyze": 5,
+        # 预生成登记由后端在收到消息时调用，后台低优先级执行，不占用户令牌
+        "/api/v1/chat/ingest": 0,
+        # 批量接口本身不计费，子请求按各自路由扣减
+        "/api/v1/batch": 0,
+    }
+
+    # 链路追踪: 导出方式 none | stdout | file；无上游 traceparent 时的采样率
+    trace_exporter: str = "none"
+    trace_file: str = "traces.jsonl"
+    trace_sample_rate: float = 0.05
+
+    # R1 各节点 token 预算: reasoning 为推理链、output 为答案，请求的 max_tokens 取两者之和；未配置的节点用 default
+    reasoner_token_budgets: dict[str, dict[str, int]] = {"default": DEFAULT_REASONER_BUDGET}
+
+    # 截图分析: DeepSeek 接口不接收图片，需配置 OpenAI 兼容的视觉模型；未配置时截图分析不可用
+    vision_model: str = ""
+    vision_base_url: str = ""
+    vision_api_key: str = ""
+    # 外部资源抓取: 共享连接池大小、同时下载数上限
+    fetch_max_connections: int = 20
+    fetch_max_concurrency: int = 8
+    # 允许抓取回环 / 私有网段地址，仅用于本地开发与基准（替身源站在 127.0.0.1）
+    fetch_allow_private_networks: bool = False
+    # 截图下载的大小/耗时上限、允许的域名（空表示不限）、解码线程数、缩放后的最长边、按内容哈希缓存的时长
+    screenshot_max_bytes: int = 8 * 1024 * 1024
+    screenshot_fetch_timeout_seconds: float = 10.0
+    # 截图图片域名允许列表；生产环境必须配置（为空时只检查地址是否为公网）
+    screenshot_allowed_hosts: list[str] = []
+    screenshot_decode_workers: int = 2
+    screenshot_max_side: int = 1280
+    screenshot_cache_ttl_seconds: int = 7 * 24 * 3600
+
+    # 玩法方案目录: 开关、每个分桶的方案组数、新鲜期（过期后先返回旧方案再后台刷新）、最长保留时长
+    play_catalog_enabled: bool = True
+    play_catalog_sets: int = 4
+    play_catalog_fresh_seconds: int = 12 * 3600
+    play_catalog_max_stale_seconds: int = 7 * 24 * 3600
+
+    # 聊天建议预生成: 开关、收到消息后的等待时间（合并连发消息）、后台生成的并发槽位（低优先级，过载时跳过）、结果保留时长
+    chat_speculative_enabled: bool = True
+    chat_speculative_delay_seconds: float = 0.5
+    chat_speculative_max_concurrency: int = 4
+    chat_speculative_ttl_seconds: int = 600
+
+    # 批量接口: 单次最多子请求数、所有批次共享的子请求并发执行上限
+    batch_max_items: int = 16
+    batch_max_concurrency: int = 8
+    # 批量性格评分单次最多答案份数（请求体的解析与校验仍在事件循环中进行，需限制规模）
+    personality_batch_max_items: int = 10000
+
+    # 节点级检查点（匹配、关系、性格 Agent）: 相同输入的重试从最后完成的节点继续，检查点保留时长
+    checkpoint_enabled: bool = True
+    checkpoint_ttl_seconds: int = 3600
+    # 运行持有者租约，持有者崩溃后该时长内过期，其他副本才会续跑
+    checkpoint_lease_seconds: int = 30
+
+    # 结构化输出: 以 response_format=json_object 请求 JSON 模式的模型（R1 不支持）
+    structured_json_mode_models: list[str] = ["deepseek-chat"]
+
+    @field_validator("reasoner_token_budgets")
+    @classmethod
+    def _complete_budgets(cls, budgets: dict[str, dict[str, int]]) -> dict[str, dict[str, int]]:
+        """覆盖配置时可以省略 default（补上默认预算），但每项都必须同时给出 reasoning 与 output"""
+        for node, budget in budgets.items():
+            missing = {"reasoning", "output"} - budget.keys()
+            if missing:
+                raise ValueError(f"budget for {node!r} is missing {', '.join(sorted(missing))}")
+        return {"default": DEFAULT_REASONER_BUDGET, **budgets}
+
     class Config:
         env_file = ".env"
 
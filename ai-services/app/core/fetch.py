@@ -0,0 +1,161 @@
+"""外部资源抓取 — 进程共享的 httpx 连接池，流式下载并限制大小、耗时与并发
+
+超过大小上限的响应在读到上限时立即断开，不会把整个文件读入内存；
+同时进行的下载数由信号量限制，避免慢速源站占满连接池和内存。
+
+URL 由调用方提供，抓取前按 SSRF 规则检查: 只允许 http(s)，主机需在允许列表内（列表非空时），
+解析出的地址必须全部是公网地址（拒绝回环、私有、链路本地如 169.254.169.254 等），
+连接固定到检查过的地址，避免检查与连接之间 DNS 结果变化。重定向手动跟随，每一跳重新检查。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import socket
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from . import metrics
+from .config import get_settings
+
+_MAX_REDIRECTS = 3
+
+_client: httpx.AsyncClient | None = None
+_semaphore: asyncio.Semaphore | None = None
+
+
+class FetchError(ValueError):
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        settings = get_settings()
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.fetch_max_connections,
+                max_keepalive_connections=settings.fetch_max_connections,
+            ),
+            # 重定向在 _open 中逐跳检查后跟随
+            follow_redirects=False,
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(get_settings().fetch_max_concurrency)
+    return _semaphore
+
+
+def _check_url(url: str, allowed_hosts: list[str]) -> None:
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise FetchError("invalid_url", "only http(s) URLs are supported")
+    if allowed_hosts and parts.hostname not in allowed_hosts:
+        raise FetchError("host_not_allowed", f"host {parts.hostname} is not allowed")
+
+
+def _is_public(ip: ipaddress.IPv4Address | ipaddress.IPv6Address) -> bool:
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+async def _resolve(host: str, port: int) -> str:
+    """解析主机名，任一地址不是公网地址即拒绝；返回用于连接的地址"""
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise FetchError("dns", f"cannot resolve host {host}") from None
+    addresses = list(dict.fromkeys(ipaddress.ip_address(info[4][0].split("%", 1)[0]) for info in infos))
+    if not get_settings().fetch_allow_private_networks:
+        for ip in addresses:
+            if not _is_public(ip):
+                raise FetchError("host_not_allowed", f"host {host} resolves to non-public address {ip}")
+    return str(addresses[0])
+
+
+async def _open(url: str, allowed_hosts: list[str]) -> httpx.Response:
+    """发起流式 GET，逐跳检查并跟随重定向；返回的响应由调用方关闭"""
+    client = get_http_client()
+    for _ in range(_MAX_REDIRECTS + 1):
+        _check_url(url, allowed_hosts)
+        target = httpx.URL(url)
+        address = await _resolve(target.host, target.port or (443 if target.scheme == "https" else 80))
+        request = client.build_request(
+            "GET",
+            target.copy_with(host=address),
+            # 连接固定到检查过的地址，Host 与 TLS SNI / 证书校验仍使用原主机名
+            headers={"Host": target.netloc.decode("ascii")},
+            extensions={"sni_hostname": target.host} if target.scheme == "https" else None,
+        )
+        resp = await client.send(request, stream=True)
+        if not resp.is_redirect:
+            return resp
+        await resp.aclose()
+        url = str(target.join(resp.headers["location"]))
+    raise FetchError("too_many_redirects", f"more than {_MAX_REDIRECTS} redirects")
+
+
+async def fetch_bytes(
+    url: str,
+    *,
+    max_bytes: int,
+    timeout: float,
+    content_type_prefix: str = "",
+    allowed_hosts: list[str] | None = None,
+    name: str = "default",
+) -> bytes:
+    """流式下载 url 的内容；地址、状态码、类型、大小或耗时不符合要求时抛出 FetchError"""
+    _check_url(url, allowed_hosts or [])
+    started = time.monotonic()
+    try:
+        async with _get_semaphore():
+            metrics.observe(f"fetch.{name}.queue_seconds", time.monotonic() - started)
+            async with asyncio.timeout(timeout):
+                resp = await _open(url, allowed_hosts or [])
+                try:
+                    if resp.status_code != 200:
+                        raise FetchError("bad_status", f"upstream returned {resp.status_code}")
+                    content_type = resp.headers.get("content-type", "")
+                    if content_type_prefix and not content_type.startswith(content_type_prefix):
+                        raise FetchError("bad_content_type", f"unexpected content type {content_type!r}")
+                    declared = resp.headers.get("content-length")
+                    if declared and declared.isdigit() and int(declared) > max_bytes:
+                        raise FetchError("too_large", f"content exceeds {max_bytes} bytes")
+                    body = bytearray()
+                    async for chunk in resp.aiter_bytes():
+                        body.extend(chunk)
+                        if len(body) > max_bytes:
+                            raise FetchError("too_large", f"content exceeds {max_bytes} bytes")
+                finally:
+                    await resp.aclose()
+    except FetchError as exc:
+        metrics.incr(f"fetch.{name}.errors.{exc.reason}")
+        raise
+    except TimeoutError:
+        metrics.incr(f"fetch.{name}.errors.timeout")
+        raise FetchError("timeout", f"download exceeded {timeout:.0f}s") from None
+    except httpx.HTTPError as exc:
+        metrics.incr(f"fetch.{name}.errors.http")
+        raise FetchError("http", f"download failed: {type(exc).__name__}") from exc
+
+    metrics.incr(f"fetch.{name}.requests")
+    metrics.incr(f"fetch.{name}.bytes", len(body))
+    metrics.observe(f"fetch.{name}.seconds", time.monotonic() - started)
+    return bytes(body)
@@ -0,0 +1,88 @@
+"""Agent 图的延迟编译与预热
+
+各 Agent 模块只登记图的构建函数，导入时不加载 langgraph、也不编译；
+图在首次调用时编译，或由启动后的后台预热任务统一编译。
+/api/v1/ready 通过 warm_state() 报告预热状态。
+登记时 checkpoint=True 的图在 checkpoint_enabled 开启时带节点级检查点编译（见 app.core.checkpoint）。
+"""
+
+from __future__ import annotations
+
+import importlib
+import threading
+import time
+from typing import Any, Callable
+
+from . import tracing
+from .config import get_settings
+
+
+class LazyGraph:
+    """首次使用时才编译的 LangGraph 图，接口与已编译图的 ainvoke 一致"""
+
+    def __init__(self, name: str, builder: Callable[[], Any], checkpoint: bool = False):
+        self.name = name
+        self._builder = builder
+        self._checkpoint = checkpoint
+        self._compiled = None
+        self.checkpointed = False
+        self._lock = threading.Lock()
+        self.compile_seconds: float | None = None
+
+    @property
+    def warm(self) -> bool:
+        return self._compiled is not None
+
+    def get(self):
+        if self._compiled is None:
+            with self._lock:
+                if self._compiled is None:
+                    started = time.perf_counter()
+                    checkpointer = None
+                    if self._checkpoint and get_settings().checkpoint_enabled:
+                        from .checkpoint import get_checkpointer
+
+                        checkpointer = get_checkpointer()
+                    compiled = self._builder().compile(checkpointer=checkpointer)
+                    self.checkpointed = checkpointer is not None
+                    self.compile_seconds = round(time.perf_counter() - started, 4)
+                    self._compiled = compiled
+        return self._compiled
+
+    async def ainvoke(self, state: dict, config: dict | None = None, **kwargs):
+        with tracing.span(f"graph.{self.name}") as span:
+            compiled = self.get()
+            if span is not None:
+                config = tracing.graph_config(config, span)
+            if self.checkpointed:
+                from .checkpoint import invoke_checkpointed
+
+                return await invoke_checkpointed(compiled, self.name, state, config, **kwargs)
+            return await compiled.ainvoke(state, config, **kwargs)
+
+
+_graphs: dict[str, LazyGraph] = {}
+
+
+def lazy_graph(name: str, builder: Callable[[], Any], checkpoint: bool = False) -> LazyGraph:
+    graph = _graphs[name] = LazyGraph(name, builder, checkpoint)
+    return graph
+
+
+def warm_up() -> dict:
+    """编译全部已登记的图，并提前导入 LLM 客户端依赖"""
+    importlib.import_module("langchain_openai")
+    for graph in list(_graphs.values()):
+        graph.get()
+    return warm_state()
+
+
+def warm_state() -> dict:
+    return {
+        name: {"warm": graph.warm, "compile_seconds": graph.compile_seconds}
+        for name, graph in _graphs.items()
+    }
+
+
+def all_warm() -> bool:
+    return bool(_graphs) and all(graph.warm for graph in _graphs.values())
@@ -0,0 +1,200 @@
+"""跨副本请求去重 — /api/v1 POST 接口的幂等层
+
+请求键取 Idempotency-Key 请求头（任一路由），缺省时仅对 idempotency_hash_routes 中的路由
+（结果只取决于输入的 R1 / 截图分析路由）取「路径 + 请求体」的内容哈希；生成类路由（如 /chat/suggestions）
+不做隐式去重，用户再次点击即重新生成。请求键按 X-User-Id 隔离。
+同一 Idempotency-Key 携带不同请求体时返回 422，不回放其他请求的响应。
+只保存状态码 < 500 且未降级（无 X-Degraded）的响应，降级结果不会在保留期内被回放。
+第一个到达的副本在 Redis 中获取租约并执行请求，执行期间定期续租；其他副本
+上的重复请求轮询等待并直接回放其保存的响应，不再重复运行 Agent 图。
+worker 崩溃后续租停止，租约按 TTL 自然过期，等待方随后接手重新执行。
+同一进程内的重复请求直接共享同一个执行任务；Redis 不可用时只做进程内去重。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from typing import Awaitable, Callable
+
+from redis.exceptions import RedisError
+
+from . import metrics
+from .cancellation import Coalescer
+from .config import get_settings
+from .redis import Lease, get_redis, mark_redis_down, redis_available
+
+_POLL_SECONDS = 0.2
+
+# 进程内正在执行的请求；客户端断开的等待方离开，其余等待方仍拿到结果
+_shared = Coalescer("idempotency")
+
+
+def request_key(path: str, body: bytes, header_key: str | None, user_id: str | None = None) -> str:
+    scope = f"{user_id or ''}|{path}"
+    if header_key:
+        return f"key:{hashlib.sha256(f'{scope}|{header_key}'.encode()).hexdigest()}"
+    return f"hash:{hashlib.sha256(scope.encode() + b'|' + body).hexdigest()}"
+
+
+def _json_response(status: int, content: dict) -> dict:
+    body = json.dumps(content).encode()
+    return {
+        "status": status,
+        "headers": [["content-type", "application/json"], ["content-length", str(len(body))]],
+        "body": base64.b64encode(body).decode(),
+    }
+
+
+def _degraded(response: dict) -> bool:
+    return any(name.lower() == "x-degraded" for name, _ in response["headers"])
+
+
+async def run_once(key: str, fingerprint: str, compute: Callable[[], Awaitable[dict]]) -> tuple[dict, bool]:
+    """执行或等待同一请求键的结果，返回 (响应, 是否为回放)；fingerprint 为请求体摘要"""
+    # 进程内只合并请求体也相同的请求；同键不同请求体的冲突由保存的结果判定
+    (response, replayed), joined = await _shared.run(
+        f"{key}|{fingerprint}", lambda: _run_distributed(key, fingerprint, compute),
+    )
+    if joined:
+        metrics.incr("idempotency.local_joined")
+        return response, True
+    return response, replayed
+
+
+async def _run_distributed(key: str, fingerprint: str, compute: Callable[[], Awaitable[dict]]) -> tuple[dict, bool]:
+    settings = get_settings()
+    result_key = f"linksoul:idem:{key}:result"
+    lease = Lease(f"linksoul:idem:{key}:lease", settings.idempotency_lease_seconds)
+    deadline = time.monotonic() + settings.idempotency_wait_seconds
+
+    while redis_available():
+        try:
+            redis = get_redis()
+            cached = await redis.get(result_key)
+            if cached:
+                response = json.loads(cached)
+                if response.pop("fingerprint", fingerprint) != fingerprint:
+                    metrics.incr("idempotency.conflicts")
+                    return _json_response(422, {"detail": "Idempotency-Key reused with a different request body"}), False
+                metrics.incr("idempotency.replayed")
+                return response, True
+            acquired = await lease.try_acquire()
+        except (RedisError, OSError):
+            mark_redis_down()
+            break
+        if acquired:
+            return await _run_as_owner(result_key, lease, fingerprint, compute), False
+        if time.monotonic() >= deadline:
+            metrics.incr("idempotency.wait_timeout")
+            break
+        await asyncio.sleep(_POLL_SECONDS)
+
+    return await compute(), False
+
+
+async def _run_as_owner(result_key: str, lease: Lease, fingerprint: str, compute: Callable[[], Awaitable[dict]]) -> dict:
+    settings = get_settings()
+    redis = get_redis()
+    metrics.incr("idempotency.executed")
+    async with lease.hold():
+        response = await compute()
+
+    if _degraded(response):
+        # 降级结果只给当前及同时等待的请求，不保存供回放
+        metrics.incr("idempotency.degraded_not_stored")
+    elif response["status"] < 500:
+        try:
+            await redis.set(
+                result_key, json.dumps({**response, "fingerprint": fingerprint}),
+                ex=settings.idempotency_result_ttl_seconds,
+            )
+        except (RedisError, OSError):
+            mark_redis_down()
+    return response
+
+
+# ── ASGI Middleware ────────────────────────────────────
+
+class IdempotencyMiddleware:
+    """对 /api/v1 下携带 Idempotency-Key 或在 idempotency_hash_routes 中的 POST 请求去重，回放的响应带 Idempotency-Replayed: true"""
+
+    def __init__(self, app, prefix: str = "/api/v1/"):
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not scope["path"].startswith(self.prefix)
+            or not get_settings().idempotency_enabled
+            or b"application/x-ndjson" in dict(scope["headers"]).get(b"accept", b"")
+        ):
+            # 流式响应（如 /batch 的 NDJSON）无法整体缓存后回放，直接放行
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        header_key = headers.get(b"idempotency-key", b"").decode("latin-1") or None
+        if header_key is None and scope["path"] not in get_settings().idempotency_hash_routes:
+            await self.app(scope, receive, send)
+            return
+
+        body = await _read_body(receive)
+        user_id = headers.get(b"x-user-id", b"").decode("latin-1") or None
+        key = request_key(scope["path"], body, header_key, user_id)
+        fingerprint = hashlib.sha256(body).hexdigest()
+
+        response, replayed = await run_once(key, fingerprint, lambda: _capture(self.app, scope, body))
+        await _send(send, response, replayed)
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def _capture(app, scope, body: bytes) -> dict:
+    """在内存中执行下游应用，收集完整响应"""
+    sent = False
+    response = {"status": 500, "headers": [], "body": b""}
+    chunks = []
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.Event().wait()  # 下游不应再读取请求体，保持挂起直到任务结束
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = [
+                [k.decode("latin-1"), v.decode("latin-1")] for k, v in message.get("headers", [])
+            ]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    response["body"] = base64.b64encode(b"".join(chunks)).decode()
+    return response
+
+
+async def _send(send, response: dict, replayed: bool) -> None:
+    headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in response["headers"]]
+    if replayed:
+        headers.append((b"idempotency-replayed", b"true"))
+    await send({"type": "http.response.start", "status": response["status"], "headers": headers})
+    await send({"type": "http.response.body", "body": base64.b64decode(response["body"])})
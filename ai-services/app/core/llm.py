@@ -1,9 +1,24 @@
-from langchain_openai import ChatOpenAI
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from .cancellation import track_cancellation
 from .config import get_settings
+from .reasoning import ReasoningCallback, split_think, token_budget
+from .resilience import guard_model
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+# langchain_openai 导入耗时较长，推迟到首次创建客户端时再加载
+# 模型熔断中时创建客户端直接抛出 CircuitOpenError，不再发起上游调用
 
 
 def get_chat_llm() -> ChatOpenAI:
     """DeepSeek V3 — 日常对话、聊天建议、情绪分析、内容生成"""
+    from langchain_openai import ChatOpenAI
+
     settings = get_settings()
     return ChatOpenAI(
         model=settings.deepseek_chat_model,
@@ -11,16 +26,82 @@ def get_chat_llm() -> ChatOpenAI:
         base_url=f"{settings.deepseek_base_url}/v1",
         temperature=0.8,
         max_tokens=1024,
+        callbacks=[
+            guard_model(settings.deepseek_chat_model, settings.breaker_chat_slow_seconds),
+            track_cancellation(settings.deepseek_chat_model),
+        ],
     )
 
 
-def get_reasoner_llm() -> ChatOpenAI:
-    """DeepSeek R1 — 关系阶段推理、匹配算法决策、复杂分析"""
+def get_vision_llm() -> ChatOpenAI:
+    """视觉模型（OpenAI 兼容接口）— 聊天截图分析；DeepSeek 接口不接收图片，需单独配置"""
+    from langchain_openai import ChatOpenAI
+
     settings = get_settings()
     return ChatOpenAI(
+        model=settings.vision_model,
+        api_key=settings.vision_api_key,
+        base_url=settings.vision_base_url,
+        temperature=0.3,
+        max_tokens=1024,
+        callbacks=[
+            guard_model(settings.vision_model, settings.breaker_chat_slow_seconds),
+            track_cancellation(settings.vision_model),
+        ],
+    )
+
+
+@lru_cache
+def _reasoner_class() -> type[ChatOpenAI]:
+    """保留 R1 推理内容的 ChatOpenAI 子类
+
+    langchain_openai 会丢弃 DeepSeek 返回的 reasoning_content；这里把它（或内联在答案开头的
+    <think> 块）移入 additional_kwargs["reasoning_content"]，message.content 只保留答案。
+    """
+    from langchain_openai import ChatOpenAI
+
+    class DeepSeekReasoner(ChatOpenAI):
+        def _create_chat_result(self, response, generation_info=None):
+            result = super()._create_chat_result(response, generation_info)
+            choices = (response if isinstance(response, dict) else response.model_dump()).get("choices") or []
+            for generation, choice in zip(result.generations, choices):
+                message = generation.message
+                reasoning = (choice.get("message") or {}).get("reasoning_content") or ""
+                if not reasoning and isinstance(message.content, str):
+                    reasoning, message.content = split_think(message.content)
+                    generation.text = message.content
+                if reasoning:
+                    message.additional_kwargs["reasoning_content"] = reasoning
+            return result
+
+        def _convert_chunk_to_generation_chunk(self, chunk, default_chunk_class, base_generation_info):
+            generation_chunk = super()._convert_chunk_to_generation_chunk(chunk, default_chunk_class, base_generation_info)
+            choices = chunk.get("choices") or []
+            if generation_chunk is not None and choices:
+                reasoning = (choices[0].get("delta") or {}).get("reasoning_content")
+                if reasoning:
+                    generation_chunk.message.additional_kwargs["reasoning_content"] = reasoning
+            return generation_chunk
+
+    return DeepSeekReasoner
+
+
+def get_reasoner_llm(node: str | None = None) -> ChatOpenAI:
+    """DeepSeek R1 — 关系阶段推理、匹配算法决策、复杂分析
+
+    node 决定 token 预算（Settings.reasoner_token_budgets）与推理遥测的指标名。
+    """
+    settings = get_settings()
+    reasoning_budget, output_budget = token_budget(node)
+    return _reasoner_class()(
         model=settings.deepseek_reasoner_model,
         api_key=settings.deepseek_api_key,
         base_url=f"{settings.deepseek_base_url}/v1",
         temperature=0.0,
-        max_tokens=2048,
+        max_tokens=reasoning_budget + output_budget,
+        callbacks=[
+            guard_model(settings.deepseek_reasoner_model, settings.breaker_reasoner_slow_seconds),
+            ReasoningCallback(node or "default", reasoning_budget),
+            track_cancellation(settings.deepseek_reasoner_model),
+        ],
     )
@@ -0,0 +1,44 @@
+"""进程内运行指标 — 计数器与耗时统计，通过 /api/v1/metrics 暴露
+
+计数只存在于当前进程：gunicorn 多 worker 部署时每个 worker 各有一份，/metrics 返回的是处理该请求的
+worker 的数据，整体数值需由采集端按 worker 累加。这些计数只用于观测，不参与任何决策。
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+
+_counters: dict[str, float] = defaultdict(float)
+_timings: dict[str, dict[str, float]] = {}
+
+
+def incr(name: str, value: float = 1) -> None:
+    _counters[name] += value
+
+
+def observe(name: str, seconds: float) -> None:
+    stat = _timings.get(name)
+    if stat is None:
+        stat = _timings[name] = {"count": 0, "total": 0.0, "max": 0.0}
+    stat["count"] += 1
+    stat["total"] += seconds
+    stat["max"] = max(stat["max"], seconds)
+
+
+def ratio(numerator: str, denominator: str) -> float:
+    total = _counters.get(denominator, 0)
+    return round(_counters.get(numerator, 0) / total, 4) if total else 0.0
+
+
+def snapshot() -> dict:
+    return {
+        "counters": dict(_counters),
+        "timings": {
+            name: {
+                "count": int(stat["count"]),
+                "avg": round(stat["total"] / stat["count"], 4) if stat["count"] else 0.0,
+                "max": round(stat["max"], 4),
+            }
+            for name, stat in _timings.items()
+        },
+    }
@@ -0,0 +1,148 @@
+"""按用户的分布式令牌桶限流
+
+用户标识取 X-User-Id 请求头（由后端透传），令牌桶状态保存在 Redis 哈希中，
+多个副本共享同一个桶。补充令牌与扣减在一个 Lua 脚本中原子完成，
+热路径上只有一次 EVALSHA 往返。不同路由消耗的令牌数不同，R1 推理路由更贵。
+令牌不足时返回 429 与 Retry-After；Redis 不可用时退化为进程内令牌桶。
+未携带用户标识的请求（内部调用）不限流。
+
+中间件同时把 X-User-Id 放入上下文（current_user_id），供按用户隔离数据的路由读取；
+批量子请求在批量请求的上下文中执行，沿用同一用户。
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import time
+from contextvars import ContextVar
+
+from redis.exceptions import RedisError
+
+from . import metrics
+from .config import get_settings
+from .redis import get_redis, mark_redis_down, redis_available
+
+_user_id: ContextVar[str | None] = ContextVar("user_id", default=None)
+
+
+def current_user_id() -> str | None:
+    """当前请求的 X-User-Id（未携带时为 None）"""
+    return _user_id.get()
+
+
+# 使用 Redis 服务器时间，避免各副本时钟偏差导致补充速度不一致
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - ts, 0) * rate / 1000)
+local retry_ms = 0
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_ms = math.ceil((cost - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + 1000)
+return {allowed, retry_ms, math.floor(tokens)}
+"""
+_LOCAL_MAX_BUCKETS = 10_000
+
+_script = None
+# 本地回退: 用户 → (剩余令牌, 上次补充时间)
+_local_buckets: dict[str, tuple[float, float]] = {}
+
+
+def route_cost(path: str) -> int:
+    settings = get_settings()
+    return min(settings.rate_limit_route_costs.get(path, 1), settings.rate_limit_capacity)
+
+
+async def acquire(user_id: str, cost: int) -> tuple[bool, float, int]:
+    """扣减令牌，返回 (是否放行, 需等待秒数, 剩余令牌)"""
+    global _script
+    settings = get_settings()
+    capacity, rate = settings.rate_limit_capacity, settings.rate_limit_refill_per_second
+    if redis_available():
+        try:
+            if _script is None:
+                _script = get_redis().register_script(_TOKEN_BUCKET_SCRIPT)
+            allowed, retry_ms, remaining = await _script(
+                keys=[f"linksoul:ratelimit:{user_id}"], args=[capacity, rate, cost]
+            )
+            return bool(allowed), int(retry_ms) / 1000, int(remaining)
+        except (RedisError, OSError):
+            mark_redis_down()
+    return _acquire_local(user_id, cost, capacity, rate)
+
+
+def _acquire_local(user_id: str, cost: int, capacity: int, rate: float) -> tuple[bool, float, int]:
+    now = time.monotonic()
+    tokens, ts = _local_buckets.pop(user_id, (capacity, now))
+    tokens = min(capacity, tokens + (now - ts) * rate)
+    allowed = tokens >= cost
+    retry = 0.0 if allowed else (cost - tokens) / rate
+    if allowed:
+        tokens -= cost
+    if len(_local_buckets) >= _LOCAL_MAX_BUCKETS:
+        _local_buckets.pop(next(iter(_local_buckets)))
+    _local_buckets[user_id] = (tokens, now)
+    return allowed, retry, int(tokens)
+
+
+# ── ASGI Middleware ────────────────────────────────────
+
+class RateLimitMiddleware:
+    """对携带 X-User-Id 的 /api/v1 POST 请求按用户限流，并记录当前请求的用户"""
+
+    def __init__(self, app, prefix: str = "/api/v1/"):
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+        user_id = dict(scope["headers"]).get(b"x-user-id", b"").decode("latin-1")
+        token = _user_id.set(user_id or None)
+        try:
+            await self._limit(scope, receive, send, user_id)
+        finally:
+            _user_id.reset(token)
+
+    async def _limit(self, scope, receive, send, user_id: str) -> None:
+        if scope["method"] != "POST" or not get_settings().rate_limit_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        if not user_id:
+            metrics.incr("rate_limit.unkeyed")
+            await self.app(scope, receive, send)
+            return
+
+        metrics.incr("rate_limit.requests")
+        allowed, retry_after, _ = await acquire(user_id, route_cost(scope["path"]))
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+
+        metrics.incr("rate_limit.limited")
+        body = json.dumps({"detail": "rate limit exceeded", "retry_after": retry_after}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(math.ceil(retry_after), 1)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
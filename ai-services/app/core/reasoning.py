@@ -0,0 +1,85 @@
+"""R1 推理预算与推理遥测
+
+每个 R1 节点在 Settings.reasoner_token_budgets 中配置推理链与答案两部分的 token 预算，
+DeepSeek 接口只接受一个 max_tokens（推理链 + 答案），因此请求上限取两者之和，
+推理链超出自身预算时记为 over_budget，供按节点收紧预算时参考。
+
+推理内容（reasoning_content 或内联的 <think> 块）与答案分开保存在
+message.additional_kwargs["reasoning_content"] 中，不参与输出解析。
+"""
+
+from __future__ import annotations
+
+import re
+import time
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+from . import metrics
+from .config import get_settings
+
+_THINK_RE = re.compile(r"^\s*<think>(.*?)(?:</think>|$)", re.S)
+
+
+def token_budget(node: str | None) -> tuple[int, int]:
+    """返回节点的 (推理链预算, 答案预算)，未配置的节点使用 default"""
+    budgets = get_settings().reasoner_token_budgets
+    budget = budgets.get(node or "default") or budgets["default"]
+    return int(budget["reasoning"]), int(budget["output"])
+
+
+def split_think(text: str) -> tuple[str, str]:
+    """把内联在答案开头的 <think> 块拆出来，返回 (推理内容, 答案)"""
+    match = _THINK_RE.match(text or "")
+    if match is None:
+        return "", text
+    return match.group(1).strip(), text[match.end():].strip()
+
+
+def _reasoning_tokens(response) -> tuple[int, int, str]:
+    """从 LLMResult 中取 (推理 token, 输出 token, finish_reason)"""
+    try:
+        generation = response.generations[0][0]
+    except (AttributeError, IndexError):
+        return 0, 0, ""
+    usage = getattr(generation.message, "usage_metadata", None) or {}
+    reasoning = (usage.get("output_token_details") or {}).get("reasoning") or 0
+    finish = (generation.generation_info or {}).get("finish_reason") or ""
+    return int(reasoning), int(usage.get("output_tokens") or 0), finish
+
+
+class ReasoningCallback(AsyncCallbackHandler):
+    """按节点记录推理 token、推理耗时、超预算与截断次数
+
+    非流式调用拿不到推理链结束的时刻，推理耗时按推理 token 占输出 token 的比例从总耗时中估算。
+    """
+
+    def __init__(self, node: str, reasoning_budget: int):
+        self.node = node
+        self.reasoning_budget = reasoning_budget
+        self._started: dict[UUID, float] = {}
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs) -> None:
+        self._started[run_id] = time.monotonic()
+
+    async def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        elapsed = time.monotonic() - started
+        reasoning, output, finish = _reasoning_tokens(response)
+        prefix = f"reasoning.{self.node}"
+        metrics.incr(f"{prefix}.calls")
+        metrics.incr(f"{prefix}.reasoning_tokens", reasoning)
+        metrics.incr(f"{prefix}.answer_tokens", max(output - reasoning, 0))
+        metrics.observe(f"{prefix}.latency", elapsed)
+        if output:
+            metrics.observe(f"{prefix}.reasoning_seconds", elapsed * reasoning / output)
+        if reasoning > self.reasoning_budget:
+            metrics.incr(f"{prefix}.over_budget")
+        if finish == "length":
+            metrics.incr(f"{prefix}.truncated")
+
+    async def on_llm_error(self, error, *, run_id: UUID, **kwargs) -> None:
+        self._started.pop(run_id, None)
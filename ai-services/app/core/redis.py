@@ -0,0 +1,160 @@
+"""Redis 连接与带本地回退的 JSON 键值存储"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+import uuid
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import AsyncIterator
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from .config import get_settings
+
+# 仅当租约仍归属自己时才续期/释放，避免误删其他副本接手后的租约
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Redis 出错后在该时间窗内直接走本地回退，避免每个请求都等待连接超时
+_REDIS_RETRY_SECONDS = 30.0
+_redis_down_until = 0.0
+# 本地回退字典的容量上限，超出时淘汰最早写入的条目
+_LOCAL_MAX_ENTRIES = 10_000
+
+
+@lru_cache
+def get_redis() -> aioredis.Redis:
+    settings = get_settings()
+    return aioredis.from_url(
+        settings.redis_url,
+        decode_responses=True,
+        socket_connect_timeout=0.5,
+        socket_timeout=1.0,
+    )
+
+
+def redis_available() -> bool:
+    return time.monotonic() >= _redis_down_until
+
+
+def mark_redis_down() -> None:
+    global _redis_down_until
+    _redis_down_until = time.monotonic() + _REDIS_RETRY_SECONDS
+
+
+class JsonStore:
+    """按前缀隔离的 JSON 存储；Redis 不可用时退化为进程内 TTL 字典"""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._local: dict[str, tuple[float, str]] = {}
+
+    def _key(self, key: str) -> str:
+        return f"linksoul:{self.prefix}:{key}"
+
+    def _get_local(self, full_key: str) -> dict | list | None:
+        entry = self._local.get(full_key)
+        if entry is None:
+            return None
+        expires_at, raw = entry
+        if expires_at < time.monotonic():
+            self._local.pop(full_key, None)
+            return None
+        return json.loads(raw)
+
+    async def get(self, key: str) -> dict | list | None:
+        full_key = self._key(key)
+        if redis_available():
+            try:
+                raw = await get_redis().get(full_key)
+                return json.loads(raw) if raw else None
+            except (RedisError, OSError):
+                mark_redis_down()
+        return self._get_local(full_key)
+
+    async def get_many(self, keys: list[str]) -> list[dict | list | None]:
+        """一次读取多个键（Redis 上为一次 MGET），按 keys 顺序返回"""
+        if not keys:
+            return []
+        full_keys = [self._key(key) for key in keys]
+        if redis_available():
+            try:
+                raws = await get_redis().mget(full_keys)
+                return [json.loads(raw) if raw else None for raw in raws]
+            except (RedisError, OSError):
+                mark_redis_down()
+        return [self._get_local(full_key) for full_key in full_keys]
+
+    async def set(self, key: str, value: dict | list, ttl: int) -> None:
+        full_key = self._key(key)
+        raw = json.dumps(value, ensure_ascii=False)
+        if redis_available():
+            try:
+                await get_redis().set(full_key, raw, ex=ttl)
+                return
+            except (RedisError, OSError):
+                mark_redis_down()
+        self._local.pop(full_key, None)
+        if len(self._local) >= _LOCAL_MAX_ENTRIES:
+            self._local.pop(next(iter(self._local)))
+        self._local[full_key] = (time.monotonic() + ttl, raw)
+
+    async def delete(self, key: str) -> None:
+        full_key = self._key(key)
+        self._local.pop(full_key, None)
+        if redis_available():
+            try:
+                await get_redis().delete(full_key)
+            except (RedisError, OSError):
+                mark_redis_down()
+
+
+class Lease:
+    """Redis 上的独占租约: SET NX 获取，持有期间定期续期，只有持有者能续期和释放
+
+    持有进程崩溃后续期停止，租约按 TTL 过期，其他副本即可接手。
+    """
+
+    def __init__(self, key: str, ttl_seconds: float):
+        self.key = key
+        self.ttl_seconds = ttl_seconds
+        self.owner = uuid.uuid4().hex
+
+    async def try_acquire(self) -> bool:
+        """尝试获取租约；Redis 错误原样抛出，由调用方决定回退方式"""
+        return bool(await get_redis().set(self.key, self.owner, nx=True, px=int(self.ttl_seconds * 1000)))
+
+    async def _renew(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl_seconds / 3)
+            try:
+                await get_redis().eval(_RENEW_SCRIPT, 1, self.key, self.owner, int(self.ttl_seconds * 1000))
+            except (RedisError, OSError):
+                return
+
+    @asynccontextmanager
+    async def hold(self) -> AsyncIterator[None]:
+        """已获取租约后使用: 块内定期续期，退出时释放"""
+        renewer = asyncio.create_task(self._renew())
+        try:
+            yield
+        finally:
+            renewer.cancel()
+            try:
+                await get_redis().eval(_RELEASE_SCRIPT, 1, self.key, self.owner)
+            except (RedisError, OSError):
+                mark_redis_down()
@@ -0,0 +1,227 @@
+"""上游模型熔断与过载降级（brownout）
+
+每个上游模型一个熔断器，按滑动窗口内的错误率和慢调用比例判断：
+超过阈值即熔断，冷却期内获取该模型的客户端直接抛出 CircuitOpenError，
+冷却结束后放行一个探测请求，成功则恢复。
+
+降级策略：服务过载（进程内并发请求数超过阈值）或节点依赖的模型已熔断时，
+可选节点（select_strategy、LLM safety_filter、deep_analysis）改用本地规则，
+并通过 mark_degraded() 记录，响应头 X-Degraded 列出被降级的节点。
+
+熔断器与并发请求数都是进程内状态：gunicorn 多 worker 时每个 worker 只根据自己观测到的调用独立熔断，
+brownout_max_inflight 也按单个 worker 计。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+from . import metrics
+from .config import get_settings
+
+
+class CircuitOpenError(RuntimeError):
+    def __init__(self, model: str):
+        super().__init__(f"circuit open for model {model}")
+        self.model = model
+
+
+# ── Circuit Breaker ────────────────────────────────────
+
+class CircuitBreaker:
+    def __init__(self, name: str, slow_call_seconds: float):
+        self.name = name
+        self.slow_call_seconds = slow_call_seconds
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probe_started_at: float | None = None
+        self._window: deque[tuple[float, bool, float]] = deque()
+
+    def _trim(self, now: float) -> None:
+        horizon = now - get_settings().breaker_window_seconds
+        while self._window and self._window[0][0] < horizon:
+            self._window.popleft()
+
+    def allow(self) -> bool:
+        settings = get_settings()
+        now = time.monotonic()
+        if self.state == "open":
+            if now - self.opened_at < settings.breaker_cooldown_seconds:
+                return False
+            self.state = "half_open"
+            self.probe_started_at = None
+        if self.state == "half_open":
+            # 同一时间只放行一个探测请求；探测方迟迟不回报时按冷却期超时重新放行
+            if self.probe_started_at is not None and now - self.probe_started_at < settings.breaker_cooldown_seconds:
+                return False
+            self.probe_started_at = now
+        return True
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == "open" and time.monotonic() - self.opened_at < get_settings().breaker_cooldown_seconds
+
+    def record(self, ok: bool, latency: float) -> None:
+        settings = get_settings()
+        now = time.monotonic()
+        slow = latency >= self.slow_call_seconds
+        if self.state == "half_open":
+            if ok and not slow:
+                self.state = "closed"
+                self._window.clear()
+            else:
+                self._open(now)
+            return
+        self._window.append((now, ok, latency))
+        self._trim(now)
+        calls = len(self._window)
+        if calls < settings.breaker_min_calls:
+            return
+        errors = sum(1 for _, success, _ in self._window if not success)
+        slow_calls = sum(1 for _, _, lat in self._window if lat >= self.slow_call_seconds)
+        if errors / calls >= settings.breaker_error_rate or slow_calls / calls >= settings.breaker_slow_call_rate:
+            self._open(now)
+
+    def _open(self, now: float) -> None:
+        self.state = "open"
+        self.opened_at = now
+        self.probe_started_at = None
+        metrics.incr(f"breaker.{self.name}.opened")
+
+    def snapshot(self) -> dict:
+        self._trim(time.monotonic())
+        calls = len(self._window)
+        return {
+            "state": "open" if self.is_open else ("half_open" if self.state != "closed" else "closed"),
+            "calls": calls,
+            "error_rate": round(sum(1 for _, ok, _ in self._window if not ok) / calls, 3) if calls else 0.0,
+            "avg_latency": round(sum(lat for _, _, lat in self._window) / calls, 3) if calls else 0.0,
+        }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(model: str, slow_call_seconds: float) -> CircuitBreaker:
+    breaker = _breakers.get(model)
+    if breaker is None:
+        breaker = _breakers[model] = CircuitBreaker(model, slow_call_seconds)
+    return breaker
+
+
+def guard_model(model: str, slow_call_seconds: float) -> "BreakerCallback":
+    """获取模型客户端前调用：熔断中直接抛出 CircuitOpenError，否则返回记录结果的回调"""
+    breaker = get_breaker(model, slow_call_seconds)
+    if not breaker.allow():
+        metrics.incr(f"breaker.{model}.rejected")
+        raise CircuitOpenError(model)
+    return BreakerCallback(breaker)
+
+
+class BreakerCallback(AsyncCallbackHandler):
+    """通过 LangChain 回调把每次调用的成败与耗时回报给熔断器"""
+
+    def __init__(self, breaker: CircuitBreaker):
+        self.breaker = breaker
+        self._started: dict[UUID, float] = {}
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs) -> None:
+        self._started[run_id] = time.monotonic()
+
+    async def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            self.breaker.record(True, time.monotonic() - started)
+
+    async def on_llm_error(self, error, *, run_id: UUID, **kwargs) -> None:
+        started = self._started.pop(run_id, None)
+        if started is None or isinstance(error, asyncio.CancelledError):
+            return
+        # 流式输出被调用方提前关闭（GeneratorExit）不是上游故障
+        self.breaker.record(isinstance(error, GeneratorExit), time.monotonic() - started)
+
+
+def model_unavailable(model: str) -> bool:
+    breaker = _breakers.get(model)
+    return breaker is not None and breaker.is_open
+
+
+# ── Brownout ───────────────────────────────────────────
+
+_inflight = 0
+_degraded_nodes: ContextVar[list[str] | None] = ContextVar("degraded_nodes", default=None)
+
+
+def overloaded() -> bool:
+    return _inflight > get_settings().brownout_max_inflight
+
+
+def should_degrade(node: str, model: str) -> bool:
+    """可选节点是否应跳过 LLM：服务过载或所依赖模型已熔断"""
+    if not get_settings().brownout_enabled:
+        return False
+    return overloaded() or model_unavailable(model)
+
+
+def mark_degraded(node: str) -> None:
+    metrics.incr(f"brownout.degraded.{node}")
+    nodes = _degraded_nodes.get()
+    if nodes is not None and node not in nodes:
+        nodes.append(node)
+
+
+@contextmanager
+def track_request() -> Iterator[list[str]]:
+    """计入进程内并发请求数，并收集其间被降级的节点（嵌套时同时并入外层请求）"""
+    global _inflight
+    parent = _degraded_nodes.get()
+    nodes: list[str] = []
+    token = _degraded_nodes.set(nodes)
+    _inflight += 1
+    try:
+        yield nodes
+    finally:
+        _inflight -= 1
+        _degraded_nodes.reset(token)
+        if parent is not None:
+            parent.extend(node for node in nodes if node not in parent)
+
+
+def brownout_state() -> dict:
+    return {
+        "overloaded": overloaded(),
+        "inflight": _inflight,
+        "max_inflight": get_settings().brownout_max_inflight,
+        "breakers": {name: breaker.snapshot() for name, breaker in _breakers.items()},
+    }
+
+
+class BrownoutMiddleware:
+    """统计 /api/v1 并发请求数，并在响应头 X-Degraded 中列出被降级的节点"""
+
+    def __init__(self, app, prefix: str = "/api/v1/"):
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+
+        with track_request() as nodes:
+            async def send_with_header(message):
+                if message["type"] == "http.response.start" and nodes:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-degraded", ",".join(nodes).encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_header)
@@ -0,0 +1,34 @@
+"""/api/v1 路由的 JSON 响应类
+
+新版 FastAPI 在声明 response_model 时会直接用 Pydantic（Rust 内核）序列化为
+JSON 字节，此时保留默认响应类才能走这条快路径；旧版 FastAPI 则会先转成
+Python dict 再经标准库 json 序列化，这里改用 orjson。
+"""
+
+from __future__ import annotations
+
+import inspect
+from typing import Any
+
+from fastapi.datastructures import Default
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson 在 requirements 中，缺失时退回标准库
+    orjson = None
+
+_PYDANTIC_DUMPS_JSON = "dump_json" in inspect.signature(serialize_response).parameters
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def api_response_class():
+    """返回 APIRouter 的 default_response_class"""
+    if _PYDANTIC_DUMPS_JSON or orjson is None:
+        return Default(JSONResponse)
+    return ORJSONResponse
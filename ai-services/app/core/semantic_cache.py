@@ -0,0 +1,196 @@
+"""近重复语义缓存 — 文本仅有空白、表情或语气词差异的请求复用已有结果
+
+精确键缓存对聊天上下文几乎无效：同一段对话多一个空格、换一个表情就是另一个键。这里先在本地规整文本
+（NFKC、小写、去空白/标点/表情、去语气词、叠字截断），取字符二元组的 MinHash 签名，
+再用 LSH 分段（bands × rows）找候选，签名估计的 Jaccard 相似度不低于 semantic_cache_threshold 即命中。
+
+- 作用域: 调用方给出必须完全一致的条件（关系阶段、画像特质、情绪等），不同作用域互不命中
+- focus: 可选的「关键片段」（如聊天上下文的最后一条消息），整体与关键片段都需达到阈值，
+  避免只新增了一条消息的上下文命中上一条消息的结果
+- 存储: 条目与 LSH 分段索引都放在 JsonStore（Redis，不可用时为进程内字典），一次查询两次 MGET
+- 抽检: 按 semantic_cache_audit_rate 抽取命中，在后台重新调用模型并与缓存结果比较，
+  不一致计为误命中（semantic.false_hits / semantic.audited）；抽检不影响本次响应
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+import unicodedata
+from typing import Any, Awaitable, Callable
+
+import numpy as np
+
+from . import metrics, tracing
+from .config import get_settings
+from .redis import JsonStore
+from .resilience import overloaded
+
+logger = logging.getLogger(__name__)
+
+_NUM_PERM = 64
+_BANDS = 16
+_ROWS = _NUM_PERM // _BANDS
+# 每个分段桶最多保留的条目数（新条目在前）
+_BUCKET_SIZE = 8
+
+# 固定种子: 各副本的签名一致，可以共享 Redis 中的索引
+_rng = np.random.default_rng(0x5E3A)
+_PERM_A = _rng.integers(1, 2**63, size=_NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_PERM_B = _rng.integers(0, 2**63, size=_NUM_PERM, dtype=np.uint64)
+
+_FILLERS = re.compile(r"嗯|啊|呀|哦|噢|呢|吧|啦|嘛|诶|欸|呃")
+_REPEATS = re.compile(r"(.)\1{2,}")
+
+
+def normalize(text: str) -> str:
+    """去掉不影响语义判断的差异: 全半角、大小写、空白、标点、表情、语气词、三个以上的叠字"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = "".join(
+        ch for ch in text
+        if not unicodedata.category(ch).startswith(("Z", "P", "S", "C", "Mn"))
+    )
+    text = _FILLERS.sub("", text)
+    return _REPEATS.sub(r"\1\1", text)
+
+
+def signature(text: str) -> np.ndarray:
+    """规整后文本字符二元组的 MinHash 签名（uint32 × _NUM_PERM）"""
+    norm = normalize(text)
+    shingles = {norm[i:i + 2] for i in range(max(len(norm) - 1, 1))}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "little") for s in shingles],
+        dtype=np.uint64,
+    )
+    # multiply-shift 哈希族: uint64 溢出回绕后取高 32 位
+    mixed = (hashes[:, None] * _PERM_A[None, :] + _PERM_B[None, :]) >> np.uint64(32)
+    return mixed.min(axis=0).astype(np.uint32)
+
+
+def similarity(a, b) -> float:
+    return float(np.mean(np.asarray(a, dtype=np.uint32) == np.asarray(b, dtype=np.uint32)))
+
+
+def _scope_key(scope: dict) -> str:
+    raw = json.dumps(scope, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+def _band_keys(scope_key: str, sig: np.ndarray) -> list[str]:
+    return [
+        f"band:{scope_key}:{band}:{hashlib.blake2b(sig[band * _ROWS:(band + 1) * _ROWS].tobytes(), digest_size=8).hexdigest()}"
+        for band in range(_BANDS)
+    ]
+
+
+def profile_traits(profile: dict | None) -> dict:
+    """画像中决定回复策略的特质，作为缓存作用域的一部分"""
+    profile = profile or {}
+    return {
+        "attachment": profile.get("attachmentType"),
+        "communication": profile.get("communicationStyle"),
+        "tags": sorted(profile.get("personalityTags") or []),
+    }
+
+
+class SemanticCache:
+    """单个节点的近重复缓存，值为可 JSON 序列化的结果"""
+
+    def __init__(self, node: str):
+        self.node = node
+        self._store = JsonStore(f"semantic:{node}")
+        self._audits: set[asyncio.Task] = set()
+
+    def _incr(self, name: str) -> None:
+        metrics.incr(f"semantic.{name}")
+        metrics.incr(f"semantic.{self.node}.{name}")
+
+    async def lookup(self, scope: dict, text: str, focus: str | None = None) -> tuple[Any, float] | None:
+        """返回 (缓存结果, 相似度)；未命中返回 None"""
+        threshold = get_settings().semantic_cache_threshold
+        started = time.perf_counter()
+        self._incr("lookups")
+        sig = signature(text)
+        buckets = await self._store.get_many(_band_keys(_scope_key(scope), sig))
+        candidates = list(dict.fromkeys(entry_id for bucket in buckets for entry_id in bucket or []))
+        entries = await self._store.get_many([f"entry:{entry_id}" for entry_id in candidates])
+
+        best, best_score = None, threshold
+        focus_sig = signature(focus) if focus is not None else None
+        for entry in entries:
+            if entry is None:
+                continue
+            score = similarity(sig, entry["sig"])
+            if score < best_score:
+                continue
+            if focus_sig is not None and ("focus" not in entry or similarity(focus_sig, entry["focus"]) < threshold):
+                continue
+            best, best_score = entry, score
+        metrics.observe(f"semantic.{self.node}.lookup", time.perf_counter() - started)
+
+        if best is None:
+            tracing.annotate(**{f"{self.node}_cache": "miss"})
+            return None
+        self._incr("hits")
+        tracing.annotate(**{f"{self.node}_cache": "hit", f"{self.node}_similarity": round(best_score, 3)})
+        return best["value"], best_score
+
+    async def store(self, scope: dict, text: str, value: Any, focus: str | None = None) -> None:
+        ttl = get_settings().semantic_cache_ttl_seconds
+        scope_key = _scope_key(scope)
+        sig = signature(text)
+        entry_id = hashlib.sha256(f"{scope_key}|{normalize(text)}|{normalize(focus or '')}".encode()).hexdigest()[:24]
+        entry = {"sig": sig.tolist(), "value": value, "created_at": time.time()}
+        if focus is not None:
+            entry["focus"] = signature(focus).tolist()
+        await self._store.set(f"entry:{entry_id}", entry, ttl=ttl)
+
+        band_keys = _band_keys(scope_key, sig)
+        buckets = await self._store.get_many(band_keys)
+        await asyncio.gather(*(
+            self._store.set(key, [entry_id, *[e for e in bucket or [] if e != entry_id]][:_BUCKET_SIZE], ttl=ttl)
+            for key, bucket in zip(band_keys, buckets)
+        ))
+        self._incr("stored")
+
+    async def _audit(self, cached: Any, score: float, compute: Callable[[], Awaitable[Any]], same) -> None:
+        try:
+            fresh = await compute()
+        except Exception:
+            logger.warning("semantic cache audit for %s failed", self.node, exc_info=True)
+            return
+        self._incr("audited")
+        if not same(cached, fresh):
+            self._incr("false_hits")
+            logger.info("semantic cache false hit on %s (similarity %.3f): %r vs %r", self.node, score, cached, fresh)
+
+    async def get_or_compute(
+        self,
+        scope: dict,
+        text: str,
+        compute: Callable[[], Awaitable[Any]],
+        *,
+        focus: str | None = None,
+        same: Callable[[Any, Any], bool] = lambda a, b: a == b,
+    ) -> Any:
+        """命中时直接返回缓存结果（按比例后台抽检），否则调用 compute 并写入缓存；compute 的异常原样抛出"""
+        settings = get_settings()
+        if not settings.semantic_cache_enabled:
+            return await compute()
+        found = await self.lookup(scope, text, focus)
+        if found is not None:
+            cached, score = found
+            # 抽检会额外调用模型，服务过载时跳过
+            if random.random() < settings.semantic_cache_audit_rate and not overloaded():
+                task = asyncio.create_task(self._audit(cached, score, compute, same))
+                self._audits.add(task)
+                task.add_done_callback(self._audits.discard)
+            return cached
+        value = await compute()
+        await self.store(scope, text, value, focus)
+        return value
@@ -0,0 +1,13 @@
+"""生产环境 Uvicorn worker：固定使用 uvloop 事件循环与 httptools 解析器"""
+
+from uvicorn_worker import UvicornWorker
+
+
+class ProductionUvicornWorker(UvicornWorker):
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        "lifespan": "on",
+        "proxy_headers": True,
+        "server_header": False,
+    }
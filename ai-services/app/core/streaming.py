@@ -0,0 +1,176 @@
+"""流式输出解析 — 边接收 token 边切分条目，够数后提前断开上游
+
+回复建议、玩法方案和行动建议都是「每行一条」或 {"plans": [...]} 形式的短列表，
+模型常在需要的条数之后继续输出。这里的解析器逐块消费流式输出，每解析出一条
+完整条目就立即产出；调用方拿到足够的有效条目后停止迭代，上游流随之关闭，
+剩余的输出 token 不再生成。
+"""
+
+from __future__ import annotations
+
+import json
+from typing import AsyncIterator, Callable
+
+from . import metrics
+
+ITEM_PREFIXES = ("1.", "2.", "3.", "4.", "5.", "1、", "2、", "3、", "4、", "5、", "-", "•", "*")
+
+
+def clean_item(line: str) -> str:
+    """去掉行首的编号/项目符号"""
+    line = line.strip()
+    for prefix in ITEM_PREFIXES:
+        if line.startswith(prefix):
+            return line[len(prefix):].strip()
+    return line
+
+
+class LineItemParser:
+    """按行切分条目；遇到 stop_marker 后停止产出，其后的文本保存在 tail 中"""
+
+    def __init__(self, stop_marker: str | None = None):
+        self.stop_marker = stop_marker
+        self.stopped = False
+        self.tail = ""
+        self._buffer = ""
+
+    def feed(self, text: str) -> list[str]:
+        if self.stopped:
+            self.tail += text
+            return []
+        self._buffer += text
+        items = []
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            if self.stop_marker and self.stop_marker in line:
+                before, after = line.split(self.stop_marker, 1)
+                if clean_item(before):
+                    items.append(clean_item(before))
+                self.stopped = True
+                self.tail = after + "\n" + self._buffer
+                self._buffer = ""
+                return items
+            item = clean_item(line)
+            if item and not item.startswith("```"):
+                items.append(item)
+        return items
+
+    def close(self) -> list[str]:
+        if self.stopped:
+            return []
+        rest, self._buffer = self._buffer, ""
+        if self.stop_marker and self.stop_marker in rest:
+            rest, self.tail = rest.split(self.stop_marker, 1)
+            self.stopped = True
+        item = clean_item(rest)
+        return [item] if item and not item.startswith("```") else []
+
+
+class JsonArrayItemParser:
+    """从 {"key": ["...", "..."]} 形式的输出中逐个提取已闭合的字符串元素
+
+    输出不是 JSON（首个非空字符不是 { 或 ```）时退化为按行切分。
+    """
+
+    def __init__(self, key: str):
+        self.key = f'"{key}"'
+        self._text = ""
+        self._pos = 0
+        self._in_array = False
+        self._lines: LineItemParser | None = None
+        self._decided = False
+
+    def feed(self, text: str) -> list[str]:
+        if self._lines is not None:
+            return self._lines.feed(text)
+        self._text += text
+        if not self._decided:
+            head = self._text.lstrip()
+            if not head:
+                return []
+            self._decided = True
+            if not head.startswith(("{", "```")):
+                self._lines = LineItemParser()
+                return self._lines.feed(self._text)
+        return self._scan()
+
+    def _scan(self) -> list[str]:
+        items = []
+        if not self._in_array:
+            start = self._text.find(self.key)
+            bracket = self._text.find("[", start) if start >= 0 else -1
+            if bracket < 0:
+                return items
+            self._in_array = True
+            self._pos = bracket + 1
+        while True:
+            quote = self._text.find('"', self._pos)
+            close = self._text.find("]", self._pos)
+            if quote < 0 or (0 <= close < quote):
+                return items
+            end = quote + 1
+            while end < len(self._text):
+                if self._text[end] == "\\":
+                    end += 2
+                    continue
+                if self._text[end] == '"':
+                    break
+                end += 1
+            if end >= len(self._text):
+                return items  # 字符串尚未闭合，等待后续分块
+            try:
+                item = str(json.loads(self._text[quote:end + 1])).strip()
+            except json.JSONDecodeError:
+                item = ""
+            if item:
+                items.append(item)
+            self._pos = end + 1
+
+    def close(self) -> list[str]:
+        return self._lines.close() if self._lines is not None else []
+
+
+async def iter_items(
+    llm,
+    messages: list,
+    parser: LineItemParser | JsonArrayItemParser,
+    limit: int | None,
+    name: str,
+    accept: Callable[[str], bool] | None = None,
+) -> AsyncIterator[str]:
+    """流式调用 LLM，逐条产出解析出的有效条目；满 limit 条后关闭上游流（None 表示读完）"""
+    stream = llm.astream(messages)
+    produced = chunks = 0
+    cancelled = False
+    try:
+        async for chunk in stream:
+            chunks += 1
+            content = chunk.content if isinstance(chunk.content, str) else ""
+            for item in parser.feed(content):
+                if accept is None or accept(item):
+                    produced += 1
+                    yield item
+                    if limit is not None and produced >= limit:
+                        cancelled = True
+                        return
+        for item in parser.close():
+            if (limit is None or produced < limit) and (accept is None or accept(item)):
+                produced += 1
+                yield item
+    finally:
+        await stream.aclose()
+        metrics.incr(f"streaming.{name}.calls")
+        metrics.incr(f"streaming.{name}.chunks", chunks)
+        if cancelled:
+            metrics.incr(f"streaming.{name}.cancelled")
+
+
+async def collect_items(
+    llm,
+    messages: list,
+    parser: LineItemParser | JsonArrayItemParser,
+    limit: int | None,
+    name: str,
+    accept: Callable[[str], bool] | None = None,
+) -> list[str]:
+    return [item async for item in iter_items(llm, messages, parser, limit, name, accept)]
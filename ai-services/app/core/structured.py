@@ -0,0 +1,119 @@
+"""结构化输出 — JSON 模式请求、容错解析、Pydantic 校验与一次低成本修复
+
+所有输出 JSON 的节点统一走 invoke_structured():
+1. 模型支持时以 response_format={"type": "json_object"} 请求 JSON 模式；
+2. extract_json() 容忍 <think> 推理块、``` 代码围栏和 JSON 前后的说明文字；
+3. 按节点的 Pydantic schema 校验；
+4. 解析或校验失败时，用 DeepSeek V3（JSON 模式）把原输出修复一次，
+   仍失败（或修复模型熔断中）才抛出 StructuredOutputError，由节点显式回退到默认值。
+每个节点的解析失败、修复成功/失败次数计入 structured.<node>.* 指标。
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import Callable, TypeVar
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from pydantic import BaseModel, ValidationError
+
+from . import metrics, tracing
+from .config import get_settings
+from .resilience import CircuitOpenError
+
+T = TypeVar("T", bound=BaseModel)
+
+_THINK_RE = re.compile(r"<think>.*?(</think>|$)", re.S)
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*\n?(.*?)```", re.S)
+_decoder = json.JSONDecoder()
+
+
+class StructuredOutputError(ValueError):
+    def __init__(self, node: str, message: str, raw: str = ""):
+        super().__init__(f"{node}: {message}")
+        self.node = node
+        self.raw = raw
+
+
+def extract_json(text: str):
+    """从模型输出中取出第一个完整的 JSON 对象/数组；找不到时抛出 ValueError"""
+    text = _THINK_RE.sub("", text or "").strip()
+    fenced = _FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    for index, char in enumerate(text):
+        if char in "{[":
+            try:
+                value, _ = _decoder.raw_decode(text, index)
+                return value
+            except json.JSONDecodeError:
+                continue
+    raise ValueError("no JSON value found")
+
+
+def parse_structured(text: str, schema: type[T]) -> T:
+    """容错解析并按 schema 校验；单字段 schema 允许模型直接返回该字段的值（如裸数组）"""
+    value = extract_json(text)
+    fields = list(schema.model_fields)
+    if not isinstance(value, dict) and len(fields) == 1:
+        value = {fields[0]: value}
+    return schema.model_validate(value)
+
+
+def _json_mode(llm, json_mode: bool):
+    model = getattr(llm, "model_name", None)
+    if json_mode and model in get_settings().structured_json_mode_models and hasattr(llm, "bind"):
+        return llm.bind(response_format={"type": "json_object"})
+    return llm
+
+
+async def invoke_structured(
+    llm,
+    messages: list,
+    schema: type[T],
+    node: str,
+    repair_llm: Callable[[], object] | None = None,
+    json_mode: bool = True,
+) -> T:
+    """调用 LLM 并返回校验后的 schema 实例；修复一次仍失败时抛出 StructuredOutputError"""
+    resp = await _json_mode(llm, json_mode).ainvoke(messages)
+    raw = str(resp.content or "")
+    try:
+        return parse_structured(raw, schema)
+    except (ValueError, ValidationError) as exc:
+        error = exc
+    metrics.incr(f"structured.{node}.parse_failures")
+    tracing.annotate(structured_parse_failed=True)
+
+    if repair_llm is None:
+        raise StructuredOutputError(node, str(error), raw)
+    try:
+        repaired = await _repair(repair_llm(), raw, schema, error)
+    except (ValueError, ValidationError, CircuitOpenError) as exc:
+        # 修复模型熔断中与修复失败同样处理，由节点回退到默认值
+        metrics.incr(f"structured.{node}.repair_failed")
+        raise StructuredOutputError(node, str(exc), raw) from exc
+    metrics.incr(f"structured.{node}.repaired")
+    tracing.annotate(structured_repaired=True)
+    return repaired
+
+
+async def _repair(llm, raw: str, schema: type[T], error: Exception) -> T:
+    """把格式错误的输出交给 V3 修复为符合 schema 的 JSON（只做格式修复，不重新推理）"""
+    resp = await _json_mode(llm, True).ainvoke([
+        SystemMessage(content="你是 JSON 修复工具。只输出修复后的 JSON，不要任何解释。"),
+        HumanMessage(content=(
+            f"目标 JSON Schema:\n{json.dumps(schema.model_json_schema(), ensure_ascii=False)}\n\n"
+            f"解析错误: {str(error)[:300]}\n\n"
+            f"待修复的输出:\n{_THINK_RE.sub('', raw).strip()[:4000]}"
+        )),
+    ])
+    return parse_structured(str(resp.content or ""), schema)
+
+
+def clamp(value, low: float, high: float, default: float) -> float:
+    try:
+        return min(max(float(value), low), high)
+    except (TypeError, ValueError):
+        return default
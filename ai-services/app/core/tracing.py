@@ -0,0 +1,308 @@
+"""轻量链路追踪 — 每个请求一个根 span，每个 LangGraph 节点 / LLM 调用一个子 span
+
+上游通过 W3C traceparent 请求头传入 trace 上下文时沿用其 trace_id 和采样决定，
+否则按 trace_sample_rate 采样；未采样的请求不创建任何 span。
+追踪数据在根 span 结束时按 JSON Lines 导出到 stdout 或本地文件，不依赖外部采集器。
+
+节点 span 由 GraphTracer（LangChain 回调）根据 LangGraph 的 langgraph_node 元数据创建，
+并汇总该节点内 LLM 调用的模型、token 用量与错误次数（HTTP 重试发生在 openai SDK 内部，
+不经过 LangChain 回调，不在此统计）；业务代码可通过
+annotate() 在当前 span 上补充属性（如缓存命中）。
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import re
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+from .config import get_settings
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error", "_spans")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, spans: list[Span]):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.attributes: dict = {}
+        self.error: str | None = None
+        self._spans = spans
+        spans.append(self)
+
+    def child(self, name: str) -> Span:
+        return Span(name, self.trace_id, self.span_id, self._spans)
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def add(self, key: str, amount: float = 1) -> None:
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def end(self, error: BaseException | None = None) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if error is not None:
+                self.error = f"{type(error).__name__}: {error}"
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        end_ns = self.end_ns or time.time_ns()
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_ns / 1e9,
+            "duration_ms": round((end_ns - self.start_ns) / 1e6, 2),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+# ── Span API ───────────────────────────────────────────
+
+def start_trace(name: str, traceparent: str | None = None) -> Span | None:
+    """按采样决定创建根 span；追踪未启用或未采样时返回 None"""
+    settings = get_settings()
+    if settings.trace_exporter == "none":
+        return None
+    match = _TRACEPARENT_RE.match(traceparent or "")
+    if match:
+        trace_id, parent_id, flags = match.groups()
+        if not int(flags, 16) & 1:
+            return None
+    else:
+        if random.random() >= settings.trace_sample_rate:
+            return None
+        trace_id, parent_id = uuid.uuid4().hex, None
+    return Span(name, trace_id, parent_id, [])
+
+
+def finish_trace(root: Span, error: BaseException | None = None) -> None:
+    root.end(error)
+    export(root._spans)
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+@contextmanager
+def activate(span: Span | None) -> Iterator[Span | None]:
+    token = _current.set(span)
+    try:
+        yield span
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span | None]:
+    """在当前 span 下创建子 span；没有活动 trace 时什么都不做"""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.child(name)
+    child.set(**attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as exc:
+        child.end(exc)
+        raise
+    finally:
+        child.end()
+        _current.reset(token)
+
+
+def annotate(**attributes) -> None:
+    """给当前 span 补充属性（如缓存命中），没有活动 trace 时忽略"""
+    current = _current.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+# ── Export ─────────────────────────────────────────────
+
+def export(spans: list[Span]) -> None:
+    settings = get_settings()
+    lines = "".join(json.dumps(s.to_dict(), ensure_ascii=False, default=str) + "\n" for s in spans)
+    if settings.trace_exporter == "stdout":
+        sys.stdout.write(lines)
+        sys.stdout.flush()
+    elif settings.trace_exporter == "file":
+        with open(settings.trace_file, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+# ── LangGraph Callback ─────────────────────────────────
+
+class GraphTracer(AsyncCallbackHandler):
+    """为每个图节点和 LLM 调用创建子 span，并把 token 用量汇总到节点 span"""
+
+    # 在节点所在的任务中同步执行回调，设置的当前 span 才能被节点函数看到
+    run_inline = True
+
+    def __init__(self, graph_span: Span):
+        self.graph_span = graph_span
+        self._spans: dict[UUID, Span] = {}
+        self._node_of: dict[UUID, Span] = {}
+
+    async def on_chain_start(self, serialized, inputs, *, run_id: UUID, parent_run_id: UUID | None = None,
+                             metadata: dict | None = None, name: str | None = None, **kwargs) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        if node is not None and (name or (serialized or {}).get("name")) == node:
+            node_span = self.graph_span.child(f"node.{node}")
+            node_span.set(node=node, step=(metadata or {}).get("langgraph_step"))
+            self._spans[run_id] = node_span
+            # 节点函数在复制的上下文中运行，业务代码中的 annotate() 会落在节点 span 上
+            _current.set(node_span)
+        elif parent_run_id in self._node_of or parent_run_id in self._spans:
+            self._node_of[run_id] = self._node_of.get(parent_run_id) or self._spans[parent_run_id]
+
+    async def on_chain_end(self, outputs, *, run_id: UUID, **kwargs) -> None:
+        self._end(run_id)
+
+    async def on_chain_error(self, error, *, run_id: UUID, **kwargs) -> None:
+        self._end(run_id, error)
+
+    def _end(self, run_id: UUID, error: BaseException | None = None) -> None:
+        self._node_of.pop(run_id, None)
+        node_span = self._spans.pop(run_id, None)
+        if node_span is not None:
+            node_span.end(error)
+            _current.set(self.graph_span)
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id: UUID, parent_run_id: UUID | None = None,
+                                  metadata: dict | None = None, **kwargs) -> None:
+        node_span = self._spans.get(parent_run_id) or self._node_of.get(parent_run_id) or self.graph_span
+        model = (metadata or {}).get("ls_model_name")
+        llm_span = node_span.child("llm")
+        llm_span.set(model=model)
+        node_span.set(model=model)
+        node_span.add("llm_calls")
+        self._spans[run_id] = llm_span
+        self._node_of[run_id] = node_span
+
+    async def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        llm_span = self._spans.pop(run_id, None)
+        node_span = self._node_of.pop(run_id, None)
+        if llm_span is None:
+            return
+        usage = _usage(response)
+        llm_span.set(**usage)
+        llm_span.end()
+        if node_span is not None:
+            for key, value in usage.items():
+                node_span.add(key, value)
+
+    async def on_llm_error(self, error, *, run_id: UUID, **kwargs) -> None:
+        llm_span = self._spans.pop(run_id, None)
+        node_span = self._node_of.pop(run_id, None)
+        if isinstance(error, GeneratorExit):
+            # 流式输出拿到足够条目后提前关闭
+            if llm_span is not None:
+                llm_span.set(cancelled=True)
+                llm_span.end()
+            if node_span is not None:
+                node_span.add("llm_cancelled")
+            return
+        if llm_span is not None:
+            llm_span.end(error)
+        if node_span is not None:
+            node_span.add("llm_errors")
+
+
+def _usage(response) -> dict:
+    try:
+        usage = response.generations[0][0].message.usage_metadata or {}
+    except (AttributeError, IndexError):
+        usage = {}
+    if not usage:
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        usage = {"input_tokens": token_usage.get("prompt_tokens", 0), "output_tokens": token_usage.get("completion_tokens", 0)}
+    return {
+        "input_tokens": usage.get("input_tokens", 0),
+        "output_tokens": usage.get("output_tokens", 0),
+        "reasoning_tokens": (usage.get("output_token_details") or {}).get("reasoning") or 0,
+    }
+
+
+def graph_config(config: dict | None, graph_span: Span) -> dict:
+    """把 GraphTracer 加入图调用的 callbacks"""
+    config = dict(config or {})
+    callbacks = config.get("callbacks")
+    tracer = GraphTracer(graph_span)
+    if callbacks is None:
+        config["callbacks"] = [tracer]
+    elif isinstance(callbacks, list):
+        config["callbacks"] = [*callbacks, tracer]
+    else:
+        callbacks = callbacks.copy()
+        callbacks.add_handler(tracer)
+        config["callbacks"] = callbacks
+    return config
+
+
+# ── ASGI Middleware ────────────────────────────────────
+
+class TracingMiddleware:
+    """为 /api/v1 请求创建根 span；采样时在响应头中回写 traceparent"""
+
+    def __init__(self, app, prefix: str = "/api/v1/"):
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        root = start_trace(
+            f"{scope['method']} {scope['path']}",
+            headers.get(b"traceparent", b"").decode("latin-1") or None,
+        )
+        if root is None:
+            await self.app(scope, receive, send)
+            return
+
+        root.set(method=scope["method"], path=scope["path"])
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                root.set(status=message["status"])
+                message = {**message, "headers": [*message.get("headers", []), (b"traceparent", root.traceparent.encode())]}
+            await send(message)
+
+        error = None
+        try:
+            with activate(root):
+                await self.app(scope, receive, send_with_trace)
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            finish_trace(root, error)
@@ -1,18 +1,67 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from app.api.routes import router
+from app.core.cancellation import DisconnectMiddleware
 from app.core.config import get_settings
+from app.core.fetch import close_http_client
+from app.core.graphs import warm_up
+from app.core.idempotency import IdempotencyMiddleware
+from app.core.rate_limit import RateLimitMiddleware
+from app.core.resilience import BrownoutMiddleware, CircuitOpenError
+from app.core.tracing import TracingMiddleware
+from app.services.compatibility_model import load_model
+from app.services.screenshot_service import shutdown_executor
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+def _log_warmup_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("graph warm-up failed", exc_info=task.exception())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """按 graph_warmup 配置预热 Agent 图: eager 阻塞启动，background 后台编译，lazy 首次调用时编译"""
+    load_model()
+    if settings.vision_model and not settings.screenshot_allowed_hosts and not settings.debug:
+        logger.warning("SCREENSHOT_ALLOWED_HOSTS is empty: screenshot analysis will fetch images from any public host")
+    task = None
+    if settings.graph_warmup == "eager":
+        warm_up()
+    elif settings.graph_warmup == "background":
+        task = asyncio.create_task(asyncio.to_thread(warm_up))
+        task.add_done_callback(_log_warmup_failure)
+    yield
+    if task is not None and not task.done():
+        task.cancel()
+    await close_http_client()
+    shutdown_executor()
+
 
 app = FastAPI(
     title=settings.app_name,
     version="0.1.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
+# 降级层在幂等层内侧：只统计真正执行的请求；带 X-Degraded 的响应不保存供回放
+app.add_middleware(BrownoutMiddleware)
+app.add_middleware(IdempotencyMiddleware)
+# 限流在幂等层外侧，超限请求不读取请求体即返回 429
+app.add_middleware(RateLimitMiddleware)
+# 断开检测在幂等层外侧：断开的请求退出共享执行，其他等待方仍拿到结果
+app.add_middleware(DisconnectMiddleware)
+app.add_middleware(TracingMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -24,6 +73,16 @@ app.add_middleware(
 app.include_router(router)
 
 
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    """必需节点所依赖的模型熔断中：快速失败，不再等待上游超时"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"upstream model {exc.model} unavailable"},
+        headers={"Retry-After": str(settings.breaker_cooldown_seconds)},
+    )
+
+
 @app.get("/")
 async def root():
     return {"service": settings.app_name, "version": "0.1.0"}
@@ -0,0 +1,207 @@
+"""聊天建议预生成 — 新消息到达时在后台提前运行 Chat Agent
+
+后端在会话收到新消息时为接收方调用 /chat/ingest（无需等待结果），这里以低优先级在后台生成建议，
+按 (X-User-Id, conversation_id) 保存「最后一条消息 ID → 建议」。用户点开助手时 /chat/suggestions 携带
+conversation_id 与 last_message_id，用户、消息 ID 以及请求的上下文 / 画像 / 关系阶段都与保存的一致才直接返回，
+否则实时生成。同一会话的双方各自独立，未携带用户标识的请求不使用预生成。
+
+- 低优先级: 收到消息后等待 chat_speculative_delay_seconds 再生成（连发的消息只生成一次），
+  后台生成共用 chat_speculative_max_concurrency 个槽位，服务过载时跳过；
+  用户点开助手时对应生成仍在排队则取消并实时生成，已在生成则等待其完成
+- 过期丢弃: 同一会话的新消息会取消尚未完成的旧生成，旧结果完成后不再写入；
+  请求的消息 ID 与保存的不一致时删除保存的结果
+- 指标: chat.speculative.hits / .lookups 为命中率，.wasted / .generated 为浪费比例
+  （生成完成但在被取代或删除前从未下发）
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+from app.core import metrics, tracing
+from app.core.config import get_settings
+from app.core.redis import JsonStore
+from app.core.resilience import overloaded
+from app.core.semantic_cache import normalize
+from app.services.chat_service import generate_chat_suggestions
+
+logger = logging.getLogger(__name__)
+
+_store = JsonStore("chat:speculative")
+# (用户, 会话) → (消息 ID, 后台生成任务)
+_pending: dict[str, tuple[str, asyncio.Task]] = {}
+# 已拿到槽位、正在调用模型的生成任务
+_running: set[asyncio.Task] = set()
+_semaphore: asyncio.Semaphore | None = None
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(get_settings().chat_speculative_max_concurrency)
+    return _semaphore
+
+
+def _key(user_id: str, conversation_id: str) -> str:
+    return f"{user_id}:{conversation_id}"
+
+
+def fingerprint(context: str, user_profile: dict, relationship_stage: str) -> str:
+    """生成建议的输入摘要；上下文按语义缓存的规则规整，空白等差异不影响命中"""
+    raw = json.dumps([normalize(context), user_profile, relationship_stage], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+async def _discard(key: str, entry: dict | None) -> None:
+    """删除已过期的保存结果；生成完成却从未下发的计为浪费"""
+    if entry and "result" in entry and not entry.get("served"):
+        metrics.incr("chat.speculative.wasted")
+    await _store.delete(key)
+
+
+async def _generate(
+    key: str, user_id: str, message_id: str, context: str, user_profile: dict, relationship_stage: str,
+) -> dict | None:
+    # 对方常连发几条消息: 先等待一小段时间，期间到达的新消息会取消本次生成
+    await asyncio.sleep(get_settings().chat_speculative_delay_seconds)
+    async with _get_semaphore():
+        # 排队期间服务可能已过载，此时放弃预生成，把上游容量留给前台请求
+        if overloaded():
+            metrics.incr("chat.speculative.skipped")
+            return None
+        started = time.perf_counter()
+        task = asyncio.current_task()
+        _running.add(task)
+        try:
+            result = await generate_chat_suggestions(context, user_profile, relationship_stage)
+        except Exception:
+            metrics.incr("chat.speculative.failures")
+            logger.warning("speculative suggestions for %s failed", key, exc_info=True)
+            return None
+        finally:
+            _running.discard(task)
+    metrics.incr("chat.speculative.generated")
+    metrics.observe("chat.speculative.latency", time.perf_counter() - started)
+
+    entry = await _store.get(key)
+    if entry and entry.get("message_id") != message_id:
+        # 生成期间已有更新的消息（可能由其他副本接收），结果作废
+        metrics.incr("chat.speculative.wasted")
+        return None
+    await _store.set(
+        key,
+        {
+            "user_id": user_id,
+            "message_id": message_id,
+            "fingerprint": fingerprint(context, user_profile, relationship_stage),
+            "result": result,
+            "created_at": time.time(),
+            "served": False,
+        },
+        ttl=get_settings().chat_speculative_ttl_seconds,
+    )
+    return result
+
+
+async def ingest(
+    user_id: str | None,
+    conversation_id: str,
+    message_id: str,
+    context: str,
+    user_profile: dict,
+    relationship_stage: str,
+) -> str:
+    """为 user_id 登记新消息并安排后台生成，返回 scheduled | pending | ready | skipped | disabled"""
+    settings = get_settings()
+    if not settings.chat_speculative_enabled:
+        return "disabled"
+    if not user_id:
+        metrics.incr("chat.speculative.unkeyed")
+        return "skipped"
+    metrics.incr("chat.speculative.ingested")
+    key = _key(user_id, conversation_id)
+
+    pending = _pending.get(key)
+    if pending is not None:
+        if pending[0] == message_id:
+            return "pending"
+        pending[1].cancel()
+        metrics.incr("chat.speculative.cancelled")
+
+    entry = await _store.get(key)
+    if entry and entry.get("message_id") == message_id:
+        return "ready" if "result" in entry else "pending"
+    if entry:
+        await _discard(key, entry)
+    # 先登记最新消息 ID，其他副本上更早消息的生成完成后据此作废
+    await _store.set(key, {"user_id": user_id, "message_id": message_id}, ttl=settings.chat_speculative_ttl_seconds)
+
+    if overloaded():
+        metrics.incr("chat.speculative.skipped")
+        return "skipped"
+    task = asyncio.create_task(_generate(key, user_id, message_id, context, user_profile, relationship_stage))
+    _pending[key] = (message_id, task)
+
+    def _cleanup(done: asyncio.Task) -> None:
+        if _pending.get(key, (None, None))[1] is done:
+            _pending.pop(key, None)
+
+    task.add_done_callback(_cleanup)
+    return "scheduled"
+
+
+async def _mark_served(key: str, entry: dict) -> None:
+    if not entry.get("served"):
+        await _store.set(key, {**entry, "served": True}, ttl=get_settings().chat_speculative_ttl_seconds)
+
+
+async def lookup(
+    user_id: str | None,
+    conversation_id: str,
+    message_id: str,
+    context: str,
+    user_profile: dict,
+    relationship_stage: str,
+) -> dict | None:
+    """返回为该用户、该条最后消息、相同输入预生成的建议；本进程仍在生成时等待其完成，未命中返回 None"""
+    if not user_id:
+        return None
+    metrics.incr("chat.speculative.lookups")
+    key = _key(user_id, conversation_id)
+    pending = _pending.get(key)
+    if pending is not None and pending[0] == message_id and pending[1] in _running:
+        # 已在生成，等待其完成比重新生成更快
+        try:
+            await asyncio.shield(pending[1])
+        except asyncio.CancelledError:
+            if not pending[1].cancelled():
+                raise
+        if not pending[1].cancelled() and pending[1].result() is not None:
+            metrics.incr("chat.speculative.joined")
+    elif pending is not None:
+        # 仍在排队（用户已在等待，不再让其排在后台任务之后）或对应的是其他消息: 取消，改为实时生成
+        pending[1].cancel()
+        metrics.incr("chat.speculative.cancelled")
+
+    entry = await _store.get(key)
+    if entry and entry.get("user_id") != user_id:
+        entry = None
+    if entry and entry.get("message_id") == message_id and "result" in entry:
+        if entry.get("fingerprint") != fingerprint(context, user_profile, relationship_stage):
+            # 同一条消息但请求的上下文或画像不同，保存的建议不适用于本次请求
+            metrics.incr("chat.speculative.mismatched")
+            tracing.annotate(chat_speculative="mismatch")
+            return None
+        metrics.incr("chat.speculative.hits")
+        tracing.annotate(chat_speculative="hit")
+        await _mark_served(key, entry)
+        return entry["result"]
+    if entry and entry.get("message_id") != message_id:
+        metrics.incr("chat.speculative.stale")
+        await _discard(key, entry)
+    tracing.annotate(chat_speculative="miss")
+    return None
@@ -0,0 +1,348 @@
+"""兼容性评估蒸馏 — 用 R1 的历史评估训练本地打分模型
+
+每次 R1 兼容性评估成功后，把「两人画像中参与打分的字段 + R1 的四个维度分与综合分」追加到本地
+JSONL 数据集（compat_dataset_path）。训练命令在数据集上拟合岭回归（NumPy 闭式解），按留出集的
+平均绝对误差（MAE）给出校准误差，权重以递增版本号保存为 compat_model_dir/v<N>.npz。
+
+服务启动时加载最新版本（或 compat_model_version 指定的版本）。模型留出集的综合分 MAE 不超过
+compat_model_max_mae 时，Match Agent 用本地模型替代画像分析与 R1 评估；按 compat_shadow_rate
+抽样在后台继续运行 R1 作为影子，比较两者的综合分并写入数据集。最近 compat_shadow_window 次比较的
+MAE 超出上限（漂移）时自动回到 R1；回到 R1 期间的结果同样参与比较，误差回落后恢复本地模型。
+影子比较窗口在进程内，多 worker 时各 worker 分别判断是否回到 R1。
+
+    python -m app.services.compatibility_model train
+    python -m app.services.compatibility_model train --data data/compatibility.jsonl --l2 2.0
+    python -m app.services.compatibility_model info
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import re
+import time
+from collections import deque
+from itertools import combinations_with_replacement
+from pathlib import Path
+
+import numpy as np
+
+from app.core import metrics
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# 特征定义变化时递增，旧版本权重不再加载
+FEATURE_VERSION = 1
+TARGETS = (
+    "attachment_compatibility",
+    "communication_compatibility",
+    "personality_compatibility",
+    "lifestyle_compatibility",
+    "overall_score",
+)
+PROFILE_FIELDS = ("attachmentType", "communicationStyle", "personalityTags", "city")
+
+_ATTACHMENT = ("SECURE", "ANXIOUS", "AVOIDANT", "FEARFUL", None)
+_COMMUNICATION = ("DIRECT", "INDIRECT", "ANALYTICAL", "EMOTIONAL", None)
+# 无序组合（含缺失），两人交换位置得到相同特征
+_ATTACHMENT_PAIRS = {pair: i for i, pair in enumerate(combinations_with_replacement(range(len(_ATTACHMENT)), 2))}
+_COMMUNICATION_PAIRS = {pair: i for i, pair in enumerate(combinations_with_replacement(range(len(_COMMUNICATION)), 2))}
+FEATURE_NAMES = (
+    [f"attachment:{_ATTACHMENT[a]}+{_ATTACHMENT[b]}" for a, b in _ATTACHMENT_PAIRS]
+    + [f"communication:{_COMMUNICATION[a]}+{_COMMUNICATION[b]}" for a, b in _COMMUNICATION_PAIRS]
+    + ["tags:jaccard", "tags:shared", "tags:missing", "city:same", "city:missing"]
+)
+_VERSION_RE = re.compile(r"^v(\d+)\.npz$")
+
+
+# ── Features ───────────────────────────────────────────
+
+def profile_fields(profile: dict) -> dict:
+    return {key: profile.get(key) for key in PROFILE_FIELDS if profile.get(key)}
+
+
+def _index(values: tuple, value) -> int:
+    return values.index(value) if value in values else len(values) - 1
+
+
+def pair_features(user_a: dict, user_b: dict) -> np.ndarray:
+    features = np.zeros(len(FEATURE_NAMES))
+    attachment = sorted((_index(_ATTACHMENT, user_a.get("attachmentType")), _index(_ATTACHMENT, user_b.get("attachmentType"))))
+    communication = sorted((
+        _index(_COMMUNICATION, user_a.get("communicationStyle")),
+        _index(_COMMUNICATION, user_b.get("communicationStyle")),
+    ))
+    features[_ATTACHMENT_PAIRS[tuple(attachment)]] = 1.0
+    offset = len(_ATTACHMENT_PAIRS)
+    features[offset + _COMMUNICATION_PAIRS[tuple(communication)]] = 1.0
+    offset += len(_COMMUNICATION_PAIRS)
+
+    tags_a, tags_b = set(user_a.get("personalityTags") or []), set(user_b.get("personalityTags") or [])
+    if tags_a and tags_b:
+        features[offset] = len(tags_a & tags_b) / len(tags_a | tags_b)
+        features[offset + 1] = min(len(tags_a & tags_b), 3) / 3
+    else:
+        features[offset + 2] = 1.0
+    city_a, city_b = user_a.get("city"), user_b.get("city")
+    if city_a and city_b:
+        features[offset + 3] = float(city_a == city_b)
+    else:
+        features[offset + 4] = 1.0
+    return features
+
+
+def _targets(scores: dict) -> list[float] | None:
+    values = []
+    for key in TARGETS:
+        value = scores.get(key)
+        if isinstance(value, dict):
+            value = value.get("score")
+        if not isinstance(value, (int, float)):
+            return None
+        values.append(float(value))
+    return values
+
+
+# ── Dataset ────────────────────────────────────────────
+
+def _append(path: Path, line: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as f:
+        f.write(line)
+
+
+async def log_judgment(user_a: dict, user_b: dict, scores: dict, source: str = "r1") -> None:
+    """把一次 R1 评估追加到数据集；缺少任一维度分的结果不记录"""
+    settings = get_settings()
+    if not settings.compat_dataset_enabled or _targets(scores) is None:
+        return
+    record = {
+        "a": profile_fields(user_a),
+        "b": profile_fields(user_b),
+        "scores": {key: scores[key]["score"] if isinstance(scores[key], dict) else scores[key] for key in TARGETS},
+        "source": source,
+        "ts": round(time.time(), 3),
+    }
+    try:
+        await asyncio.to_thread(_append, Path(settings.compat_dataset_path), json.dumps(record, ensure_ascii=False) + "\n")
+        metrics.incr("compat_model.dataset.logged")
+    except OSError:
+        logger.warning("failed to append compatibility record", exc_info=True)
+
+
+def load_dataset(path: Path) -> tuple[np.ndarray, np.ndarray]:
+    rows, targets = [], []
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            values = _targets(record.get("scores") or {})
+            if values is None:
+                continue
+            rows.append(pair_features(record.get("a") or {}, record.get("b") or {}))
+            targets.append(values)
+    return np.array(rows).reshape(-1, len(FEATURE_NAMES)), np.array(targets).reshape(-1, len(TARGETS))
+
+
+# ── Model ──────────────────────────────────────────────
+
+class CompatibilityModel:
+    """多输出岭回归: 画像配对特征 → 四个维度分与综合分"""
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, meta: dict):
+        self.weights = weights
+        self.bias = bias
+        self.meta = meta
+
+    @property
+    def version(self) -> str:
+        return self.meta.get("version", "unsaved")
+
+    @property
+    def calibration_mae(self) -> float:
+        """留出集上综合分的平均绝对误差"""
+        return self.meta["val_mae"]["overall_score"]
+
+    def predict_many(self, features: np.ndarray) -> np.ndarray:
+        return np.clip(features @ self.weights + self.bias, 0.0, 100.0)
+
+    def predict(self, user_a: dict, user_b: dict) -> dict:
+        """返回与 CompatibilityResult.model_dump() 相同结构的评分"""
+        values = self.predict_many(pair_features(user_a, user_b)[None, :])[0]
+        scores = {
+            key: {"score": round(float(value), 1), "reason": "本地模型预测"}
+            for key, value in zip(TARGETS[:-1], values[:-1])
+        }
+        return {**scores, "overall_score": round(float(values[-1]), 1), "key_insight": ""}
+
+    def save(self, directory: Path) -> Path:
+        directory.mkdir(parents=True, exist_ok=True)
+        existing = [int(m.group(1)) for p in directory.iterdir() if (m := _VERSION_RE.match(p.name))]
+        version = f"v{max(existing, default=0) + 1}"
+        self.meta["version"] = version
+        path = directory / f"{version}.npz"
+        np.savez(path, weights=self.weights, bias=self.bias, meta=json.dumps(self.meta, ensure_ascii=False))
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> CompatibilityModel:
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            meta["version"] = path.stem
+            return cls(data["weights"], data["bias"], meta)
+
+
+def fit(features: np.ndarray, targets: np.ndarray, l2: float = 1.0, holdout: float = 0.2, seed: int = 0) -> CompatibilityModel:
+    """岭回归闭式解；先在训练集拟合并在留出集计算 MAE，再用全部数据拟合最终权重"""
+
+    def solve(x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        x_mean, y_mean = x.mean(axis=0), y.mean(axis=0)
+        xc = x - x_mean
+        weights = np.linalg.solve(xc.T @ xc + l2 * np.eye(x.shape[1]), xc.T @ (y - y_mean))
+        return weights, y_mean - x_mean @ weights
+
+    order = np.random.default_rng(seed).permutation(len(features))
+    n_val = max(int(len(features) * holdout), 1)
+    val, train = order[:n_val], order[n_val:]
+    weights, bias = solve(features[train], targets[train])
+    errors = np.abs(np.clip(features[val] @ weights + bias, 0.0, 100.0) - targets[val]).mean(axis=0)
+
+    weights, bias = solve(features, targets)
+    return CompatibilityModel(weights, bias, {
+        "feature_version": FEATURE_VERSION,
+        "feature_names": list(FEATURE_NAMES),
+        "targets": list(TARGETS),
+        "l2": l2,
+        "n_train": int(len(features)),
+        "n_val": int(n_val),
+        "val_mae": {key: round(float(err), 3) for key, err in zip(TARGETS, errors)},
+        "trained_at": round(time.time(), 3),
+    })
+
+
+# ── Serving ────────────────────────────────────────────
+
+_model: CompatibilityModel | None = None
+# 最近影子比较的综合分绝对误差
+_shadow_errors: deque[float] = deque(maxlen=200)
+
+
+def load_model() -> CompatibilityModel | None:
+    """加载 compat_model_dir 中指定或最新版本的权重；没有可用权重时返回 None（全部走 R1）"""
+    global _model, _shadow_errors
+    settings = get_settings()
+    directory = Path(settings.compat_model_dir)
+    if settings.compat_model_version:
+        path = directory / f"{settings.compat_model_version}.npz"
+    else:
+        versions = sorted(
+            (int(m.group(1)), p) for p in (directory.iterdir() if directory.is_dir() else []) if (m := _VERSION_RE.match(p.name))
+        )
+        path = versions[-1][1] if versions else None
+    _model = None
+    _shadow_errors = deque(maxlen=settings.compat_shadow_window)
+    if path is None or not path.exists():
+        return None
+    model = CompatibilityModel.load(path)
+    if model.meta.get("feature_version") != FEATURE_VERSION:
+        logger.warning("compatibility model %s uses feature version %s, expected %s; ignored",
+                       path, model.meta.get("feature_version"), FEATURE_VERSION)
+        return None
+    _model = model
+    logger.info("loaded compatibility model %s (overall MAE %.2f)", model.version, model.calibration_mae)
+    return model
+
+
+def drift_mae() -> float | None:
+    """最近影子比较的综合分 MAE；样本不足 compat_shadow_min_samples 时为 None"""
+    if len(_shadow_errors) < get_settings().compat_shadow_min_samples:
+        return None
+    return sum(_shadow_errors) / len(_shadow_errors)
+
+
+def serving_model() -> CompatibilityModel | None:
+    """校准误差与漂移都在上限内时返回本地模型，否则返回 None（调用 R1）"""
+    settings = get_settings()
+    if not settings.compat_model_enabled or _model is None:
+        return None
+    if _model.calibration_mae > settings.compat_model_max_mae:
+        return None
+    drift = drift_mae()
+    if drift is not None and drift > settings.compat_model_max_mae:
+        metrics.incr("compat_model.drift_fallback")
+        return None
+    return _model
+
+
+def model_state() -> dict:
+    """/metrics 中展示的模型状态"""
+    drift = drift_mae()
+    return {
+        "version": _model.version if _model else None,
+        "calibration_mae": _model.calibration_mae if _model else None,
+        "drift_mae": round(drift, 3) if drift is not None else None,
+        "shadow_samples": len(_shadow_errors),
+        "serving": serving_model() is not None,
+    }
+
+
+def record_shadow(user_a: dict, user_b: dict, actual: dict) -> None:
+    """用一次 R1 结果校验已加载的模型: 综合分误差进入漂移窗口（影子抽样与回退到 R1 期间的调用都计入）"""
+    if _model is None or _targets(actual) is None:
+        return
+    error = abs(_model.predict(user_a, user_b)["overall_score"] - actual["overall_score"])
+    _shadow_errors.append(error)
+    metrics.incr("compat_model.shadow.compared")
+    metrics.observe("compat_model.shadow.overall_error", error)
+
+
+# ── CLI ────────────────────────────────────────────────
+
+def _train(args) -> None:
+    settings = get_settings()
+    path = Path(args.data or settings.compat_dataset_path)
+    if not path.exists():
+        raise SystemExit(f"数据集 {path} 不存在")
+    features, targets = load_dataset(path)
+    if len(features) < args.min_records:
+        raise SystemExit(f"数据集只有 {len(features)} 条记录，至少需要 {args.min_records} 条")
+    model = fit(features, targets, l2=args.l2, holdout=args.holdout)
+    path = model.save(Path(args.out or settings.compat_model_dir))
+    print(f"{model.version}: {model.meta['n_train']} 条记录，已保存到 {path}")
+    for key, err in model.meta["val_mae"].items():
+        print(f"  {key:<30} 留出集 MAE {err:.2f}")
+    if model.calibration_mae > settings.compat_model_max_mae:
+        print(f"综合分 MAE 超过 COMPAT_MODEL_MAX_MAE={settings.compat_model_max_mae}，加载后仍会调用 R1")
+
+
+def _info(args) -> None:
+    model = load_model()
+    if model is None:
+        print("没有可用的模型权重")
+        return
+    print(json.dumps({k: v for k, v in model.meta.items() if k != "feature_names"}, ensure_ascii=False, indent=2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="兼容性评估蒸馏: 训练与查看本地模型")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train", help="在 R1 评估数据集上训练并保存新版本权重")
+    train.add_argument("--data", help="数据集路径，默认 COMPAT_DATASET_PATH")
+    train.add_argument("--out", help="权重目录，默认 COMPAT_MODEL_DIR")
+    train.add_argument("--l2", type=float, default=1.0, help="岭回归正则系数")
+    train.add_argument("--holdout", type=float, default=0.2, help="留出集比例")
+    train.add_argument("--min-records", type=int, default=50)
+    train.set_defaults(func=_train)
+    info = sub.add_parser("info", help="查看当前会加载的模型版本与校准误差")
+    info.set_defaults(func=_info)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""互动特征提取 — 把结构化聊天记录压缩为关系分析用的量化信号
+
+输入为按时间排列的消息列表（sender 为 "user" 或 "partner"），一次遍历计算
+消息频率、回复延迟、主动发起占比、消息长度趋势、表情/提问占比和长间隔，
+同时给出不依赖 LLM 的确定性进展基线分。
+"""
+
+from __future__ import annotations
+
+import re
+from datetime import datetime, timezone
+from statistics import median
+
+# 两条消息间隔超过该值视为新一轮对话（用于统计谁主动发起）
+SESSION_GAP_SECONDS = 6 * 3600
+# 超过该值的沉默计为一次长间隔
+LONG_GAP_SECONDS = 72 * 3600
+
+_EMOJI_RE = re.compile(
+    "[\U0001F300-\U0001FAFF\U00002600-\U000027BF\U0001F000-\U0001F2FF]"
+    r"|\[[一-鿿]{1,4}\]"  # 微信风格表情，如 [微笑]
+)
+_QUESTION_RE = re.compile(r"[?？]|[吗呢][~～。!！]*$")
+
+
+def parse_timestamp(value) -> datetime:
+    """接受 datetime、ISO 字符串或秒/毫秒时间戳，统一为带时区的 datetime"""
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, (int, float)):
+        dt = datetime.fromtimestamp(value / 1000 if value > 1e11 else value, tz=timezone.utc)
+    else:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _balance(share: float) -> float:
+    """0.5 对应完全均衡(1.0)，偏向任何一方都线性下降到 0"""
+    return max(0.0, 1.0 - abs(share - 0.5) * 2)
+
+
+def extract_interaction_features(messages: list[dict]) -> dict:
+    """一次遍历计算互动量化特征；消息为空时返回空 dict"""
+    if not messages:
+        return {}
+
+    items = sorted(
+        ((parse_timestamp(m["timestamp"]), m.get("sender", "user"), m.get("content") or "") for m in messages),
+        key=lambda item: item[0],
+    )
+
+    count = len(items)
+    half = count // 2
+    user_messages = 0
+    initiations = 0
+    user_initiations = 0
+    emoji_messages = 0
+    question_messages = 0
+    length_first = length_second = 0
+    long_gaps = 0
+    max_gap = 0.0
+    reply_latency: dict[str, list[float]] = {"user": [], "partner": []}
+
+    prev_time = prev_sender = None
+    for index, (ts, sender, content) in enumerate(items):
+        if sender == "user":
+            user_messages += 1
+        if _EMOJI_RE.search(content):
+            emoji_messages += 1
+        if _QUESTION_RE.search(content.strip()):
+            question_messages += 1
+        if index < half:
+            length_first += len(content)
+        else:
+            length_second += len(content)
+
+        gap = (ts - prev_time).total_seconds() if prev_time is not None else None
+        if gap is None or gap >= SESSION_GAP_SECONDS:
+            initiations += 1
+            if sender == "user":
+                user_initiations += 1
+        if gap is not None:
+            max_gap = max(max_gap, gap)
+            if gap >= LONG_GAP_SECONDS:
+                long_gaps += 1
+            if sender != prev_sender and gap < SESSION_GAP_SECONDS:
+                reply_latency.setdefault(sender, []).append(gap)
+        prev_time, prev_sender = ts, sender
+
+    span_days = max((items[-1][0] - items[0][0]).total_seconds() / 86400, 1.0)
+    first_avg = length_first / half if half else 0.0
+    second_avg = length_second / (count - half)
+
+    def _median_minutes(values: list[float]) -> float | None:
+        return round(median(values) / 60, 1) if values else None
+
+    features = {
+        "message_count": count,
+        "span_days": round(span_days, 1),
+        "messages_per_day": round(count / span_days, 2),
+        "user_message_share": round(user_messages / count, 2),
+        "initiation_count": initiations,
+        "user_initiation_share": round(user_initiations / initiations, 2),
+        "user_reply_minutes": _median_minutes(reply_latency.get("user", [])),
+        "partner_reply_minutes": _median_minutes(reply_latency.get("partner", [])),
+        "length_trend": round(second_avg / first_avg, 2) if first_avg else 1.0,
+        "avg_message_length": round((length_first + length_second) / count, 1),
+        "emoji_ratio": round(emoji_messages / count, 2),
+        "question_ratio": round(question_messages / count, 2),
+        "max_gap_hours": round(max_gap / 3600, 1),
+        "long_gap_count": long_gaps,
+    }
+    features["baseline_progress_score"] = baseline_progress_score(features)
+    return features
+
+
+# 基线分各信号权重（合计 1.0）
+_BASELINE_WEIGHTS = {
+    "frequency": 0.25,
+    "reciprocity": 0.2,
+    "initiation": 0.15,
+    "responsiveness": 0.2,
+    "trend": 0.1,
+    "engagement": 0.1,
+}
+
+
+def baseline_progress_score(features: dict) -> float:
+    """由量化特征得到 0-100 的确定性进展基线分"""
+    if not features:
+        return 50.0
+    latencies = [v for v in (features["user_reply_minutes"], features["partner_reply_minutes"]) if v is not None]
+    worst_latency_hours = max(latencies) / 60 if latencies else 6.0
+    signals = {
+        "frequency": min(features["messages_per_day"] / 20, 1.0),
+        "reciprocity": _balance(features["user_message_share"]),
+        "initiation": _balance(features["user_initiation_share"]),
+        "responsiveness": 1 / (1 + worst_latency_hours / 2),
+        "trend": min(max(features["length_trend"] - 0.5, 0.0), 1.0),
+        "engagement": min((features["question_ratio"] + features["emoji_ratio"]) / 0.6, 1.0),
+    }
+    score = sum(_BASELINE_WEIGHTS[key] * value for key, value in signals.items()) * 100
+    score -= min(features["long_gap_count"] * 5, 20)
+    return round(min(max(score, 0.0), 100.0), 1)
+
+
+def format_interaction_features(features: dict) -> str:
+    """把量化特征格式化为紧凑的提示词文本，替代原始聊天记录"""
+
+    def _minutes(value) -> str:
+        return "无" if value is None else f"{value} 分钟"
+
+    return (
+        f"- 消息总数 {features['message_count']} 条，跨度 {features['span_days']} 天，"
+        f"日均 {features['messages_per_day']} 条\n"
+        f"- 用户消息占比 {features['user_message_share']:.0%}，"
+        f"共 {features['initiation_count']} 轮对话，用户主动发起占比 {features['user_initiation_share']:.0%}\n"
+        f"- 回复延迟中位数: 用户 {_minutes(features['user_reply_minutes'])}，"
+        f"对方 {_minutes(features['partner_reply_minutes'])}\n"
+        f"- 平均消息长度 {features['avg_message_length']} 字，后半段/前半段长度比 {features['length_trend']}\n"
+        f"- 含表情消息占比 {features['emoji_ratio']:.0%}，提问消息占比 {features['question_ratio']:.0%}\n"
+        f"- 最长沉默 {features['max_gap_hours']} 小时，超过 72 小时的间隔 {features['long_gap_count']} 次\n"
+        f"- 确定性进展基线分 {features['baseline_progress_score']}/100"
+    )
@@ -0,0 +1,114 @@
+"""性格分析服务 — 两阶段返回
+
+即时阶段只跑本地评分，标签优先取缓存、未命中时用规则标签，立即返回；
+后台阶段生成 LLM 标签与 R1 深度分析，结果写入存储，可通过
+GET /personality/analyze/{analysis_id} 查询，或推送到后端的内部回调接口。
+回调地址由 backend_internal_url 与用户 ID 拼出，不接受调用方传入的地址，
+避免回调令牌被发往任意主机。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from urllib.parse import quote
+
+import httpx
+
+from app.agents.personality_agent import deep_analysis, quick_tags, score_personality
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.redis import JsonStore
+from app.services.personality_tags import generate_and_store_tags, get_cached_tags, tag_bucket
+
+logger = logging.getLogger(__name__)
+
+_results = JsonStore("personality:result")
+# 持有后台任务引用，防止任务在完成前被回收
+_background: set[asyncio.Task] = set()
+
+_RESULT_KEYS = ("attachment_type", "communication_style", "personality_tags", "ai_summary", "dimension_details")
+
+
+def _bucket(state: dict) -> tuple:
+    return tag_bucket(
+        state["attachment_type"],
+        state["communication_style"],
+        state["attachment_scores"],
+        state["communication_scores"],
+        state["answers"],
+    )
+
+
+def _callback_url(user_id: str | None) -> str | None:
+    settings = get_settings()
+    if not user_id or not settings.backend_internal_url:
+        return None
+    base = settings.backend_internal_url.rstrip("/")
+    return f"{base}/api/v1/internal/users/{quote(user_id, safe='')}/personality-analysis"
+
+
+async def analyze_personality_instant(answers: dict, callback_user_id: str | None = None) -> dict:
+    """立即返回类型、分数和标签，深度分析转入后台"""
+    started = time.perf_counter()
+    state = score_personality(answers)
+    cached_tags = await get_cached_tags(_bucket(state))
+    state["personality_tags"] = cached_tags if cached_tags is not None else quick_tags(answers)
+
+    analysis_id = uuid.uuid4().hex
+    result = {k: state[k] for k in _RESULT_KEYS}
+    result.update({"analysis_id": analysis_id, "summary_status": "pending"})
+    await _results.set(analysis_id, result, ttl=get_settings().personality_result_ttl_seconds)
+
+    callback_url = _callback_url(callback_user_id)
+    task = asyncio.create_task(_complete_analysis(analysis_id, state, cached_tags is not None, callback_url))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+    metrics.observe("personality.instant_latency", time.perf_counter() - started)
+    return result
+
+
+async def _complete_analysis(analysis_id: str, state: dict, tags_final: bool, callback_url: str | None) -> None:
+    started = time.perf_counter()
+    try:
+        if not tags_final:
+            state["personality_tags"] = await generate_and_store_tags(_bucket(state))
+        state.update(await deep_analysis(state))
+        result = {k: state[k] for k in _RESULT_KEYS}
+        result.update({"analysis_id": analysis_id, "summary_status": "done" if state["ai_summary"] else "degraded"})
+        metrics.observe("personality.deep_analysis_latency", time.perf_counter() - started)
+    except Exception:
+        logger.exception("background personality analysis %s failed", analysis_id)
+        metrics.incr("personality.deep_analysis_failed")
+        result = {k: state[k] for k in _RESULT_KEYS}
+        result.update({"analysis_id": analysis_id, "summary_status": "failed"})
+
+    await _results.set(analysis_id, result, ttl=get_settings().personality_result_ttl_seconds)
+    if callback_url:
+        await _deliver(callback_url, result)
+
+
+async def _deliver(callback_url: str, payload: dict, attempts: int = 3) -> None:
+    """把后台结果 POST 给回调地址，失败时指数退避重试"""
+    settings = get_settings()
+    headers = {"X-AI-Callback-Token": settings.ai_callback_token} if settings.ai_callback_token else {}
+    async with httpx.AsyncClient(timeout=settings.ai_callback_timeout_seconds) as client:
+        for attempt in range(attempts):
+            try:
+                # 不跟随重定向，令牌只发给配置的后端
+                resp = await client.post(callback_url, json=payload, headers=headers, follow_redirects=False)
+                if resp.status_code < 500:
+                    metrics.incr("personality.callback_delivered" if resp.is_success else "personality.callback_rejected")
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(2 ** attempt)
+    metrics.incr("personality.callback_failed")
+    logger.warning("personality callback to %s failed after %d attempts", callback_url, attempts)
+
+
+async def get_personality_result(analysis_id: str) -> dict | None:
+    return await _results.get(analysis_id)
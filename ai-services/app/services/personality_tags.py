@@ -0,0 +1,240 @@
+"""性格标签缓存 — 按量化画像分桶记忆 LLM 生成的标签
+
+标签只取决于依恋类型、沟通风格、两组维度分数和六道特质题答案，输入空间
+有限。这里把输入规整为量化分桶（维度分数取 0.5 精度，特质答案取 1-5 整数），
+同一分桶的标签只生成一次并持久化到 Redis；同时统计分桶出现频次，供离线
+预热优先生成最常见的分桶。
+
+    python -m app.services.personality_tags warmup --top 200
+    python -m app.services.personality_tags warmup --answers answers.jsonl --top 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+from collections import Counter
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from pydantic import BaseModel, Field, field_validator
+from redis.exceptions import RedisError
+
+from app.core import metrics, tracing
+from app.core.config import get_settings
+from app.core.llm import get_chat_llm
+from app.core.redis import JsonStore, get_redis, mark_redis_down, redis_available
+from app.core.structured import StructuredOutputError, invoke_structured
+
+TRAIT_KEYS = ["q15", "q16", "q17", "q18", "q19", "q20"]
+FALLBACK_TAGS = ["开放型", "高共情", "深度社交"]
+
+_store = JsonStore("personality:tags")
+_FREQUENCY_KEY = "linksoul:personality:tag-buckets"
+_local_frequency: Counter[str] = Counter()
+
+
+# ── Bucketing ──────────────────────────────────────────
+
+def _half_step(value) -> float:
+    return round(float(value) * 2) / 2
+
+
+def _trait(value) -> int:
+    try:
+        return min(max(int(round(float(value))), 1), 5)
+    except (TypeError, ValueError):
+        return 3
+
+
+def tag_bucket(
+    attachment_type: str,
+    communication_style: str,
+    attachment_scores: dict,
+    communication_scores: dict,
+    answers: dict,
+) -> tuple:
+    """把标签生成的全部输入规整为可哈希的规范分桶"""
+    return (
+        attachment_type,
+        communication_style,
+        _half_step(attachment_scores.get("anxiety", 3)),
+        _half_step(attachment_scores.get("avoidance", 3)),
+        _half_step(communication_scores.get("directness", 3)),
+        _half_step(communication_scores.get("emotionality", 3)),
+        _half_step(communication_scores.get("analyticity", 3)),
+        *(_trait(answers.get(k, 3)) for k in TRAIT_KEYS),
+    )
+
+
+def bucket_key(bucket: tuple) -> str:
+    return "|".join(str(part) for part in bucket)
+
+
+def parse_bucket_key(key: str) -> tuple:
+    parts = key.split("|")
+    return (parts[0], parts[1], *(float(p) for p in parts[2:7]), *(int(p) for p in parts[7:]))
+
+
+# ── Generation ─────────────────────────────────────────
+
+class TagList(BaseModel):
+    tags: list[str] = Field(min_length=1)
+
+    @field_validator("tags", mode="before")
+    @classmethod
+    def _tags(cls, value):
+        if not isinstance(value, list):
+            raise ValueError("tags 必须是字符串数组")
+        return [str(tag).strip() for tag in value if str(tag).strip()]
+
+
+async def generate_tags(bucket: tuple) -> list[str] | None:
+    """使用 DeepSeek V3 为分桶生成性格标签；修复后仍解析失败返回 None"""
+    attachment_type, communication_style, anxiety, avoidance, directness, emotionality, analyticity = bucket[:7]
+    trait_answers = dict(zip(TRAIT_KEYS, bucket[7:]))
+    llm = get_chat_llm()
+
+    prompt = f"""你是一位专业的心理分析师。根据以下用户的性格测试数据，生成 5-8 个中文性格标签。
+
+依恋类型: {attachment_type}
+依恋维度分数: {json.dumps({"anxiety": anxiety, "avoidance": avoidance})}
+沟通风格: {communication_style}
+沟通维度分数: {json.dumps({"directness": directness, "emotionality": emotionality, "analyticity": analyticity})}
+特质问卷答案 (1-5分): {json.dumps(trait_answers)}
+
+问卷含义:
+- q15: 我喜欢尝试新事物 (高分=开放性高)
+- q16: 我享受独处的时光 (高分=内倾)
+- q17: 我容易感受到他人的情绪 (高分=共情力强)
+- q18: 我喜欢有计划地做事 (高分=条理性强)
+- q19: 我在社交场合感到自在 (高分=外向)
+- q20: 我重视深度关系而非广泛社交 (高分=深度社交偏好)
+
+请严格以 JSON 格式返回标签，例如: {{"tags": ["开放探索", "高共情力", "深度社交"]}}
+只返回 JSON，不要其他内容。"""
+
+    try:
+        result = await invoke_structured(llm, [
+            SystemMessage(content="你是 LinkSoul 的 AI 心理分析师，专注于生成精准的中文性格标签。"),
+            HumanMessage(content=prompt),
+        ], TagList, "generate_tags", repair_llm=get_chat_llm)
+    except StructuredOutputError:
+        return None
+    return result.tags
+
+
+# ── Cache ──────────────────────────────────────────────
+
+async def _record_frequency(key: str) -> None:
+    _local_frequency[key] += 1
+    if redis_available():
+        try:
+            await get_redis().zincrby(_FREQUENCY_KEY, 1, key)
+        except (RedisError, OSError):
+            mark_redis_down()
+
+
+async def get_cached_tags(bucket: tuple) -> list[str] | None:
+    """只查缓存，不调用 LLM；同时累计分桶频次"""
+    key = bucket_key(bucket)
+    await _record_frequency(key)
+    metrics.incr("personality.tags.requests")
+    tags = await _store.get(key)
+    if tags is not None:
+        metrics.incr("personality.tags.hits")
+    tracing.annotate(tag_cache_hit=tags is not None)
+    return tags
+
+
+async def store_tags(bucket: tuple, tags: list[str]) -> None:
+    await _store.set(bucket_key(bucket), tags, ttl=get_settings().personality_tag_cache_ttl_seconds)
+
+
+async def generate_and_store_tags(bucket: tuple) -> list[str]:
+    """调用 LLM 生成标签并写入缓存；解析失败时返回兜底标签且不缓存"""
+    metrics.incr("personality.tags.generated")
+    tags = await generate_tags(bucket)
+    if tags is None:
+        return list(FALLBACK_TAGS)
+    await store_tags(bucket, tags)
+    return tags
+
+
+async def get_or_generate_tags(bucket: tuple) -> list[str]:
+    tags = await get_cached_tags(bucket)
+    if tags is not None:
+        return tags
+    return await generate_and_store_tags(bucket)
+
+
+# ── Warm-up ────────────────────────────────────────────
+
+async def _top_buckets(top: int) -> list[str]:
+    if redis_available():
+        try:
+            return list(await get_redis().zrevrange(_FREQUENCY_KEY, 0, top - 1))
+        except (RedisError, OSError):
+            mark_redis_down()
+    return [key for key, _ in _local_frequency.most_common(top)]
+
+
+def _buckets_from_answers(path: str, top: int) -> list[str]:
+    """从答案文件（每行一个 answers JSON）统计最常见的分桶"""
+    from app.agents.personality_agent import score_answers_batch
+
+    with open(path, encoding="utf-8") as f:
+        answers_list = [json.loads(line) for line in f if line.strip()]
+    scores = score_answers_batch(answers_list)
+    counts: Counter[str] = Counter()
+    for i, answers in enumerate(answers_list):
+        counts[bucket_key(tag_bucket(
+            str(scores["attachment_type"][i]),
+            str(scores["communication_style"][i]),
+            {"anxiety": scores["anxiety"][i], "avoidance": scores["avoidance"][i]},
+            {
+                "directness": scores["directness"][i],
+                "emotionality": scores["emotionality"][i],
+                "analyticity": scores["analyticity"][i],
+            },
+            answers,
+        ))] += 1
+    return [key for key, _ in counts.most_common(top)]
+
+
+async def warmup(top: int, answers_path: str | None = None, concurrency: int = 4) -> dict:
+    """为最常见的分桶预生成标签，已缓存的分桶跳过"""
+    keys = _buckets_from_answers(answers_path, top) if answers_path else await _top_buckets(top)
+    semaphore = asyncio.Semaphore(concurrency)
+    generated = 0
+
+    async def _warm(key: str) -> None:
+        nonlocal generated
+        if await _store.get(key) is not None:
+            return
+        async with semaphore:
+            bucket = parse_bucket_key(key)
+            tags = await generate_tags(bucket)
+            if tags is not None:
+                await store_tags(bucket, tags)
+                generated += 1
+
+    await asyncio.gather(*(_warm(key) for key in keys))
+    return {"buckets": len(keys), "generated": generated}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="性格标签缓存工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    warm = sub.add_parser("warmup", help="为高频分桶预生成标签")
+    warm.add_argument("--top", type=int, default=200)
+    warm.add_argument("--answers", help="答案 JSONL 文件；不传则使用线上累计的分桶频次")
+    warm.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    result = asyncio.run(warmup(args.top, args.answers, args.concurrency))
+    print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""玩法方案目录 — 按 (玩法, 关系阶段, 指令分桶) 预生成多组方案并轮换下发
+
+多数玩法请求只是 mode × relationship_stage 的少数组合加上很笼统的指令（「随便」「周末约会」），
+这类请求直接从目录中轮换取一组方案，不再实时调用 LLM。目录只有已知玩法 × 关系阶段的 generic 分桶，
+条目数固定；带具体内容的指令（无论长短）都实时生成，不为一次性的指令预生成多组方案。
+目录条目采用 stale-while-revalidate：超过新鲜期后仍先返回旧方案，同时在后台重新生成；
+条目缺失时实时生成一组作为首个方案组，其余在后台补齐。
+
+    python -m app.services.play_catalog warmup
+    python -m app.services.play_catalog warmup --modes date-planner co-create --force
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import re
+import time
+from collections import Counter
+from typing import Awaitable, Callable
+
+from app.core import metrics, tracing
+from app.core.config import get_settings
+from app.core.redis import JsonStore
+
+DEFAULT_MODES = ("date-planner", "co-create", "real-challenge")
+RELATION_STAGES = ("INITIAL", "GETTING_TO_KNOW", "DATING", "COMMITTED")
+GENERIC_BUCKET = "generic"
+# 归一化后视为「没有具体要求」的指令
+GENERIC_INSTRUCTIONS = {
+    "", "随便", "都可以", "都行", "推荐", "推荐一下", "给点建议", "给个方案", "来几个方案", "帮我想想",
+    "帮我安排", "约会", "约会方案", "周末约会", "周末去哪", "一起做点什么", "玩什么",
+}
+
+PlanBuilder = Callable[[], Awaitable["list[str] | None"]]
+
+_store = JsonStore("play:catalog")
+# 目录条目数固定（玩法 × 阶段），轮换计数随之有界
+_rotation: Counter[str] = Counter()
+_refreshing: dict[str, asyncio.Task] = {}
+
+_PUNCT_RE = re.compile(r"[\s\W_]+", re.UNICODE)
+
+
+# ── Bucketing ──────────────────────────────────────────
+
+def normalize_instruction(instruction: str) -> str:
+    return _PUNCT_RE.sub("", instruction or "").lower()
+
+
+def instruction_bucket(mode: str, stage: str, instruction: str) -> str | None:
+    """已知玩法与阶段下的笼统指令归入 generic；其他请求（或目录关闭时）返回 None（实时生成）"""
+    if not get_settings().play_catalog_enabled or mode not in DEFAULT_MODES or stage not in RELATION_STAGES:
+        return None
+    if normalize_instruction(instruction) in GENERIC_INSTRUCTIONS:
+        return GENERIC_BUCKET
+    return None
+
+
+def catalog_key(mode: str, stage: str, bucket: str) -> str:
+    return f"{mode}|{stage}|{bucket}"
+
+
+# ── Catalog ────────────────────────────────────────────
+
+async def _refresh(key: str, build: PlanBuilder, keep: list | None = None) -> int:
+    """并发生成方案组并写入目录条目（keep 为保留的已有方案组）；全部失败时保留旧条目"""
+    settings = get_settings()
+    keep = keep or []
+    metrics.incr("play.catalog.refreshes")
+    count = max(settings.play_catalog_sets - len(keep), 0)
+    results = await asyncio.gather(*(build() for _ in range(count)), return_exceptions=True)
+    sets = [plans for plans in results if isinstance(plans, list) and plans]
+    if not sets:
+        metrics.incr("play.catalog.refresh_failures")
+        return 0
+    await _store.set(
+        key, {"sets": keep + sets, "refreshed_at": time.time()}, ttl=settings.play_catalog_max_stale_seconds,
+    )
+    return len(sets)
+
+
+def _schedule_refresh(key: str, build: PlanBuilder, keep: list | None = None) -> None:
+    """同一条目同时只有一个后台刷新"""
+    if key in _refreshing:
+        return
+    task = asyncio.create_task(_refresh(key, build, keep))
+    _refreshing[key] = task
+    task.add_done_callback(lambda _: _refreshing.pop(key, None))
+
+
+async def get_plans(mode: str, stage: str, bucket: str, build: PlanBuilder) -> list[str] | None:
+    """从目录轮换取一组方案；条目过期时照常返回并后台刷新
+
+    条目缺失时实时生成一组作为首个方案组，其余方案组在后台补齐；生成失败返回 None。
+    """
+    key = catalog_key(mode, stage, bucket)
+    entry = await _store.get(key)
+    if not entry or not entry.get("sets"):
+        metrics.incr("play.catalog.misses")
+        tracing.annotate(play_catalog="miss")
+        plans = await build()
+        if plans:
+            _schedule_refresh(key, build, keep=[plans])
+        return plans
+
+    age = time.time() - float(entry.get("refreshed_at", 0))
+    if age > get_settings().play_catalog_fresh_seconds:
+        metrics.incr("play.catalog.stale")
+        tracing.annotate(play_catalog="stale")
+        _schedule_refresh(key, build)
+    else:
+        tracing.annotate(play_catalog="hit")
+    metrics.incr("play.catalog.served")
+    sets = entry["sets"]
+    index = _rotation[key] % len(sets)
+    _rotation[key] += 1
+    return list(sets[index])
+
+
+# ── Warm-up ────────────────────────────────────────────
+
+async def warmup(modes: list[str], stages: list[str], concurrency: int = 4, force: bool = False) -> dict:
+    """为 mode × stage 的 generic 分桶预生成方案组；未加 force 时跳过仍新鲜的条目"""
+    from app.services.play_service import generate_plan_set
+
+    semaphore = asyncio.Semaphore(concurrency)
+    fresh_seconds = get_settings().play_catalog_fresh_seconds
+    refreshed = skipped = 0
+
+    async def _warm(mode: str, stage: str) -> None:
+        nonlocal refreshed, skipped
+        key = catalog_key(mode, stage, GENERIC_BUCKET)
+        entry = await _store.get(key)
+        if not force and entry and time.time() - float(entry.get("refreshed_at", 0)) <= fresh_seconds:
+            skipped += 1
+            return
+        async with semaphore:
+            if await _refresh(key, lambda: generate_plan_set(mode, "", stage)):
+                refreshed += 1
+
+    await asyncio.gather(*(_warm(mode, stage) for mode in modes for stage in stages))
+    return {"entries": len(modes) * len(stages), "refreshed": refreshed, "skipped": skipped}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="玩法方案目录工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    warm = sub.add_parser("warmup", help="预生成 mode × stage 的通用方案组")
+    warm.add_argument("--modes", nargs="+", default=list(DEFAULT_MODES))
+    warm.add_argument("--stages", nargs="+", default=list(RELATION_STAGES))
+    warm.add_argument("--concurrency", type=int, default=4)
+    warm.add_argument("--force", action="store_true", help="忽略新鲜期，全部重新生成")
+    args = parser.parse_args()
+
+    result = asyncio.run(warmup(args.modes, args.stages, args.concurrency, args.force))
+    print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
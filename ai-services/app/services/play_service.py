@@ -1,47 +1,27 @@
-"""玩法规划服务：生成结构化约会/共创方案"""
+"""玩法规划服务：生成结构化约会/共创方案
+
+笼统指令优先从玩法方案目录（play_catalog）轮换下发，具体指令实时生成。
+"""
 
-import json
 from langchain_core.messages import HumanMessage, SystemMessage
+from app.core import metrics
 from app.core.llm import get_chat_llm
+from app.core.streaming import JsonArrayItemParser, collect_items
+from app.services import play_catalog
 
 
-def _safe_parse_plans(text: str) -> list[str]:
-    raw = (text or "").strip()
-    if not raw:
-        return []
-    cleaned = raw
-    if cleaned.startswith("```"):
-        cleaned = cleaned.split("\n", 1)[1].rsplit("```", 1)[0].strip()
-    try:
-        parsed = json.loads(cleaned)
-        if isinstance(parsed, dict) and isinstance(parsed.get("plans"), list):
-            return [str(v).strip() for v in parsed["plans"] if str(v).strip()][:3]
-    except Exception:
-        pass
-
-    lines = [ln.strip() for ln in raw.split("\n") if ln.strip()]
-    plans: list[str] = []
-    for line in lines:
-        item = line
-        for prefix in ["1.", "2.", "3.", "1、", "2、", "3、", "-", "•", "*"]:
-            if item.startswith(prefix):
-                item = item[len(prefix):].strip()
-                break
-        if item:
-            plans.append(item)
-    return plans[:3]
-
-
-async def generate_play_plans(
+async def generate_plan_set(
     mode: str,
     instruction: str,
     relationship_stage: str = "INITIAL",
     user_profile: dict | None = None,
-) -> dict:
+) -> list[str] | None:
+    """实时生成一组方案；LLM 不可用或没有解析出方案时返回 None"""
     llm = get_chat_llm()
     profile = user_profile or {}
     try:
-        resp = await llm.ainvoke([
+        # 流式解析 plans 数组，拿到 3 条方案后立即停止生成
+        plans = await collect_items(llm, [
             SystemMessage(content=(
                 "你是 LinkSoul 互动玩法策划助手。"
                 "根据用户给出的玩法类型、关系阶段和上下文，"
@@ -55,12 +35,31 @@ async def generate_play_plans(
                 f"用户画像补充: {profile}\n\n"
                 f"{instruction}"
             )),
-        ])
-        plans = _safe_parse_plans(str(resp.content or ""))
-        if plans:
-            return {"plans": plans}
+        ], JsonArrayItemParser("plans"), limit=3, name="play_plans")
     except Exception:
-        pass
+        return None
+    return plans or None
+
+
+async def generate_play_plans(
+    mode: str,
+    instruction: str,
+    relationship_stage: str = "INITIAL",
+    user_profile: dict | None = None,
+) -> dict:
+    metrics.incr("play.requests")
+    bucket = play_catalog.instruction_bucket(mode, relationship_stage, instruction)
+    if bucket is not None:
+        # 目录方案在多个用户间共享，生成时不带用户画像
+        plans = await play_catalog.get_plans(
+            mode, relationship_stage, bucket,
+            lambda: generate_plan_set(mode, instruction, relationship_stage),
+        )
+    else:
+        metrics.incr("play.catalog.bypassed")
+        plans = await generate_plan_set(mode, instruction, relationship_stage, user_profile)
+    if plans:
+        return {"plans": plans}
 
     # Fallback guarantees deterministic UX when LLM is unstable.
     if mode == "date-planner":
@@ -0,0 +1,125 @@
+"""关系分析服务 — 增量重评估
+
+为每段关系保存上一次的评估结果及其输入指纹。新请求到来时先计算画像与
+互动历史的增量：画像/阶段/模式变化或历史被改写时完整重跑 Relation Agent；
+仅新增少量消息时直接复用上次结果（结构化消息会在本地重算量化特征并按
+基线分变化微调进展分），不调用 LLM。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+
+from app.agents.relation_agent import run_relation_agent
+from app.core import metrics, tracing
+from app.core.config import get_settings
+from app.core.redis import JsonStore
+from app.services.interaction_features import extract_interaction_features, parse_timestamp
+
+_store = JsonStore("relation:last")
+
+_RESULT_KEYS = (
+    "recommended_stage",
+    "progress_score",
+    "advice",
+    "stage_report",
+    "stage_assessment",
+    "interaction_features",
+)
+
+
+def _digest(value) -> str:
+    raw = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def _sorted_messages(messages: list[dict]) -> list[dict]:
+    return sorted(messages, key=lambda m: parse_timestamp(m["timestamp"]))
+
+
+def _history_delta(cached: dict, history: str, messages: list[dict]) -> tuple[int, int] | None:
+    """返回 (新增消息数, 新增字符数)；历史不是在上次基础上追加时返回 None"""
+    old_count = cached["message_count"]
+    if len(messages) < old_count or _digest(messages[:old_count]) != cached["messages_digest"]:
+        return None
+    old_length = cached["history_length"]
+    if len(history) < old_length or _digest(history[:old_length]) != cached["history_digest"]:
+        return None
+    appended = history[old_length:]
+    new_lines = sum(1 for line in appended.split("\n") if line.strip())
+    new_messages = messages[old_count:]
+    new_chars = len(appended) + sum(len(m.get("content") or "") for m in new_messages)
+    return len(new_messages) + new_lines, new_chars
+
+
+def _cheap_update(cached_result: dict, messages: list[dict]) -> dict:
+    """本地重算量化特征，并按基线分变化平移进展分"""
+    result = dict(cached_result)
+    old_features = result.get("interaction_features") or {}
+    features = extract_interaction_features(messages)
+    if old_features and features:
+        shift = features["baseline_progress_score"] - old_features["baseline_progress_score"]
+        result["progress_score"] = round(min(max(result["progress_score"] + shift, 0.0), 100.0), 1)
+    result["interaction_features"] = features
+    return result
+
+
+async def evaluate_relation(
+    user_profile: dict,
+    partner_profile: dict,
+    current_stage: str = "INITIAL",
+    interaction_history: str = "",
+    mode: str | None = None,
+    interaction_messages: list[dict] | None = None,
+    relationship_id: str | None = None,
+    force_refresh: bool = False,
+) -> dict:
+    """增量评估关系；返回结果附带 evaluation 字段: full | cached | updated"""
+    settings = get_settings()
+    mode = mode or settings.relation_agent_mode
+    messages = _sorted_messages(interaction_messages or [])
+    profile_fingerprint = _digest([user_profile, partner_profile, current_stage, mode])
+    key = relationship_id or profile_fingerprint
+
+    metrics.incr("relation.requests")
+    cached = None if force_refresh else await _store.get(key)
+    if cached and cached["profile_fingerprint"] == profile_fingerprint:
+        delta = _history_delta(cached, interaction_history, messages)
+        fresh = time.time() - cached["evaluated_at"] < settings.relation_reeval_max_age_seconds
+        if (
+            delta is not None
+            and fresh
+            and delta[0] < settings.relation_reeval_min_new_messages
+            and delta[1] < settings.relation_reeval_min_new_chars
+        ):
+            metrics.incr("relation.skipped")
+            if delta[0] == 0 or not messages:
+                tracing.annotate(relation_cache="hit")
+                return {**cached["result"], "evaluation": "cached"}
+            metrics.incr("relation.cheap_updates")
+            tracing.annotate(relation_cache="cheap_update", new_messages=delta[0])
+            return {**_cheap_update(cached["result"], messages), "evaluation": "updated"}
+
+    metrics.incr("relation.full_runs")
+    tracing.annotate(relation_cache="miss")
+    result = await run_relation_agent(
+        user_profile=user_profile,
+        partner_profile=partner_profile,
+        current_stage=current_stage,
+        interaction_history=interaction_history,
+        mode=mode,
+        interaction_messages=messages,
+    )
+    snapshot = {k: result.get(k) for k in _RESULT_KEYS}
+    await _store.set(key, {
+        "profile_fingerprint": profile_fingerprint,
+        "history_length": len(interaction_history),
+        "history_digest": _digest(interaction_history),
+        "message_count": len(messages),
+        "messages_digest": _digest(messages),
+        "evaluated_at": time.time(),
+        "result": snapshot,
+    }, ttl=settings.relation_cache_ttl_seconds)
+    return {**snapshot, "evaluation": "full"}
@@ -1,28 +1,142 @@
-"""聊天截图分析服务"""
+"""聊天截图分析服务
+
+流程: 流式下载截图（限制大小/耗时/并发）→ 按内容 SHA-256 查缓存 →
+线程池中解码并缩放为 JPEG → 视觉模型分析 → 按内容哈希缓存结果。
+同一张截图（字节相同）只分析一次；并发的相同截图共享同一次分析。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
 
 from langchain_core.messages import HumanMessage, SystemMessage
-from app.core.llm import get_chat_llm
 
+from app.core import metrics, tracing
+from app.core.cancellation import Coalescer
+from app.core.config import get_settings
+from app.core.fetch import FetchError, fetch_bytes
+from app.core.llm import get_vision_llm
+from app.core.redis import JsonStore
+
+UNAVAILABLE = "暂时无法分析，请稍后重试。"
+NOT_CONFIGURED = "截图分析暂未开放。"
+
+# 解码前按像素数拒绝异常图片（解压炸弹），约等于 8K×5K
+_MAX_PIXELS = 40_000_000
+
+_store = JsonStore("screenshot:analysis")
+# 同一截图的并发分析共享一个任务，全部请求方断开时才取消
+_shared = Coalescer("screenshot")
+_executor: ThreadPoolExecutor | None = None
+
+
+class ScreenshotError(ValueError):
+    """截图无法获取或不是有效图片，属于请求错误"""
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=get_settings().screenshot_decode_workers,
+            thread_name_prefix="screenshot-decode",
+        )
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def prepare_image(data: bytes, max_side: int) -> bytes:
+    """解码并等比缩放到最长边不超过 max_side，重新编码为 JPEG（在线程池中执行）"""
+    from PIL import Image
 
-async def analyze_screenshot(image_url: str) -> dict:
-    """用 DeepSeek V3 分析聊天截图内容"""
-    llm = get_chat_llm()
     try:
-        resp = await llm.ainvoke([
-            SystemMessage(content=(
-                "你是 LinkSoul AI 关系分析师。"
-                "用户会提供聊天截图的文本描述，请从专业角度分析。"
-            )),
-            HumanMessage(content=(
-                "请分析以下聊天内容：\n\n"
-                f"{image_url}\n\n"
-                "请从以下角度分析：\n"
-                "1. 双方的沟通模式和情绪状态\n"
-                "2. 当前对话氛围\n"
-                "3. 值得注意的积极/消极信号\n"
-                "4. 具体的沟通改善建议"
-            )),
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+            if width * height > _MAX_PIXELS:
+                raise ScreenshotError(f"image too large: {width}x{height}")
+            # JPEG 可在解码阶段直接按 1/2、1/4、1/8 缩小，省去大部分解码开销
+            image.draft("RGB", (max_side, max_side))
+            image = image.convert("RGB")
+            image.thumbnail((max_side, max_side))
+            out = io.BytesIO()
+            image.save(out, "JPEG", quality=85, optimize=True)
+            return out.getvalue()
+    except (OSError, Image.DecompressionBombError, SyntaxError) as exc:
+        raise ScreenshotError("not a valid image") from exc
+
+
+async def _analyze(data: bytes, digest: str) -> dict:
+    settings = get_settings()
+    loop = asyncio.get_running_loop()
+    with tracing.span("screenshot.decode", input_bytes=len(data)):
+        jpeg = await loop.run_in_executor(_get_executor(), prepare_image, data, settings.screenshot_max_side)
+        tracing.annotate(output_bytes=len(jpeg))
+
+    try:
+        resp = await get_vision_llm().ainvoke([
+            SystemMessage(content="你是 LinkSoul AI 关系分析师。用户会提供一张聊天截图，请从专业角度分析。"),
+            HumanMessage(content=[
+                {"type": "text", "text": (
+                    "请分析截图中的聊天内容，从以下角度分析：\n"
+                    "1. 双方的沟通模式和情绪状态\n"
+                    "2. 当前对话氛围\n"
+                    "3. 值得注意的积极/消极信号\n"
+                    "4. 具体的沟通改善建议"
+                )},
+                {"type": "image_url", "image_url": {
+                    "url": f"data:image/jpeg;base64,{base64.b64encode(jpeg).decode()}",
+                }},
+            ]),
         ])
-        return {"analysis": (resp.content or "").strip()}
     except Exception:
-        return {"analysis": "暂时无法分析，请稍后重试。"}
+        return {"analysis": UNAVAILABLE}
+
+    analysis = (resp.content or "").strip()
+    if not analysis:
+        return {"analysis": UNAVAILABLE}
+    result = {"analysis": analysis}
+    await _store.set(digest, result, settings.screenshot_cache_ttl_seconds)
+    return result
+
+
+async def analyze_screenshot(image_url: str) -> dict:
+    """下载并分析聊天截图；截图无法获取或不是有效图片时抛出 ScreenshotError"""
+    settings = get_settings()
+    if not settings.vision_model:
+        return {"analysis": NOT_CONFIGURED}
+
+    try:
+        data = await fetch_bytes(
+            image_url,
+            max_bytes=settings.screenshot_max_bytes,
+            timeout=settings.screenshot_fetch_timeout_seconds,
+            content_type_prefix="image/",
+            allowed_hosts=settings.screenshot_allowed_hosts,
+            name="screenshot",
+        )
+    except FetchError as exc:
+        raise ScreenshotError(str(exc)) from exc
+
+    digest = hashlib.sha256(data).hexdigest()
+    metrics.incr("screenshot.requests")
+    cached = await _store.get(digest)
+    if cached is not None:
+        metrics.incr("screenshot.cache_hits")
+        tracing.annotate(screenshot_cache="hit")
+        return cached
+
+    tracing.annotate(screenshot_cache="miss")
+    result, joined = await _shared.run(digest, lambda: _analyze(data, digest))
+    if joined:
+        metrics.incr("screenshot.coalesced")
+    return result
@@ -0,0 +1,103 @@
+"""聊天建议预生成基准: 点开助手时的等待时间、命中率与浪费比例
+
+模拟若干并发会话: 每个会话陆续收到消息（间隔服从指数分布），每条消息之后用户以一定概率在
+几秒内点开助手请求建议。分别在「点开时实时生成」和「收到消息即 /chat/ingest 预生成」两种方式下
+运行同一组会话，统计点开助手的等待时间、模型调用数，以及预生成的命中率与浪费比例。
+时间均按 FakeLLM 的 time_scale 缩放。
+
+    python -m benchmarks.chat_speculation
+    python -m benchmarks.chat_speculation --conversations 40 --tap-prob 0.2
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from app.agents import chat_agent
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.redis import mark_redis_down
+from app.services import chat_speculation
+from app.services.chat_service import generate_chat_suggestions
+
+from .fake_llm import CallLedger, FakeLLM, RecordingLLM
+from .micro import _respond
+
+_LINES = ["今天加班到好晚，有点累", "周末要不要一起去看展？", "刚到家，路上好堵", "你推荐的那家店我去了，很好吃"]
+
+
+async def _conversation(cid: str, args, seed: int, speculative: bool, waits: list[float]) -> None:
+    rng = random.Random(seed)
+    scale = args.time_scale
+    history = []
+    for k in range(args.messages):
+        await asyncio.sleep(rng.expovariate(1 / args.gap) * scale)
+        history.append(f"她: {rng.choice(_LINES)}")
+        message_id, context = f"{cid}-{k}", "\n".join(history[-10:])
+        if speculative:
+            await chat_speculation.ingest(f"u-{cid}", cid, message_id, context, {}, "GETTING_TO_KNOW")
+        if rng.random() >= args.tap_prob:
+            continue
+        await asyncio.sleep(rng.uniform(1.0, 6.0) * scale)
+        started = time.perf_counter()
+        result = (
+            await chat_speculation.lookup(f"u-{cid}", cid, message_id, context, {}, "GETTING_TO_KNOW")
+            if speculative else None
+        )
+        if result is None:
+            await generate_chat_suggestions(context, {}, "GETTING_TO_KNOW")
+        waits.append((time.perf_counter() - started) / scale)
+
+
+async def _run(args, speculative: bool, ledger: CallLedger) -> dict:
+    ledger.reset()
+    waits: list[float] = []
+    await asyncio.gather(*(
+        _conversation(f"c{i}", args, seed=i, speculative=speculative, waits=waits) for i in range(args.conversations)
+    ))
+    await asyncio.gather(*(task for _, task in list(chat_speculation._pending.values())), return_exceptions=True)
+    waits.sort()
+    return {
+        "taps": len(waits),
+        "p50": statistics.median(waits),
+        "p95": waits[max(int(len(waits) * 0.95) - 1, 0)],
+        "llm_calls": ledger.totals()["calls"],
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=10, help="每个会话收到的消息数")
+    parser.add_argument("--gap", type=float, default=8.0, help="消息平均间隔（秒，缩放前）")
+    parser.add_argument("--tap-prob", type=float, default=0.3, help="每条消息后点开助手的概率")
+    parser.add_argument("--slots", type=int, default=8, help="CHAT_SPECULATIVE_MAX_CONCURRENCY")
+    parser.add_argument("--time-scale", type=float, default=0.1)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    settings.chat_speculative_max_concurrency = args.slots
+    settings.chat_speculative_delay_seconds *= args.time_scale
+    mark_redis_down()
+    ledger = CallLedger()
+    fake = FakeLLM("deepseek-chat", _respond, time_scale=args.time_scale)
+    chat_agent.get_chat_llm = lambda: RecordingLLM(fake, ledger, "deepseek-chat")
+
+    live = await _run(args, speculative=False, ledger=ledger)
+    speculative = await _run(args, speculative=True, ledger=ledger)
+
+    print(f"{args.conversations} 个会话 × {args.messages} 条消息，点开概率 {args.tap_prob:.0%}，"
+          f"预生成槽位 {args.slots}（时间为缩放前秒数）\n")
+    print(f"{'mode':<13}{'taps':>6}{'wait p50 s':>12}{'wait p95 s':>12}{'llm calls':>11}")
+    for label, row in (("live", live), ("speculative", speculative)):
+        print(f"{label:<13}{row['taps']:>6}{row['p50']:>12.2f}{row['p95']:>12.2f}{row['llm_calls']:>11}")
+    print(f"\n命中率 {metrics.ratio('chat.speculative.hits', 'chat.speculative.lookups'):.0%}，"
+          f"浪费比例 {metrics.ratio('chat.speculative.wasted', 'chat.speculative.generated'):.0%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
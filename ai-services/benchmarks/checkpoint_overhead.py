@@ -0,0 +1,122 @@
+"""节点级检查点基准: 读写开销与失败重试的续跑效果
+
+1. 开销: 零延迟 FakeLLM 下分别运行不带 / 带检查点的匹配、关系、性格图，差值即每次运行的检查点开销，
+   并与 FakeLLM 默认延迟模型下一次运行的模型耗时对比；另列每次运行的写入次数与单次读写的最长耗时。
+2. 续跑: 匹配图的 generate_match_reason 首次调用失败后按相同输入重试，统计重试时的模型调用数。
+
+默认使用进程内回退存储；--redis 时使用 REDIS_URL（连接失败会自动回退，输出中注明实际后端）。
+
+    python -m benchmarks.checkpoint_overhead --runs 200
+    python -m benchmarks.checkpoint_overhead --runs 200 --redis
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+
+from app.agents import match_agent, personality_agent, relation_agent
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.graphs import LazyGraph
+from app.core.redis import mark_redis_down, redis_available
+from app.services import personality_tags
+
+from .fake_llm import CallLedger, FakeLLM, RecordingLLM
+from .micro import _match_state, _personality_state, _relation_state, _respond
+
+GRAPHS = {
+    "match_agent": (match_agent.build_match_agent_graph, _match_state),
+    "relation_agent": (relation_agent.build_relation_agent_graph, _relation_state),
+    "personality_agent": (personality_agent.build_personality_graph, _personality_state),
+}
+
+
+class _FailOnce:
+    """第一次遇到匹配理由提示词时抛错，模拟节点失败"""
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.failed = False
+
+    async def ainvoke(self, messages, **kwargs):
+        if not self.failed and "匹配文案师" in "\n".join(str(m.content) for m in messages):
+            self.failed = True
+            raise RuntimeError("injected failure")
+        return await self.llm.ainvoke(messages, **kwargs)
+
+
+def _install(llm) -> None:
+    for module in (match_agent, relation_agent, personality_tags):
+        module.get_chat_llm = lambda: llm
+    for module in (match_agent, relation_agent, personality_agent):
+        module.get_reasoner_llm = lambda node=None: llm
+
+
+async def _per_run(graph: LazyGraph, state, runs: int) -> float:
+    await graph.ainvoke(state())
+    started = time.perf_counter()
+    for _ in range(runs):
+        await graph.ainvoke(state())
+    return (time.perf_counter() - started) / runs
+
+
+async def _overhead(runs: int) -> None:
+    _install(FakeLLM("fake", _respond, time_scale=0))
+    print(f"{'graph':<20}{'plain ms':>10}{'ckpt ms':>10}{'overhead ms':>13}{'writes':>8}{'llm s':>8}{'share':>9}")
+    for name, (builder, state) in GRAPHS.items():
+        plain = await _per_run(LazyGraph(f"{name}_plain", builder), state, runs)
+        before = metrics.snapshot()["timings"].get("checkpoint.write", {}).get("count", 0)
+        checkpointed = await _per_run(LazyGraph(name, builder, checkpoint=True), state, runs)
+        writes = (metrics.snapshot()["timings"]["checkpoint.write"]["count"] - before) / (runs + 1)
+        # 同一张图在默认延迟模型（首包 0.5s、每 token 20ms）下的一次运行耗时
+        _install(FakeLLM("fake", _respond))
+        started = time.perf_counter()
+        await LazyGraph(f"{name}_llm", builder).ainvoke(state())
+        llm_seconds = time.perf_counter() - started
+        _install(FakeLLM("fake", _respond, time_scale=0))
+        overhead = checkpointed - plain
+        print(f"{name:<20}{plain * 1000:>10.2f}{checkpointed * 1000:>10.2f}{overhead * 1000:>13.2f}"
+              f"{writes:>8.0f}{llm_seconds:>8.2f}{overhead / llm_seconds:>9.3%}")
+
+    timings = metrics.snapshot()["timings"]
+    print(f"\n存储单次读取最长 {timings['checkpoint.read']['max'] * 1000:.2f} ms，"
+          f"单次写入最长 {timings['checkpoint.write']['max'] * 1000:.2f} ms"
+          "（每次写入前另有一次读取；Redis 后端每次读写约一个往返）")
+
+
+async def _resume() -> None:
+    builder, state = GRAPHS["match_agent"]
+    print(f"\n{'retry after failure':<22}{'first run calls':>17}{'retry calls':>13}")
+    for label, checkpoint in (("restart (no ckpt)", False), ("resume (ckpt)", True)):
+        ledger = CallLedger()
+        _install(_FailOnce(RecordingLLM(FakeLLM("fake", _respond, time_scale=0), ledger, "fake")))
+        graph = LazyGraph(f"match_agent_{label}", builder, checkpoint=checkpoint)
+        try:
+            await graph.ainvoke(state())
+        except RuntimeError:
+            pass
+        first = ledger.totals()["calls"]
+        ledger.reset()
+        await graph.ainvoke(state())
+        print(f"{label:<22}{first:>17}{ledger.totals()['calls']:>13}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--redis", action="store_true", help="使用 REDIS_URL 而非进程内回退存储")
+    args = parser.parse_args()
+
+    # 假评估不写入蒸馏数据集
+    get_settings().compat_dataset_enabled = False
+    if not args.redis:
+        mark_redis_down()
+    await _overhead(args.runs)
+    await _resume()
+    print(f"\n存储后端: {'redis' if redis_available() else '进程内回退'}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
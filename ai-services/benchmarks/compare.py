@@ -0,0 +1,97 @@
+"""对比两次微基准结果，标出性能回退
+
+ops/s 下降或单次峰值内存上升超过阈值（默认 10%）的用例标记为 REGRESSION，
+存在回退时以退出码 1 结束，可直接用于 CI。
+
+    python -m benchmarks.compare base.json head.json
+    python -m benchmarks.compare --rev main            # 在临时 worktree 中跑 main，再跑当前工作区
+    python -m benchmarks.compare --rev HEAD~3 --filter graph --threshold 0.15
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+
+def compare(base: dict, head: dict, threshold: float) -> tuple[list[tuple], bool]:
+    rows, regressed = [], False
+    for name, new in head["results"].items():
+        old = base["results"].get(name)
+        if old is None:
+            rows.append((name, None, new["ops_per_sec"], None, None, "new"))
+            continue
+        speed = new["ops_per_sec"] / old["ops_per_sec"] - 1 if old["ops_per_sec"] else 0.0
+        memory = new["peak_kib"] / old["peak_kib"] - 1 if old["peak_kib"] else 0.0
+        flags = []
+        if speed < -threshold:
+            flags.append("REGRESSION")
+        elif speed > threshold:
+            flags.append("faster")
+        if memory > threshold and new["peak_kib"] - old["peak_kib"] >= 1:
+            flags.append("REGRESSION(mem)")
+        regressed = regressed or any(f.startswith("REGRESSION") for f in flags)
+        rows.append((name, old["ops_per_sec"], new["ops_per_sec"], speed, memory, " ".join(flags)))
+    return rows, regressed
+
+
+def _run_micro(cwd: str, output: str, filter_text: str | None, min_time: float) -> dict:
+    cmd = [sys.executable, "-m", "benchmarks.micro", "--output", output, "--min-time", str(min_time)]
+    if filter_text:
+        cmd += ["--filter", filter_text]
+    env = {**os.environ, "PYTHONPATH": cwd}
+    subprocess.run(cmd, cwd=cwd, env=env, check=True, stdout=subprocess.DEVNULL)
+    with open(output, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _bench_revision(rev: str, filter_text: str | None, min_time: float, workdir: str) -> dict:
+    """在临时 git worktree 中检出 rev 并运行微基准"""
+    top = subprocess.run(["git", "rev-parse", "--show-toplevel"], capture_output=True, text=True, check=True).stdout.strip()
+    subdir = os.path.relpath(os.getcwd(), top)
+    tree = os.path.join(workdir, "tree")
+    subprocess.run(["git", "worktree", "add", "--detach", tree, rev], check=True, capture_output=True)
+    try:
+        return _run_micro(os.path.join(tree, subdir), os.path.join(workdir, "base.json"), filter_text, min_time)
+    finally:
+        subprocess.run(["git", "worktree", "remove", "--force", tree], check=False, capture_output=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="base.json head.json")
+    parser.add_argument("--rev", help="与该 git 提交对比（需在 ai-services 目录下运行）")
+    parser.add_argument("--filter", help="只运行名称包含该子串的用例（--rev 模式）")
+    parser.add_argument("--min-time", type=float, default=0.3)
+    parser.add_argument("--threshold", type=float, default=0.10, help="判定回退的相对变化阈值")
+    args = parser.parse_args()
+
+    if args.rev:
+        with tempfile.TemporaryDirectory() as workdir:
+            base = _bench_revision(args.rev, args.filter, args.min_time, workdir)
+            head = _run_micro(os.getcwd(), os.path.join(workdir, "head.json"), args.filter, args.min_time)
+    elif len(args.files) == 2:
+        with open(args.files[0], encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.files[1], encoding="utf-8") as f:
+            head = json.load(f)
+    else:
+        parser.error("需要两个结果文件，或使用 --rev")
+
+    rows, regressed = compare(base, head, args.threshold)
+    print(f"base {base['meta']['revision']}  →  head {head['meta']['revision']}  (threshold {args.threshold:.0%})\n")
+    print(f"{'case':<42}{'base ops/s':>14}{'head ops/s':>14}{'speed':>9}{'peak mem':>10}  flag")
+    for name, old, new, speed, memory, flag in rows:
+        old_text = f"{old:>14,.1f}" if old is not None else f"{'—':>14}"
+        speed_text = f"{speed:>+9.1%}" if speed is not None else f"{'':>9}"
+        memory_text = f"{memory:>+10.1%}" if memory is not None else f"{'':>10}"
+        print(f"{name:<42}{old_text}{new:>14,.1f}{speed_text}{memory_text}  {flag}")
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""兼容性评估蒸馏基准: 数据集积累 → 训练 → 本地模型服务 → 影子漂移回退
+
+1. 以完整模式运行 --train-pairs 对画像，R1 评估写入临时数据集；
+2. 在数据集上训练本地模型，输出各目标留出集 MAE 并保存为版本化权重；
+3. 加载权重，对 --serve-pairs 对新画像分别以「全部 R1」与「本地模型 + 影子抽样」运行，比较模型调用、
+   单次耗时与本地预测相对 R1 的综合分误差；
+4. 模拟 R1 行为变化（综合分整体上移 --drift 分），影子比较的 MAE 超过上限后自动回到 R1。
+
+R1 替身按画像规则给分并加 ±--noise 的确定性扰动（见 benchmarks.match_tiers），时间按 --time-scale 缩放。
+
+    python -m benchmarks.compat_distill
+    python -m benchmarks.compat_distill --train-pairs 1000 --noise 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from app.agents import match_agent
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.redis import mark_redis_down
+from app.services import compatibility_model
+
+from .fake_llm import CallLedger, FakeLLM, RecordingLLM
+from .match_tiers import _parse_profiles, _profile
+from .match_tiers import _respond as _tiers_respond
+
+
+class _Reasoner:
+    """R1 替身: 规则分 + 确定性扰动 + 可调的整体偏移（模拟 R1 行为漂移）"""
+
+    def __init__(self, noise: float):
+        self.noise = noise
+        self.shift = 0.0
+
+    def __call__(self, prompt: str) -> str:
+        if "深度兼容性推理评估" not in prompt:
+            return _tiers_respond(prompt)
+        user_a, user_b = _parse_profiles(prompt)
+        scores = match_agent.prescreen_scores(user_a, user_b)
+        noise = int(hashlib.md5(prompt.encode()).hexdigest()[:4], 16) / 0xFFFF * 2 * self.noise - self.noise
+        result = {
+            key: {"score": round(min(max(scores[key]["score"] + noise + self.shift, 0), 100), 1), "reason": "推理理由"}
+            for key in match_agent.DIMENSION_LABELS
+        }
+        result["overall_score"] = round(min(max(scores["overall_score"] + noise + self.shift, 0), 100), 1)
+        return "<think>" + "逐项比较两人的依恋与沟通方式。" * 30 + "</think>" + json.dumps(result, ensure_ascii=False)
+
+
+async def _run(pairs, ledger: CallLedger, concurrency: int = 16) -> tuple[list[dict], float]:
+    ledger.reset()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(pair) -> dict:
+        async with semaphore:
+            return await match_agent.run_match_agent(*pair, mode="full")
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(pair) for pair in pairs))
+    await asyncio.gather(*list(match_agent._shadows))
+    return results, time.perf_counter() - started
+
+
+def _calls(ledger: CallLedger) -> str:
+    r1 = sum(1 for c in ledger.calls if c.model == "deepseek-reasoner")
+    return f"V3 {len(ledger.calls) - r1:>4} / R1 {r1:>4}"
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--train-pairs", type=int, default=600)
+    parser.add_argument("--serve-pairs", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=4.0, help="R1 替身的扰动幅度（±分）")
+    parser.add_argument("--drift", type=float, default=12.0, help="模拟漂移时 R1 综合分的整体偏移")
+    parser.add_argument("--shadow-rate", type=float, default=0.2)
+    parser.add_argument("--time-scale", type=float, default=0.01)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="compat-"))
+    settings = get_settings()
+    settings.compat_dataset_enabled = True
+    settings.compat_dataset_path = str(workdir / "compatibility.jsonl")
+    settings.compat_model_dir = str(workdir / "models")
+    settings.compat_shadow_rate = args.shadow_rate
+    settings.checkpoint_enabled = False
+    mark_redis_down()
+    compatibility_model.load_model()
+
+    reasoner = _Reasoner(args.noise)
+    ledger = CallLedger()
+    fake = FakeLLM("fake", reasoner, time_scale=args.time_scale)
+    match_agent.get_chat_llm = lambda: RecordingLLM(fake, ledger, "deepseek-chat")
+    match_agent.get_reasoner_llm = lambda node=None: RecordingLLM(fake, ledger, "deepseek-reasoner")
+
+    rng = random.Random(3)
+    await _run([(_profile(rng), _profile(rng)) for _ in range(args.train_pairs)], ledger)
+    features, targets = compatibility_model.load_dataset(Path(settings.compat_dataset_path))
+    model = compatibility_model.fit(features, targets)
+    path = model.save(Path(settings.compat_model_dir))
+    print(f"数据集 {len(features)} 条 → {path.name}，留出集 MAE: "
+          + "，".join(f"{k.replace('_compatibility', '')} {v:.2f}" for k, v in model.meta["val_mae"].items()))
+
+    serve = [(_profile(rng), _profile(rng)) for _ in range(args.serve_pairs)]
+    settings.compat_model_enabled = False
+    r1_results, r1_elapsed = await _run(serve, ledger)
+    r1_calls = _calls(ledger)
+
+    settings.compat_model_enabled = True
+    compatibility_model.load_model()
+    local_results, local_elapsed = await _run(serve, ledger)
+    error = sum(abs(a["overall_score"] - b["overall_score"]) for a, b in zip(r1_results, local_results)) / len(serve)
+
+    print(f"\n{'mode':<22}{'calls':>18}{'per pair s':>12}{'overall MAE vs R1':>20}")
+    print(f"{'R1':<22}{r1_calls:>18}{r1_elapsed / args.time_scale / len(serve) * 16:>12.2f}{'-':>20}")
+    print(f"{'local + shadow':<22}{_calls(ledger):>18}{local_elapsed / args.time_scale / len(serve) * 16:>12.2f}{error:>20.2f}")
+    state = compatibility_model.model_state()
+    print(f"影子比较 {state['shadow_samples']} 次，漂移 MAE {state['drift_mae']}")
+
+    reasoner.shift = args.drift
+    before = metrics.snapshot()["counters"].get("compat_model.served", 0)
+    for round_ in range(1, 4):
+        await _run([(_profile(rng), _profile(rng)) for _ in range(args.serve_pairs)], ledger)
+        state = compatibility_model.model_state()
+        served = metrics.snapshot()["counters"].get("compat_model.served", 0) - before
+        before += served
+        print(f"R1 偏移 +{args.drift:.0f} 第 {round_} 轮: 本地模型服务 {served:.0f}/{args.serve_pairs}，"
+              f"漂移 MAE {state['drift_mae']}，serving={state['serving']}")
+    print(f"\n（每对耗时按 16 并发折算为串行等效；临时目录 {workdir}）")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,189 @@
+"""断开取消基准: 客户端中途断开时节省的模型输出，以及共享任务对其他等待方的影响
+
+1. 断开: 并发发送若干 /match/analyze 请求（画像各不相同），每个客户端在完整耗时的随机时刻断开，
+   分别在关闭 / 开启 DISCONNECT_CANCEL_ENABLED 时统计上游实际生成的输出 token 与完成的模型调用数，
+   并对比 cancel.tokens_saved 的估算值与实际节省量。
+2. 共享: 两个相同请求同时到达（幂等层进程内合并），先到的一个中途断开，检查另一个仍拿到 200
+   且总调用数与单次运行相同。
+
+模型用 FakeLLM 的延迟模型模拟，包装为 langchain 聊天模型以触发回调；请求直接以 ASGI 调用
+app.main.app，不经过网络。时间按 --time-scale 缩放。
+
+    python -m benchmarks.disconnect_cancel
+    python -m benchmarks.disconnect_cancel --requests 40 --time-scale 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.agents import match_agent
+from app.core import metrics
+from app.core.cancellation import track_cancellation
+from app.core.config import get_settings
+from app.core.redis import mark_redis_down
+
+from .fake_llm import FakeLLM, estimate_tokens
+from .micro import _respond
+from .relation_ab import PARTNER_PROFILE, USER_PROFILE
+
+
+class _Upstream:
+    """记录上游「已生成」的输出 token: 正常结束按全量，被取消时按已解码时长折算"""
+
+    def __init__(self):
+        self.calls = 0
+        self.tokens = 0
+
+    def reset(self) -> None:
+        self.calls = self.tokens = 0
+
+
+class _CallbackLLM(BaseChatModel):
+    """把 FakeLLM 包装为 langchain 聊天模型，使 track_cancellation 等回调生效"""
+
+    fake: Any
+    upstream: Any
+    model_name: str = "fake"
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        raise NotImplementedError
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        fake: FakeLLM = self.fake
+        prompt = "\n".join(str(m.content) for m in messages)
+        prefill = (fake.first_token_latency + estimate_tokens(prompt) * fake.prefill_per_token) * fake.time_scale
+        started = time.perf_counter()
+        try:
+            message = await fake.ainvoke(messages)
+        except asyncio.CancelledError:
+            decoded = (time.perf_counter() - started - prefill) / (fake.decode_per_token * fake.time_scale)
+            self.upstream.tokens += max(int(decoded), 0)
+            raise
+        self.upstream.calls += 1
+        self.upstream.tokens += message.usage_metadata["output_tokens"]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(
+            content=message.content, usage_metadata=message.usage_metadata,
+        ))])
+
+
+async def _post(app, path: str, body: dict, disconnect_after: float | None) -> int | None:
+    """以 ASGI 调用 app；disconnect_after 秒后客户端断开，返回响应状态（未收到响应为 None）"""
+    payload = json.dumps(body).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    sent = False
+    status: int | None = None
+    done = asyncio.Event()
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        if disconnect_after is None:
+            await done.wait()
+        else:
+            await asyncio.sleep(disconnect_after)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and not message.get("more_body"):
+            done.set()
+
+    await app(scope, receive, send)
+    return status if disconnect_after is None or done.is_set() else None
+
+
+def _body(i: int) -> dict:
+    # 画像各不相同，避免被幂等层合并
+    return {"user_a_profile": {**USER_PROFILE, "nickname": f"user{i}"}, "user_b_profile": PARTNER_PROFILE}
+
+
+async def _disconnects(app, args, upstream: _Upstream, full: float) -> None:
+    print(f"{'cancel':<8}{'upstream tokens':>17}{'calls done':>12}{'est saved':>11}{'actual saved':>14}")
+    baseline = None
+    for enabled in (False, True):
+        get_settings().disconnect_cancel_enabled = enabled
+        rng = random.Random(7)
+        before = metrics.snapshot()["counters"].get("cancel.tokens_saved", 0)
+        upstream.reset()
+        await asyncio.gather(*(
+            _post(app, "/api/v1/match/analyze", _body(1000 * enabled + i), rng.uniform(0.1, 1.0) * full)
+            for i in range(args.requests)
+        ))
+        # 未取消时 app 在客户端断开后仍运行到结束才返回，gather 结束即全部完成
+        estimated = metrics.snapshot()["counters"].get("cancel.tokens_saved", 0) - before
+        actual = baseline - upstream.tokens if baseline is not None else 0
+        baseline = upstream.tokens if baseline is None else baseline
+        print(f"{'on' if enabled else 'off':<8}{upstream.tokens:>17}{upstream.calls:>12}{estimated:>11.0f}{actual:>14}")
+
+
+async def _shared(app, upstream: _Upstream, full: float) -> None:
+    get_settings().disconnect_cancel_enabled = True
+    upstream.reset()
+    body = _body(-1)
+    dropped, kept = await asyncio.gather(
+        _post(app, "/api/v1/match/analyze", body, 0.3 * full),
+        _post(app, "/api/v1/match/analyze", body, None),
+    )
+    counters = metrics.snapshot()["counters"]
+    print(f"\n相同请求一个中途断开: 断开方 {dropped}，另一方 {kept}，模型调用 {upstream.calls}"
+          f"（单次运行 3），shared.idempotency.detached={counters.get('shared.idempotency.detached', 0):.0f}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--time-scale", type=float, default=0.1)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    settings.rate_limit_enabled = False
+    settings.checkpoint_enabled = False
+    settings.compat_dataset_enabled = False
+    mark_redis_down()
+    from app.main import app
+
+    upstream = _Upstream()
+    fake = FakeLLM("fake", _respond, time_scale=args.time_scale)
+    llm = _CallbackLLM(fake=fake, upstream=upstream, callbacks=[track_cancellation("fake")])
+    match_agent.get_chat_llm = lambda: llm
+    match_agent.get_reasoner_llm = lambda node=None: llm
+
+    # 先完整运行一次: 得到单次耗时，并让回调积累平均输出 token
+    started = time.perf_counter()
+    await _post(app, "/api/v1/match/analyze", _body(-2), None)
+    full = time.perf_counter() - started
+    print(f"{args.requests} 个请求，客户端在单次耗时 {full / args.time_scale:.1f}s（缩放前）的 10%–100% 随机断开\n")
+
+    await _disconnects(app, args, upstream, full)
+    await _shared(app, upstream, full)
+    counters = metrics.snapshot()["counters"]
+    print(f"disconnect.cancelled={counters.get('disconnect.cancelled', 0):.0f}，"
+          f"cancel.llm_calls={counters.get('cancel.llm_calls', 0):.0f}"
+          "（est saved 只计被截断的调用，尚未开始的节点不计入，为保守估算）")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
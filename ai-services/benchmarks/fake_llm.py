@@ -0,0 +1,142 @@
+"""基准测试用的进程内 LLM 替身与调用记录器
+
+FakeLLM 按提示词长度和输出长度模拟延迟，并返回与 langchain 一致的
+usage_metadata；RecordingLLM 包装任意 LLM（包括真实的 ChatOpenAI），
+记录每次调用的模型、token 数和耗时。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中文约 0.6 token/字，其余约 0.3 token/字符"""
+    cjk = sum(1 for ch in text if "一" <= ch <= "鿿")
+    return max(1, int(cjk * 0.6 + (len(text) - cjk) * 0.3))
+
+
+@dataclass
+class CallRecord:
+    model: str
+    input_tokens: int
+    output_tokens: int
+    latency: float
+
+
+@dataclass
+class CallLedger:
+    calls: list[CallRecord] = field(default_factory=list)
+
+    def reset(self) -> None:
+        self.calls.clear()
+
+    def totals(self) -> dict:
+        return {
+            "calls": len(self.calls),
+            "input_tokens": sum(c.input_tokens for c in self.calls),
+            "output_tokens": sum(c.output_tokens for c in self.calls),
+        }
+
+
+class FakeLLM:
+    """模拟 DeepSeek 的延迟模型: 固定首包延迟 + 预填充 + 逐 token 解码"""
+
+    def __init__(
+        self,
+        model: str,
+        responder: Callable[[str], str],
+        first_token_latency: float = 0.5,
+        prefill_per_token: float = 0.0002,
+        decode_per_token: float = 0.02,
+        time_scale: float = 1.0,
+    ):
+        self.model = model
+        self.responder = responder
+        self.first_token_latency = first_token_latency
+        self.prefill_per_token = prefill_per_token
+        self.decode_per_token = decode_per_token
+        self.time_scale = time_scale
+
+    async def ainvoke(self, messages, **kwargs) -> AIMessage:
+        prompt = "\n".join(str(m.content) for m in messages)
+        text = self.responder(prompt)
+        input_tokens = estimate_tokens(prompt)
+        output_tokens = estimate_tokens(text)
+        delay = (
+            self.first_token_latency
+            + input_tokens * self.prefill_per_token
+            + output_tokens * self.decode_per_token
+        )
+        if self.time_scale > 0:
+            await asyncio.sleep(delay * self.time_scale)
+        return AIMessage(
+            content=text,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+
+
+    async def astream(self, messages, **kwargs):
+        """逐 token 产出；调用方提前停止迭代时后续 token 不再「生成」"""
+        prompt = "\n".join(str(m.content) for m in messages)
+        text = self.responder(prompt)
+        input_tokens = estimate_tokens(prompt)
+        if self.time_scale > 0:
+            await asyncio.sleep((self.first_token_latency + input_tokens * self.prefill_per_token) * self.time_scale)
+        output_tokens = estimate_tokens(text)
+        step = max(1, round(len(text) / output_tokens))
+        per_chunk = self.decode_per_token * output_tokens * step / len(text) * self.time_scale if text else 0.0
+        # 按绝对时间对齐每块的产出时刻，避免逐块 sleep 的调度开销累积
+        loop = asyncio.get_running_loop()
+        decode_started = loop.time()
+        for n, i in enumerate(range(0, len(text), step), start=1):
+            if self.time_scale > 0:
+                await asyncio.sleep(max(0.0, decode_started + n * per_chunk - loop.time()))
+            yield AIMessageChunk(content=text[i:i + step])
+
+
+class RecordingLLM:
+    """包装 LLM，把每次 ainvoke 的用量写入 ledger"""
+
+    def __init__(self, llm, ledger: CallLedger, model: str):
+        self.llm = llm
+        self.ledger = ledger
+        self.model = model
+
+    async def ainvoke(self, messages, **kwargs):
+        started = time.perf_counter()
+        resp = await self.llm.ainvoke(messages, **kwargs)
+        usage = getattr(resp, "usage_metadata", None) or {}
+        self.ledger.calls.append(CallRecord(
+            model=self.model,
+            input_tokens=int(usage.get("input_tokens", 0)),
+            output_tokens=int(usage.get("output_tokens", 0)),
+            latency=time.perf_counter() - started,
+        ))
+        return resp
+
+    async def astream(self, messages, **kwargs):
+        """流式调用；输出 token 按实际收到的文本估算（提前断开时 usage 不可用）"""
+        started = time.perf_counter()
+        prompt = "\n".join(str(m.content) for m in messages)
+        received = []
+        try:
+            async for chunk in self.llm.astream(messages, **kwargs):
+                received.append(chunk.content if isinstance(chunk.content, str) else "")
+                yield chunk
+        finally:
+            self.ledger.calls.append(CallRecord(
+                model=self.model,
+                input_tokens=estimate_tokens(prompt),
+                output_tokens=estimate_tokens("".join(received)) if received else 0,
+                latency=time.perf_counter() - started,
+            ))
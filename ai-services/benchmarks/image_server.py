@@ -0,0 +1,124 @@
+"""本地截图源站替身 — 供截图分析管线的基准与手动测试使用
+
+    python -m benchmarks.image_server --port 8766
+
+路径:
+    /chat.png?w=1170&h=2532&seed=1   生成的聊天截图（PNG），seed 相同则字节相同
+    /chat.jpg?w=1170&h=2532&seed=1   同上（JPEG）
+    /slow.png?delay=5                先等待 delay 秒再返回截图，用于验证下载超时
+    /huge.bin?mb=20                  声明并逐块发送 mb MiB 的数据，用于验证大小上限
+    /chunked.bin?mb=20               不带 Content-Length 的分块响应，用于验证流式计数
+    /page.html                       非图片内容
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import random
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+@lru_cache(maxsize=32)
+def render_chat(width: int, height: int, seed: int, fmt: str) -> bytes:
+    """画一张类似聊天界面的截图：左右交替的气泡与文字行"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), (237, 237, 237))
+    draw = ImageDraw.Draw(image)
+    y = 40
+    while y < height - 120:
+        mine = rng.random() < 0.5
+        bubble_w = rng.randint(width // 4, int(width * 0.7))
+        bubble_h = rng.randint(60, 180)
+        x0 = width - bubble_w - 40 if mine else 40
+        draw.rounded_rectangle(
+            (x0, y, x0 + bubble_w, y + bubble_h), radius=18,
+            fill=(149, 236, 105) if mine else (255, 255, 255),
+        )
+        for line_y in range(y + 16, y + bubble_h - 16, 28):
+            draw.rectangle((x0 + 16, line_y, x0 + rng.randint(bubble_w // 2, bubble_w - 16), line_y + 12), fill=(60, 60, 60))
+        y += bubble_h + rng.randint(20, 50)
+    out = io.BytesIO()
+    image.save(out, "PNG" if fmt == "png" else "JPEG", **({} if fmt == "png" else {"quality": 90}))
+    return out.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send(self, body: bytes, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        parts = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        width, height, seed = int(query.get("w", 1170)), int(query.get("h", 2532)), int(query.get("seed", 1))
+        try:
+            if parts.path in ("/chat.png", "/chat.jpg"):
+                fmt = parts.path.rsplit(".", 1)[1]
+                self._send(render_chat(width, height, seed, fmt), f"image/{'png' if fmt == 'png' else 'jpeg'}")
+            elif parts.path == "/slow.png":
+                time.sleep(float(query.get("delay", 5)))
+                self._send(render_chat(width, height, seed, "png"), "image/png")
+            elif parts.path in ("/huge.bin", "/chunked.bin"):
+                self._stream_bytes(int(float(query.get("mb", 20)) * 1024 * 1024), chunked=parts.path == "/chunked.bin")
+            elif parts.path == "/page.html":
+                self._send(b"<html><body>not an image</body></html>", "text/html")
+            else:
+                self.send_error(404)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _stream_bytes(self, size: int, chunked: bool) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(size))
+        self.end_headers()
+        block = b"\0" * 65536
+        sent = 0
+        while sent < size:
+            piece = block[:min(len(block), size - sent)]
+            self.wfile.write(f"{len(piece):x}\r\n".encode() + piece + b"\r\n" if chunked else piece)
+            sent += len(piece)
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+
+
+def serve_in_thread(port: int = 0) -> tuple[ThreadingHTTPServer, str]:
+    """在后台线程启动替身源站，返回 (server, base_url)；用完调用 server.shutdown()"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), _Handler)
+    print(f"serving on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
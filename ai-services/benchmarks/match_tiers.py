@@ -0,0 +1,155 @@
+"""分级匹配基准: 完整模式与分级模式的模型调用、token、耗时，以及高分配对的召回
+
+随机生成若干对画像，分别以 full 与 tiered 模式运行 Match Agent。FakeLLM 的 R1 评估在画像规则分的基础上
+加入确定性的扰动（模拟 R1 与规则的分歧），因此规则预估会误拦一部分 R1 高分配对；
+「漏掉」为 full 模式下 R1 综合分达到 match_narrative_min_score、分级模式却在预估层结束的配对数。
+可用 --prescreen 传入多个阈值对比。
+
+    python -m benchmarks.match_tiers
+    python -m benchmarks.match_tiers --pairs 300 --prescreen 50 55 60
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+
+from app.agents import match_agent
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.redis import mark_redis_down
+
+from .fake_llm import CallLedger, FakeLLM, RecordingLLM
+
+_ATTACHMENT = ["SECURE", "SECURE", "ANXIOUS", "AVOIDANT", "FEARFUL"]
+_COMMUNICATION = ["DIRECT", "INDIRECT", "ANALYTICAL", "EMOTIONAL"]
+_TAGS = ["开放探索", "高共情力", "深度社交", "条理清晰", "热爱运动", "文艺", "宅家", "美食爱好者"]
+_CITIES = ["上海", "北京", "杭州", "深圳"]
+_PROFILE_RE = re.compile(r"用户([AB])画像:\n(.*?)(?:\n\n|$)", re.S)
+_FIELDS = {"依恋类型": "attachmentType", "沟通风格": "communicationStyle", "性格标签": "personalityTags", "城市": "city"}
+
+
+def _profile(rng: random.Random) -> dict:
+    return {
+        "attachmentType": rng.choice(_ATTACHMENT),
+        "communicationStyle": rng.choice(_COMMUNICATION),
+        "personalityTags": rng.sample(_TAGS, 3),
+        "city": rng.choice(_CITIES),
+    }
+
+
+def _parse_profiles(text: str) -> tuple[dict, dict]:
+    profiles = {}
+    for who, body in _PROFILE_RE.findall(text):
+        profile = {}
+        for line in body.splitlines():
+            label, _, value = line.partition(": ")
+            if label in _FIELDS:
+                profile[_FIELDS[label]] = value.split(", ") if label == "性格标签" else value
+        profiles[who] = profile
+    return profiles.get("A", {}), profiles.get("B", {})
+
+
+def _respond(prompt: str) -> str:
+    if "提取可以用于兼容性评估" in prompt:
+        # 画像分析原样带上两人画像，供下面的 R1 替身打分
+        return prompt.split("请从以下维度", 1)[0].split("输出结构化的分析文本。", 1)[-1].strip()
+    if "深度兼容性推理评估" in prompt:
+        user_a, user_b = _parse_profiles(prompt)
+        scores = match_agent.prescreen_scores(user_a, user_b)
+        noise = int(hashlib.md5(prompt.encode()).hexdigest()[:4], 16) / 0xFFFF * 24 - 12
+        result = {
+            key: {"score": min(max(scores[key]["score"] + noise, 0), 100), "reason": "推理理由" * 20}
+            for key in match_agent.DIMENSION_LABELS
+        }
+        result["overall_score"] = round(min(max(scores["overall_score"] + noise, 0), 100), 1)
+        result["key_insight"] = "两人节奏相近"
+        return "<think>" + "逐项比较两人的依恋与沟通方式。" * 30 + "</think>" + json.dumps(result, ensure_ascii=False)
+    return "你们一个沉稳一个细腻，天然互补。---" + "详细来看，你们在依恋模式上形成了稳定的支持关系。" * 5
+
+
+async def _run(pairs, mode: str, ledger: CallLedger, concurrency: int) -> tuple[dict, dict]:
+    ledger.reset()
+    semaphore = asyncio.Semaphore(concurrency)
+    results = {}
+
+    async def one(i: int, pair) -> None:
+        async with semaphore:
+            results[i] = await match_agent.run_match_agent(*pair, mode=mode)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i, pair) for i, pair in enumerate(pairs)))
+    elapsed = time.perf_counter() - started
+    by_model = {}
+    for call in ledger.calls:
+        row = by_model.setdefault(call.model, [0, 0])
+        row[0] += 1
+        row[1] += call.output_tokens
+    return results, {"elapsed": elapsed, "by_model": by_model, "tokens": ledger.totals()["output_tokens"]}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", type=int, default=200)
+    parser.add_argument("--prescreen", type=float, nargs="+", default=[55.0], help="MATCH_PRESCREEN_MIN_SCORE")
+    parser.add_argument("--narrative", type=float, default=None, help="MATCH_NARRATIVE_MIN_SCORE")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--time-scale", type=float, default=0.02, help="FakeLLM 延迟缩放，须大于 0（耗时按它折算回缩放前）")
+    args = parser.parse_args()
+    if args.time_scale <= 0:
+        parser.error("--time-scale 须大于 0")
+
+    settings = get_settings()
+    if args.narrative is not None:
+        settings.match_narrative_min_score = args.narrative
+    settings.checkpoint_enabled = False
+    settings.compat_dataset_enabled = False
+    mark_redis_down()
+    ledger = CallLedger()
+    fake = FakeLLM("fake", _respond, time_scale=args.time_scale)
+    match_agent.get_chat_llm = lambda: RecordingLLM(fake, ledger, "deepseek-chat")
+    match_agent.get_reasoner_llm = lambda node=None: RecordingLLM(fake, ledger, "deepseek-reasoner")
+
+    rng = random.Random(11)
+    pairs = [(_profile(rng), _profile(rng)) for _ in range(args.pairs)]
+
+    full_results, full = await _run(pairs, "full", ledger, args.concurrency)
+    valuable = {i for i, r in full_results.items() if r["overall_score"] >= settings.match_narrative_min_score}
+
+    print(f"{args.pairs} 对画像，R1 综合分 ≥ {settings.match_narrative_min_score:.0f} 的高分配对 {len(valuable)} 对"
+          "（耗时为缩放前的估算）\n")
+    print(f"{'mode':<16}{'V3 calls':>10}{'R1 calls':>10}{'out tokens':>12}{'wall s':>9}"
+          f"{'prescreen':>11}{'scored':>8}{'full':>6}{'missed':>8}")
+
+    def row(label: str, stats: dict, tiers: dict, missed: int | str) -> None:
+        print(f"{label:<16}{stats['by_model'].get('deepseek-chat', [0])[0]:>10}"
+              f"{stats['by_model'].get('deepseek-reasoner', [0])[0]:>10}{stats['tokens']:>12}"
+              f"{stats['elapsed'] / args.time_scale:>9.1f}{tiers.get('prescreen', 0):>11}"
+              f"{tiers.get('scored', 0):>8}{tiers.get('full', 0):>6}{missed:>8}")
+
+    row("full", full, {"full": args.pairs}, "-")
+    for threshold in args.prescreen:
+        settings.match_prescreen_min_score = threshold
+        results, stats = await _run(pairs, "tiered", ledger, args.concurrency)
+        tiers: dict[str, int] = {}
+        for r in results.values():
+            tiers[r["tier"]] = tiers.get(r["tier"], 0) + 1
+        missed = sum(1 for i in valuable if results[i]["tier"] == "prescreen")
+        row(f"tiered >= {threshold:.0f}", stats, tiers, missed)
+
+    timings = metrics.snapshot()["timings"]
+    prescreen = timings.get("match.tier.prescreen")
+    print("\n各层单次耗时: "
+          + (f"prescreen {prescreen['avg'] * 1000:.1f} ms（实际，不调用模型），" if prescreen else "")
+          + "，".join(f"{tier} {timings[f'match.tier.{tier}']['avg'] / args.time_scale:.1f} s"
+                     for tier in ("scored", "full") if f"match.tier.{tier}" in timings)
+          + "（缩放前）")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,337 @@
+"""微基准: 解析/清洗辅助函数、单个节点与整张 LangGraph 图的 CPU 开销
+
+LLM 全部替换为零延迟的 FakeLLM（time_scale=0），测到的只有本服务与 LangGraph
+自身的 Python 开销。每项报告 ops/s，以及 tracemalloc 测得的单次调用峰值内存
+(peak_kib) 与残留内存 (retained_kib)。graph:* 与 nodes:* 成对出现，差值即
+LangGraph 的调度开销，按节点数折算为每节点微秒数。ops/s 取 5 轮中最快的一轮。
+
+    python -m benchmarks.micro
+    python -m benchmarks.micro --filter graph --output bench.json
+    python -m benchmarks.compare base.json bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import inspect
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from typing import Awaitable, Callable
+
+from app.agents import chat_agent, match_agent, personality_agent, relation_agent
+from app.core.config import get_settings
+from app.core.graphs import warm_up
+from app.core.redis import mark_redis_down
+from app.core.streaming import JsonArrayItemParser, LineItemParser
+from app.core.structured import parse_structured
+from app.services import emotion_service, personality_tags
+from app.services.interaction_features import extract_interaction_features, format_interaction_features
+from app.services.personality_tags import tag_bucket
+
+from .fake_llm import FakeLLM
+from .relation_ab import HISTORY, PARTNER_PROFILE, USER_PROFILE, _messages
+from .relation_ab import _respond as _respond_relation
+
+CHAT_CONTEXT = "\n".join(
+    f"{'我' if i % 2 == 0 else '她'}: {'今天加班到好晚，有点累' if i % 3 == 0 else '周末要不要一起去看展？'}"
+    for i in range(20)
+)
+ANSWERS = {f"q{i}": (i % 5) + 1 for i in range(1, 21)}
+
+_EMOTION = '```json\n{"emotion": "sad", "confidence": 0.82}\n```'
+_REPLIES = "1. 辛苦啦，今天早点休息，周末带你去放松一下\n2. 加班到这么晚，晚饭吃了吗？\n3、要不要听我讲个今天的小趣事？\n- 抱抱，明天会好一点的"
+_COMPATIBILITY = "```json\n" + json.dumps({
+    "attachment_compatibility": {"score": 72, "reason": "安全型可以稳定焦虑型"},
+    "communication_compatibility": {"score": 65, "reason": "直接与情感型需要磨合"},
+    "personality_compatibility": {"score": 80, "reason": "共情力互补"},
+    "lifestyle_compatibility": {"score": 70, "reason": "作息相近"},
+    "overall_score": 73,
+    "key_insight": "稳定与敏感互补",
+}, ensure_ascii=False) + "\n```"
+_PLANS = "```json\n" + json.dumps({"plans": ["方案A：咖啡破冰", "方案B：逛展 + 晚餐", "方案C：桌游"]}, ensure_ascii=False) + "\n```"
+
+
+def _respond(prompt: str) -> str:
+    if "情绪分析专家" in prompt:
+        return _EMOTION
+    if "选择最合适的策略" in prompt:
+        return "共情倾听: 对方情绪低落，先回应感受"
+    if "生成3条自然" in prompt:
+        return _REPLIES
+    if "内容审核员" in prompt:
+        return "1,2,3"
+    if "提取可以用于兼容性评估" in prompt:
+        return "1. 依恋模式: 安全型与焦虑型\n2. 沟通风格: 直接型与情感型\n3. 性格: 共情力互补"
+    if "深度兼容性推理评估" in prompt:
+        return _COMPATIBILITY
+    if "匹配文案师" in prompt:
+        return "你们一个沉稳一个细腻，天然互补。---" + "详细来看，你们在依恋模式上形成了稳定的支持关系。" * 5
+    if "中文性格标签" in prompt:
+        return '```json\n["开放探索", "高共情力", "深度社交", "条理清晰"]\n```'
+    if "深度性格分析报告" in prompt:
+        return "<think>先看依恋维度，再看沟通维度。</think>" + "你是一个温暖而有条理的人。" * 15
+    return _respond_relation(prompt)
+
+
+def _install() -> None:
+    llm = FakeLLM("fake", _respond, time_scale=0)
+    for module in (chat_agent, match_agent, relation_agent, personality_tags):
+        module.get_chat_llm = lambda: llm
+    for module in (match_agent, relation_agent, personality_agent):
+        module.get_reasoner_llm = lambda node=None: llm
+    # 基准只测进程内开销，标签缓存直接走本地回退；假评估不写入蒸馏数据集
+    get_settings().compat_dataset_enabled = False
+    mark_redis_down()
+
+
+# ── Runner ─────────────────────────────────────────────
+
+def _measure(run_batch: Callable[[int], None], min_time: float, repeat: int = 5) -> dict:
+    run_batch(1)  # 预热
+    iterations = 1
+    while True:
+        started = time.perf_counter()
+        run_batch(iterations)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        iterations = max(iterations * 2, int(iterations * min_time / max(elapsed, 1e-9) * 1.2))
+    # 取多轮中最快的一轮，减小机器噪声对回退判断的影响
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        run_batch(iterations)
+        elapsed = min(elapsed, time.perf_counter() - started)
+
+    samples = 20
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    peak = 0
+    for _ in range(samples):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        run_batch(1)
+        _, sample_peak = tracemalloc.get_traced_memory()
+        peak = max(peak, sample_peak - before)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "ops_per_sec": round(iterations / elapsed, 1),
+        "peak_kib": round(peak / 1024, 2),
+        "retained_kib": round(max(current - baseline, 0) / samples / 1024, 3),
+    }
+
+
+def _sync_case(fn: Callable[[], object]) -> Callable[[int], None]:
+    def run_batch(n: int) -> None:
+        for _ in range(n):
+            fn()
+    return run_batch
+
+
+def _async_case(loop: asyncio.AbstractEventLoop, fn: Callable[[], Awaitable[object]]) -> Callable[[int], None]:
+    async def batch(n: int) -> None:
+        for _ in range(n):
+            await fn()
+
+    def run_batch(n: int) -> None:
+        loop.run_until_complete(batch(n))
+    return run_batch
+
+
+def _feed_all(parser, text: str, chunk: int = 2) -> list[str]:
+    """按 2 字符一块模拟流式输入"""
+    items = []
+    for i in range(0, len(text), chunk):
+        items.extend(parser.feed(text[i:i + chunk]))
+    return items + parser.close()
+
+
+def _sequential(nodes: list[Callable], initial: Callable[[], dict]) -> Callable[[], Awaitable[dict]]:
+    """不经过 LangGraph，按图的顺序直接调用节点函数"""
+    async def run() -> dict:
+        state = initial()
+        for node in nodes:
+            update = node(state)
+            state.update(await update if inspect.isawaitable(update) else update)
+        return state
+    return run
+
+
+def _chat_state() -> dict:
+    return {
+        "context": CHAT_CONTEXT,
+        "user_profile": USER_PROFILE,
+        "relationship_stage": "GETTING_TO_KNOW",
+        "emotion": "",
+        "emotion_confidence": 0.0,
+        "enriched_context": "",
+        "strategy": "",
+        "raw_suggestions": [],
+        "suggestions": [],
+        "error": "",
+    }
+
+
+def _match_state() -> dict:
+    return {
+        "user_a_profile": USER_PROFILE,
+        "user_b_profile": PARTNER_PROFILE,
+        "profile_analysis": "",
+        "compatibility_scores": {},
+        "overall_score": 0.0,
+        "match_reason": "",
+        "detailed_report": "",
+        "error": "",
+    }
+
+
+def _relation_state() -> dict:
+    return {
+        "user_profile": USER_PROFILE,
+        "partner_profile": PARTNER_PROFILE,
+        "current_stage": "INITIAL",
+        "interaction_history": HISTORY,
+        "interaction_features": {},
+        "stage_assessment": {},
+        "progress_evaluation": "",
+        "recommended_stage": "",
+        "progress_score": 0.0,
+        "advice": [],
+        "stage_report": "",
+        "error": "",
+    }
+
+
+def _personality_state() -> dict:
+    return {
+        "answers": ANSWERS,
+        "attachment_scores": {},
+        "communication_scores": {},
+        "attachment_type": "",
+        "communication_style": "",
+        "personality_tags": [],
+        "ai_summary": "",
+        "dimension_details": {},
+    }
+
+
+def cases(loop: asyncio.AbstractEventLoop) -> dict[str, Callable[[int], None]]:
+    messages = _messages()
+    features = extract_interaction_features(messages)
+    chat_state = {**_chat_state(), "emotion": "sad", "emotion_confidence": 0.8, "strategy": "共情倾听",
+                  "enriched_context": CHAT_CONTEXT, "raw_suggestions": ["辛苦啦", "晚饭吃了吗？", "抱抱"]}
+    relation_state = {**_relation_state(), "recommended_stage": "GETTING_TO_KNOW", "progress_score": 72,
+                      "progress_evaluation": "进展稳定"}
+    plans_lines = "1. 方案A：咖啡破冰\n2、方案B：逛展 + 晚餐\n- 方案C：桌游"
+    progress_raw = _respond_relation("进展健康度")
+
+    chat_nodes = [chat_agent.recognize_emotion, chat_agent.build_context, chat_agent.select_strategy,
+                  chat_agent.generate_replies, chat_agent.safety_filter]
+    match_nodes = [match_agent.analyze_profiles, match_agent.evaluate_compatibility, match_agent.generate_match_reason]
+    relation_nodes = [relation_agent.assess_stage, relation_agent.evaluate_progress, relation_agent.generate_advice]
+    fused_nodes = [relation_agent.assess_and_evaluate, relation_agent.generate_advice]
+    personality_nodes = [personality_agent.score_attachment, personality_agent.score_communication,
+                         personality_agent.generate_profile, personality_agent.deep_analysis]
+
+    return {
+        # 辅助函数
+        "helper:stream_parse_plans_json": _sync_case(lambda: _feed_all(JsonArrayItemParser("plans"), _PLANS)),
+        "helper:stream_parse_lines": _sync_case(lambda: _feed_all(LineItemParser(), plans_lines)),
+        "helper:extract_interaction_features": _sync_case(lambda: extract_interaction_features(messages)),
+        "helper:format_interaction_features": _sync_case(lambda: format_interaction_features(features)),
+        "helper:parse_progress_evaluation": _sync_case(
+            lambda: parse_structured(progress_raw, relation_agent.ProgressEvaluation)),
+        "helper:tag_bucket": _sync_case(lambda: tag_bucket("SECURE", "DIRECT", {"anxiety": 2.4, "avoidance": 1.8},
+                                                           {"directness": 3.6, "emotionality": 3.1,
+                                                            "analyticity": 2.2}, ANSWERS)),
+        # 单个节点（含 FakeLLM 调用与输出解析）
+        "node:chat.recognize_emotion": _async_case(loop, lambda: chat_agent.recognize_emotion(chat_state)),
+        "node:chat.build_context": _async_case(loop, lambda: chat_agent.build_context(chat_state)),
+        "node:chat.generate_replies": _async_case(loop, lambda: chat_agent.generate_replies(chat_state)),
+        "node:chat.safety_filter": _async_case(loop, lambda: chat_agent.safety_filter(chat_state)),
+        "node:match.evaluate_compatibility": _async_case(
+            loop, lambda: match_agent.evaluate_compatibility({**_match_state(), "profile_analysis": "画像"})),
+        "node:relation.generate_advice": _async_case(loop, lambda: relation_agent.generate_advice(relation_state)),
+        "node:emotion_service.analyze_emotion": _async_case(loop, lambda: emotion_service.analyze_emotion("好累")),
+        # 整张图 vs 直接顺序调用节点
+        "graph:chat_agent": _async_case(loop, lambda: chat_agent._chat_agent.ainvoke(_chat_state())),
+        "nodes:chat_agent": _async_case(loop, _sequential(chat_nodes, _chat_state)),
+        "graph:match_agent": _async_case(loop, lambda: match_agent._match_agent.ainvoke(_match_state())),
+        "nodes:match_agent": _async_case(loop, _sequential(match_nodes, _match_state)),
+        "graph:relation_agent": _async_case(loop, lambda: relation_agent._relation_agent.ainvoke(_relation_state())),
+        "nodes:relation_agent": _async_case(loop, _sequential(relation_nodes, _relation_state)),
+        "graph:relation_agent_fused": _async_case(
+            loop, lambda: relation_agent._fused_relation_agent.ainvoke(_relation_state())),
+        "nodes:relation_agent_fused": _async_case(loop, _sequential(fused_nodes, _relation_state)),
+        "graph:personality_agent": _async_case(
+            loop, lambda: personality_agent.personality_graph.ainvoke(_personality_state())),
+        "nodes:personality_agent": _async_case(loop, _sequential(personality_nodes, _personality_state)),
+    }
+
+
+NODE_COUNTS = {"chat_agent": 5, "match_agent": 3, "relation_agent": 3, "relation_agent_fused": 2, "personality_agent": 4}
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(filter_text: str | None = None, min_time: float = 0.3) -> dict:
+    _install()
+    warm_up()
+    loop = asyncio.new_event_loop()
+    try:
+        results = {
+            name: _measure(run_batch, min_time)
+            for name, run_batch in cases(loop).items()
+            if not filter_text or filter_text in name
+        }
+    finally:
+        loop.close()
+    return {
+        "meta": {"revision": _git_revision(), "python": platform.python_version(), "min_time": min_time},
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", help="只运行名称包含该子串的用例")
+    parser.add_argument("--min-time", type=float, default=0.3, help="每个用例的最短计时时长（秒）")
+    parser.add_argument("--output", help="把结果写入 JSON 文件，供 benchmarks.compare 对比")
+    args = parser.parse_args()
+
+    report = run(args.filter, args.min_time)
+    results = report["results"]
+
+    print(f"{'case':<42}{'ops/s':>14}{'peak KiB':>11}{'kept KiB':>11}")
+    for name, row in results.items():
+        print(f"{name:<42}{row['ops_per_sec']:>14,.1f}{row['peak_kib']:>11.2f}{row['retained_kib']:>11.3f}")
+
+    overheads = []
+    for graph, nodes in NODE_COUNTS.items():
+        g, n = results.get(f"graph:{graph}"), results.get(f"nodes:{graph}")
+        if g and n:
+            per_node = (1 / g["ops_per_sec"] - 1 / n["ops_per_sec"]) / nodes * 1e6
+            overheads.append(f"  {graph:<24}{per_node:>8.0f} µs/node")
+    if overheads:
+        print("\nLangGraph overhead (graph - direct node calls):")
+        print("\n".join(overheads))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""批量性格评分基准: score_answers_batch（NumPy）vs 逐个 score_attachment/score_communication
+
+另测接口端到端（JSON 解析与请求体校验 + 评分）的逐份写法 answers 与列式写法 columns；
+校验占端到端耗时的绝大部分，列式写法明显更快。
+
+    python -m benchmarks.personality_batch --users 200000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+
+from app.agents.personality_agent import (
+    score_answers_batch,
+    score_attachment,
+    score_columns_batch,
+    score_communication,
+)
+from app.api.routes import PersonalityBatchScoreRequest
+
+
+def _answers(users: int, seed: int = 7) -> list[dict]:
+    rng = random.Random(seed)
+    return [{f"q{i}": rng.randint(1, 5) for i in range(1, 21)} for _ in range(users)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200_000)
+    args = parser.parse_args()
+
+    answers = _answers(args.users)
+
+    started = time.perf_counter()
+    for a in answers:
+        score_attachment({"answers": a})
+        score_communication({"answers": a})
+    scalar = time.perf_counter() - started
+
+    started = time.perf_counter()
+    score_answers_batch(answers)
+    batch = time.perf_counter() - started
+
+    print(f"users: {args.users}")
+    print(f"scalar: {scalar:.3f}s  {args.users / scalar:>12,.0f} users/s")
+    print(f"batch:  {batch:.3f}s  {args.users / batch:>12,.0f} users/s  ({scalar / batch:.1f}x)")
+
+    rows = json.dumps({"answers": answers})
+    columns = json.dumps({"columns": {key: [a[key] for a in answers] for key in answers[0]}})
+    for label, body in (("answers", rows), ("columns", columns)):
+        started = time.perf_counter()
+        req = PersonalityBatchScoreRequest.model_validate_json(body)
+        if req.answers is not None:
+            score_answers_batch(req.answers)
+        else:
+            score_columns_batch(req.columns, args.users)
+        elapsed = time.perf_counter() - started
+        print(f"endpoint/{label}: {elapsed:.3f}s  {args.users / elapsed:>12,.0f} users/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""玩法方案目录基准: 实时生成 vs 目录轮换（stale-while-revalidate）
+
+按线上常见分布构造请求: 3 种玩法 × 4 个关系阶段，约 70% 为简短指令（其中「想去户外」「预算低」等
+带具体偏好的短指令不进目录、实时生成），其余为具体的长指令。
+分别在关闭与开启目录（先预热 generic 分桶）时顺序处理同一批请求，统计模型调用数与请求耗时；
+开启目录时再重复一轮，确认目录之外的指令不会触发额外的后台生成。
+
+    python -m benchmarks.play_catalog --requests 200
+    python -m benchmarks.play_catalog --requests 200 --time-scale 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.redis import mark_redis_down
+from app.services import play_catalog, play_service
+
+from .fake_llm import CallLedger, FakeLLM, RecordingLLM
+
+_PLANS = json.dumps({"plans": [
+    "方案A｜轻量破冰：周六下午在咖啡店见面，先各自分享一件最近的小开心，再沿河散步二十分钟。",
+    "方案B｜升温互动：一起逛一个小型展览，每人挑一件最像对方的作品并说明理由。",
+    "方案C｜雨天备选：室内桌游或手作体验，先玩一局轻松的合作游戏热身。",
+]}, ensure_ascii=False)
+
+_SHORT = ["", "随便", "推荐一下", "周末约会", "给点建议", "想去户外", "安静一点", "预算低"]
+_SPECIFIC = [
+    "她喜欢猫和手冲咖啡，周日下午有三个小时，希望安排在地铁二号线附近",
+    "我们异地，下周末我去她的城市两天，想安排一次不太累的行程",
+    "第一次见面有点紧张，对方说不喝酒，想找能自然聊天的地方",
+]
+
+
+def _requests(count: int, seed: int = 7) -> list[tuple[str, str, str]]:
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        instruction = rng.choice(_SHORT) if rng.random() < 0.7 else rng.choice(_SPECIFIC)
+        rows.append((rng.choice(play_catalog.DEFAULT_MODES), rng.choice(play_catalog.RELATION_STAGES), instruction))
+    return rows
+
+
+async def _run(rows: list[tuple[str, str, str]], ledger: CallLedger) -> dict:
+    ledger.reset()
+    latencies = []
+    for mode, stage, instruction in rows:
+        started = time.perf_counter()
+        await play_service.generate_play_plans(mode, instruction, stage)
+        latencies.append(time.perf_counter() - started)
+    # 等待后台补齐/刷新完成，计入模型调用
+    await asyncio.gather(*list(play_catalog._refreshing.values()))
+    latencies.sort()
+    return {
+        "llm_calls": ledger.totals()["calls"],
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--time-scale", type=float, default=0.02, help="FakeLLM 延迟缩放系数")
+    args = parser.parse_args()
+
+    mark_redis_down()
+    ledger = CallLedger()
+    fake = FakeLLM("deepseek-chat", lambda _: _PLANS, time_scale=args.time_scale)
+    play_service.get_chat_llm = lambda: RecordingLLM(fake, ledger, "deepseek-chat")
+    settings = get_settings()
+    rows = _requests(args.requests)
+
+    settings.play_catalog_enabled = False
+    live = await _run(rows, ledger)
+
+    settings.play_catalog_enabled = True
+    ledger.reset()
+    warm = await play_catalog.warmup(list(play_catalog.DEFAULT_MODES), list(play_catalog.RELATION_STAGES))
+    warmup_calls = ledger.totals()["calls"]
+    before = metrics.snapshot()["counters"]
+    catalog = await _run(rows, ledger)
+    after = metrics.snapshot()["counters"]
+    served = after.get("play.catalog.served", 0) - before.get("play.catalog.served", 0)
+    # 第二轮: 目录条目不变，模型调用应与首轮相同
+    steady = await _run(rows, ledger)
+    steady_served = metrics.snapshot()["counters"].get("play.catalog.served", 0) - after.get("play.catalog.served", 0)
+
+    print(f"{args.requests} 个请求，预热 {warm['refreshed']} 个条目共 {warmup_calls} 次模型调用\n")
+    print(f"{'mode':<10}{'llm calls':>11}{'p50 ms':>10}{'p95 ms':>10}")
+    for label, row in (("live", live), ("catalog", catalog), ("steady", steady)):
+        print(f"{label:<10}{row['llm_calls']:>11}{row['p50'] * 1000:>10.1f}{row['p95'] * 1000:>10.1f}")
+    print(f"\n目录命中: 首轮 {served / args.requests:.0%}，第二轮 {steady_served / args.requests:.0%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
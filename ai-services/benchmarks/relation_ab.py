@@ -0,0 +1,148 @@
+"""Relation Agent A/B 基准: staged（三步图）vs fused（单次 R1 + 建议）
+
+默认使用进程内 FakeLLM，按提示词与输出长度模拟延迟，结果可复现；
+加 --live 则调用真实 DeepSeek（需配置 DEEPSEEK_API_KEY），token 数取自
+接口返回的 usage。
+
+    python -m benchmarks.relation_ab --runs 5
+    python -m benchmarks.relation_ab --runs 5 --structured
+    python -m benchmarks.relation_ab --runs 3 --live
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.agents import relation_agent
+from app.core.graphs import warm_up
+from app.core.llm import get_chat_llm, get_reasoner_llm
+
+from .fake_llm import CallLedger, FakeLLM, RecordingLLM
+
+USER_PROFILE = {"attachmentType": "SECURE", "communicationStyle": "DIRECT", "personalityTags": ["开放探索", "高共情力"]}
+PARTNER_PROFILE = {"attachmentType": "ANXIOUS", "communicationStyle": "EMOTIONAL", "personalityTags": ["深度社交"]}
+HISTORY = "\n".join(
+    f"第{day}天: 双方聊了{10 + day}条消息，话题包括工作、电影和周末计划，对方回复及时，偶尔分享自拍。"
+    for day in range(1, 31)
+)
+
+
+def _messages() -> list[dict]:
+    """与 HISTORY 同等规模的结构化消息: 30 天、每天 11-40 条"""
+    start = datetime(2026, 1, 1, 20, tzinfo=timezone.utc)
+    messages = []
+    for day in range(1, 31):
+        for i in range(10 + day):
+            messages.append({
+                "sender": "user" if i % 2 == 0 else "partner",
+                "content": "今天工作好累，你周末有什么计划吗？" if i % 3 == 0 else "哈哈我也是😂 想去看那部新电影",
+                "timestamp": start + timedelta(days=day, minutes=i * 3),
+            })
+    return messages
+
+
+_STAGE = {
+    "recommended_stage": "GETTING_TO_KNOW",
+    "confidence": 0.8,
+    "reasoning": "双方保持每日对话并开始分享个人生活，已超出初识阶段，但尚无线下见面。",
+    "signals": ["每日持续对话", "分享个人话题", "回复及时"],
+}
+_PROGRESS = {
+    "progress_score": 72,
+    "dimensions": {
+        "communication": {"score": 78, "note": "对话频繁且有来有回"},
+        "emotional_investment": {"score": 70, "note": "开始表达关心"},
+        "boundary_respect": {"score": 80, "note": "节奏舒适"},
+        "trend": {"score": 65, "note": "稳定上升"},
+    },
+    "summary": "关系稳步升温，可以尝试线下见面。",
+}
+
+
+def _respond(prompt: str) -> str:
+    if '"stage_assessment"' in prompt:
+        return json.dumps({"stage_assessment": _STAGE, "progress_evaluation": _PROGRESS}, ensure_ascii=False)
+    if "推理判断两人当前真实的关系阶段" in prompt:
+        return json.dumps(_STAGE, ensure_ascii=False)
+    if "进展健康度" in prompt:
+        return json.dumps(_PROGRESS, ensure_ascii=False)
+    return (
+        "约一次周末下午的咖啡见面，时间控制在一小时内\n"
+        "主动分享一件最近让你开心的小事\n"
+        "聊天时多问开放式问题\n"
+        "===\n" + "你们的关系正在稳步升温。" * 20
+    )
+
+
+def _install(ledger: CallLedger, live: bool, time_scale: float) -> None:
+    if live:
+        chat, reasoner = get_chat_llm(), get_reasoner_llm()
+    else:
+        chat = FakeLLM("deepseek-chat", _respond, first_token_latency=0.4, decode_per_token=0.015, time_scale=time_scale)
+        reasoner = FakeLLM("deepseek-reasoner", _respond, first_token_latency=3.0, decode_per_token=0.03, time_scale=time_scale)
+    relation_agent.get_chat_llm = lambda: RecordingLLM(chat, ledger, "deepseek-chat")
+    relation_agent.get_reasoner_llm = lambda node=None: RecordingLLM(reasoner, ledger, "deepseek-reasoner")
+
+
+async def _bench(mode: str, runs: int, ledger: CallLedger, structured: bool) -> dict:
+    messages = _messages() if structured else None
+    latencies, tokens_in, tokens_out, calls = [], [], [], []
+    for _ in range(runs):
+        ledger.reset()
+        started = time.perf_counter()
+        await relation_agent.run_relation_agent(
+            user_profile=USER_PROFILE,
+            partner_profile=PARTNER_PROFILE,
+            current_stage="INITIAL",
+            interaction_history="" if structured else HISTORY,
+            mode=mode,
+            interaction_messages=messages,
+        )
+        latencies.append(time.perf_counter() - started)
+        totals = ledger.totals()
+        tokens_in.append(totals["input_tokens"])
+        tokens_out.append(totals["output_tokens"])
+        calls.append(totals["calls"])
+    return {
+        "mode": mode,
+        "latency_p50": statistics.median(latencies),
+        "latency_max": max(latencies),
+        "input_tokens": statistics.mean(tokens_in),
+        "output_tokens": statistics.mean(tokens_out),
+        "llm_calls": statistics.mean(calls),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--live", action="store_true", help="调用真实 DeepSeek 接口")
+    parser.add_argument("--structured", action="store_true", help="以结构化消息+量化特征代替文本历史")
+    parser.add_argument("--time-scale", type=float, default=0.1, help="FakeLLM 延迟缩放系数，0 表示不等待")
+    args = parser.parse_args()
+
+    ledger = CallLedger()
+    _install(ledger, args.live, args.time_scale)
+    warm_up()
+    rows = [await _bench(mode, args.runs, ledger, args.structured) for mode in relation_agent.RELATION_AGENT_MODES]
+
+    print(f"{'mode':<8}{'p50(s)':>10}{'max(s)':>10}{'calls':>8}{'in_tok':>10}{'out_tok':>10}")
+    for row in rows:
+        print(
+            f"{row['mode']:<8}{row['latency_p50']:>10.3f}{row['latency_max']:>10.3f}"
+            f"{row['llm_calls']:>8.1f}{row['input_tokens']:>10.0f}{row['output_tokens']:>10.0f}"
+        )
+    staged, fused = rows
+    print(
+        f"\nfused vs staged: latency {fused['latency_p50'] / staged['latency_p50'] - 1:+.1%}, "
+        f"input tokens {fused['input_tokens'] / staged['input_tokens'] - 1:+.1%}"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
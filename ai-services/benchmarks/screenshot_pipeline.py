@@ -0,0 +1,125 @@
+"""截图分析管线基准: 下载 + 解码缩放 + 内容哈希缓存 + 并发合并 + 限制
+
+启动本地替身源站（benchmarks.image_server），视觉模型用 FakeLLM 替代，输出:
+首次分析 / 缓存命中的耗时、并发相同截图的实际模型调用数、解码期间事件循环的最大卡顿，
+以及超大、无长度分块、超时、非图片响应各自被拒绝的耗时与原因。
+
+    python -m benchmarks.screenshot_pipeline
+    python -m benchmarks.screenshot_pipeline --size 1170x2532 --concurrency 16
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.fetch import close_http_client
+from app.core.redis import mark_redis_down
+from app.services import screenshot_service
+
+from .fake_llm import CallLedger, FakeLLM, RecordingLLM
+from .image_server import render_chat, serve_in_thread
+
+
+class _LoopLag:
+    """后台任务每 5ms 醒来一次，记录事件循环的最大延迟"""
+
+    def __init__(self):
+        self.max_lag = 0.0
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            self.max_lag = max(self.max_lag, time.perf_counter() - started - 0.005)
+
+    def __enter__(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+async def _timed(coro) -> tuple[float, object]:
+    started = time.perf_counter()
+    try:
+        result = await coro
+    except screenshot_service.ScreenshotError as exc:
+        result = exc
+    return time.perf_counter() - started, result
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="1170x2532", help="截图尺寸 WxH")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.size.split("x"))
+
+    server, base = serve_in_thread()
+    settings = get_settings()
+    settings.vision_model = "fake-vision"
+    settings.screenshot_fetch_timeout_seconds = 1.0
+    settings.fetch_allow_private_networks = True
+    mark_redis_down()
+    ledger = CallLedger()
+    # 提示词中的 base64 图片不计入预填充延迟
+    fake = FakeLLM("fake-vision", lambda _: "双方沟通积极，氛围轻松。", first_token_latency=0.3, prefill_per_token=0.0)
+    screenshot_service.get_vision_llm = lambda: RecordingLLM(fake, ledger, "fake-vision")
+
+    # 源站预先生成所有截图，计时只包含下载与处理
+    for fmt in ("png", "jpg"):
+        for run in range(args.runs):
+            render_chat(width, height, 1000 + run, fmt)
+    render_chat(width, height, 42, "png")
+
+    try:
+        rows = []
+        for fmt in ("png", "jpg"):
+            cold, warm, lags = [], [], []
+            for run in range(args.runs):
+                url = f"{base}/chat.{fmt}?w={width}&h={height}&seed={1000 + run}"
+                with _LoopLag() as lag:
+                    cold.append((await _timed(screenshot_service.analyze_screenshot(url)))[0])
+                lags.append(lag.max_lag)
+                warm.append((await _timed(screenshot_service.analyze_screenshot(url)))[0])
+            rows.append((fmt, statistics.median(cold), statistics.median(warm), max(lags)))
+
+        print(f"截图 {width}x{height}，视觉模型 FakeLLM 首包 0.3s\n")
+        print(f"{'format':<8}{'first s':>10}{'cached s':>11}{'max loop lag ms':>18}")
+        for fmt, cold_s, warm_s, lag in rows:
+            print(f"{fmt:<8}{cold_s:>10.3f}{warm_s:>11.4f}{lag * 1000:>18.1f}")
+
+        ledger.reset()
+        url = f"{base}/chat.png?w={width}&h={height}&seed=42"
+        await asyncio.gather(*(screenshot_service.analyze_screenshot(url) for _ in range(args.concurrency)))
+        print(f"\n{args.concurrency} 个并发的相同截图 → 模型调用 {ledger.totals()['calls']} 次")
+
+        print(f"\n{'rejected':<34}{'seconds':>9}  reason")
+        for label, path in (
+            ("huge.bin (Content-Length 20 MiB)", "/huge.bin?mb=20"),
+            ("chunked.bin (无长度 20 MiB)", "/chunked.bin?mb=20"),
+            ("slow.png (5s 后才响应)", "/slow.png?delay=5"),
+            ("page.html", "/page.html"),
+        ):
+            seconds, result = await _timed(screenshot_service.analyze_screenshot(base + path))
+            print(f"{label:<34}{seconds:>9.3f}  {result}")
+
+        counters = metrics.snapshot()["counters"]
+        print(f"\n下载字节数 {counters.get('fetch.screenshot.bytes', 0):,.0f}，"
+              f"缓存命中 {counters.get('screenshot.cache_hits', 0):.0f}，合并 {counters.get('screenshot.coalesced', 0):.0f}")
+    finally:
+        await close_http_client()
+        screenshot_service.shutdown_executor()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,154 @@
+"""近重复语义缓存基准: 命中率、节省的模型调用、误命中率与查询开销
+
+生成若干段聊天上下文，每段之后陆续出现它的变体:
+- 近重复（应命中）: 多余空白、增删/更换表情、加一个语气词、换标点
+- 实质变化（不应命中）: 最后一条消息换成另一种情绪、新增一条消息
+对每个请求运行 Chat Agent 的 recognize_emotion 与 select_strategy 节点，分别在关闭 / 开启缓存时统计模型调用数，
+开启时以抽检比例 1.0 重新调用模型比较，得到误命中率。FakeLLM 按最后一条消息的关键词和表情给出情绪，
+因此把 😂 换成 😭 这类变体会产生真实的误命中。
+
+    python -m benchmarks.semantic_cache
+    python -m benchmarks.semantic_cache --contexts 100 --threshold 0.8
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+
+from app.agents import chat_agent
+from app.core import metrics
+from app.core.config import get_settings
+from app.core.redis import mark_redis_down
+
+from .fake_llm import CallLedger, FakeLLM, RecordingLLM
+from .relation_ab import PARTNER_PROFILE, USER_PROFILE
+
+_HISTORY = [
+    "她: 今天降温了，出门记得多穿点", "我: 收到，你也是", "她: 你周末一般做什么？", "我: 爬山或者在家看电影",
+    "她: 我最近在学做饭", "我: 厉害，做了什么？", "她: 番茄炒蛋，差点糊了", "我: 第一次已经很好了",
+    "她: 下周要去出差三天", "我: 去哪里呀", "她: 杭州，顺便看看西湖", "我: 记得拍照给我看",
+]
+_LATEST = {
+    "sad": ["她: 今天加班到好晚，好累", "她: 项目又被打回来了，有点难过"],
+    "happy": ["她: 你推荐的那家店我去了，超好吃", "她: 今天终于拿到offer了，好开心"],
+    "angry": ["她: 地铁上被人挤了一路，好烦", "她: 快递又被放错地方了，真的很烦"],
+    "anxious": ["她: 明天要面试，有点担心", "她: 体检报告还没出来，好担心"],
+}
+_KEYWORDS = {"累": "sad", "难过": "sad", "好吃": "happy", "开心": "happy", "烦": "angry", "担心": "anxious"}
+_EMOJIS = ["😂", "😭", "🙂", "😤"]
+_PROFILES = [
+    USER_PROFILE,
+    PARTNER_PROFILE,
+    {"attachmentType": "AVOIDANT", "communicationStyle": "ANALYTICAL", "personalityTags": ["条理清晰"]},
+]
+
+
+def _respond(prompt: str) -> str:
+    if "情绪分析专家" in prompt:
+        text = prompt.split("：\n\n", 1)[1].split("\n\n返回格式", 1)[0]
+        latest = text.strip().splitlines()[-1]
+        emotion = "sad" if "😭" in latest else next((e for k, e in _KEYWORDS.items() if k in latest), "neutral")
+        return json.dumps({"emotion": emotion, "confidence": 0.8})
+    emotion = prompt.split("对方情绪: ", 1)[1].split("\n", 1)[0]
+    return chat_agent.lookup_strategy("GETTING_TO_KNOW", emotion)
+
+
+def _near_duplicate(context: str, rng: random.Random) -> str:
+    lines = context.splitlines()
+    kind = rng.choice(["space", "emoji", "filler", "punct"])
+    i = rng.randrange(len(lines))
+    if kind == "space":
+        lines[i] = lines[i].replace(": ", ":  ") + " "
+    elif kind == "emoji":
+        lines[-1] = lines[-1].rstrip("".join(_EMOJIS)) + rng.choice(_EMOJIS)
+    elif kind == "filler":
+        lines[i] = lines[i] + rng.choice(["啊", "呢", "嘛", "哦"])
+    else:
+        lines[i] = lines[i] + rng.choice(["。", "！", "~", "…"])
+    return "\n".join(lines)
+
+
+def _workload(contexts: int, variants: int, seed: int = 7) -> list[tuple[str, dict, bool]]:
+    """返回 (上下文, 画像, 是否为近重复) 序列；各段上下文的请求交错出现"""
+    rng = random.Random(seed)
+    streams = []
+    for c in range(contexts):
+        history = rng.sample(_HISTORY, 6)
+        emotion = rng.choice(list(_LATEST))
+        base = "\n".join([*history, rng.choice(_LATEST[emotion])])
+        profile = _PROFILES[c % len(_PROFILES)]
+        stream = [(base, profile, False)]
+        for _ in range(variants):
+            roll = rng.random()
+            if roll < 0.7:
+                stream.append((_near_duplicate(base, rng), profile, True))
+            elif roll < 0.85:
+                other = rng.choice([e for e in _LATEST if e != emotion])
+                stream.append(("\n".join([*history, rng.choice(_LATEST[other])]), profile, False))
+            else:
+                stream.append(("\n".join([*history[1:], rng.choice(_LATEST[emotion]), "她: 对了，你晚饭吃了吗"]), profile, False))
+        streams.append(stream)
+    order = [c for c, stream in enumerate(streams) for _ in stream]
+    rng.shuffle(order)
+    cursors = [0] * contexts
+    requests = []
+    for c in order:
+        requests.append(streams[c][cursors[c]])
+        cursors[c] += 1
+    return requests
+
+
+async def _run(requests, ledger: CallLedger) -> dict:
+    ledger.reset()
+    for context, profile, _ in requests:
+        state = {"context": context, "user_profile": profile, "relationship_stage": "GETTING_TO_KNOW"}
+        state.update(await chat_agent.recognize_emotion(state))
+        await chat_agent.select_strategy(state)
+    await asyncio.gather(*(task for cache in (*chat_agent._emotion_caches.values(), chat_agent._strategy_cache)
+                           for task in list(cache._audits)))
+    return {"calls": ledger.totals()["calls"]}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contexts", type=int, default=60)
+    parser.add_argument("--variants", type=int, default=6, help="每段上下文之后的变体请求数")
+    parser.add_argument("--threshold", type=float, default=None, help="SEMANTIC_CACHE_THRESHOLD")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    if args.threshold is not None:
+        settings.semantic_cache_threshold = args.threshold
+    mark_redis_down()
+    ledger = CallLedger()
+    fake = FakeLLM("deepseek-chat", _respond, time_scale=0)
+    chat_agent.get_chat_llm = lambda: RecordingLLM(fake, ledger, "deepseek-chat")
+
+    requests = _workload(args.contexts, args.variants)
+    near = sum(1 for *_, dup in requests if dup)
+
+    settings.semantic_cache_enabled = False
+    baseline = await _run(requests, ledger)
+    settings.semantic_cache_enabled = True
+    settings.semantic_cache_audit_rate = 1.0
+    cached = await _run(requests, ledger)
+    # 抽检的重新调用不计入节省
+    audits = metrics.snapshot()["counters"].get("semantic.audited", 0)
+
+    print(f"{len(requests)} 个请求（{near} 个近重复），阈值 {settings.semantic_cache_threshold}\n")
+    print(f"{'node':<20}{'hit rate':>10}{'false hits':>12}{'lookup ms':>11}")
+    timings = metrics.snapshot()["timings"]
+    for node in ("recognize_emotion", "select_strategy"):
+        audited = metrics.snapshot()["counters"].get(f"semantic.{node}.audited", 0)
+        false_hits = metrics.snapshot()["counters"].get(f"semantic.{node}.false_hits", 0)
+        print(f"{node:<20}{metrics.ratio(f'semantic.{node}.hits', f'semantic.{node}.lookups'):>10.0%}"
+              f"{false_hits / audited if audited else 0:>12.1%}{timings[f'semantic.{node}.lookup']['avg'] * 1000:>11.2f}")
+    served = cached["calls"] - audits
+    print(f"\n模型调用: 无缓存 {baseline['calls']}，有缓存 {served:.0f}（-{1 - served / baseline['calls']:.0%}，不含抽检调用）")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""服务吞吐基准: 对比单进程 uvicorn 与 gunicorn 生产配置
+
+在子进程中启动服务，用 httpx 并发压测不调用 LLM 的接口，输出 req/s 与
+每 worker（每核）吞吐。压测端与服务同机运行，核数较少时结果偏保守。
+
+    python -m benchmarks.server_throughput --profile uvicorn
+    python -m benchmarks.server_throughput --profile gunicorn --workers 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+PORT = 8765
+ENDPOINTS = {
+    "health": ("GET", "/api/v1/health", None),
+    "score_batch": (
+        "POST",
+        "/api/v1/personality/score/batch",
+        {"answers": [{f"q{i}": random.Random(n).randint(1, 5) for i in range(1, 21)} for n in range(100)]},
+    ),
+}
+
+
+def _start(profile: str, workers: int) -> subprocess.Popen:
+    if profile == "uvicorn":
+        cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT), "--log-level", "warning"]
+        env = os.environ
+    else:
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app"]
+        env = {**os.environ, "BIND": f"127.0.0.1:{PORT}", "WEB_CONCURRENCY": str(workers), "LOG_LEVEL": "warning"}
+    return subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def _wait_ready(client: httpx.AsyncClient, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/api/v1/health")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+async def _load(client: httpx.AsyncClient, endpoint: str, concurrency: int, duration: float) -> tuple[int, int]:
+    method, path, body = ENDPOINTS[endpoint]
+    deadline = time.monotonic() + duration
+    ok = errors = 0
+
+    async def _worker() -> None:
+        nonlocal ok, errors
+        while time.monotonic() < deadline:
+            try:
+                resp = await client.request(method, path, json=body)
+                if resp.status_code == 200:
+                    ok += 1
+                else:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+
+    await asyncio.gather(*(_worker() for _ in range(concurrency)))
+    return ok, errors
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=["uvicorn", "gunicorn"], default="gunicorn")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    workers = 1 if args.profile == "uvicorn" else args.workers
+    proc = _start(args.profile, workers)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=30) as client:
+            await _wait_ready(client)
+            print(f"profile={args.profile} workers={workers} concurrency={args.concurrency} cpus={os.cpu_count()}")
+            for endpoint in ENDPOINTS:
+                await _load(client, endpoint, args.concurrency, 1.0)  # 预热
+                ok, errors = await _load(client, endpoint, args.concurrency, args.duration)
+                rps = ok / args.duration
+                print(f"{endpoint:<12}{rps:>10.0f} req/s{rps / workers:>10.0f} req/s/worker  errors={errors}")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
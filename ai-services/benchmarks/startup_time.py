@@ -0,0 +1,63 @@
+"""冷启动基准: 用 python -X importtime 统计导入 app.main 的耗时分布
+
+分别测量: 导入 app.main（服务开始监听前的开销）、warm_up()（编译全部 Agent 图）。
+每次都在全新子进程中进行，取多次运行的中位数。
+
+    python -m benchmarks.startup_time --runs 5 --top 15
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+_WARMUP_SNIPPET = (
+    "import time; import app.main; from app.core.graphs import warm_up; "
+    "s = time.perf_counter(); warm_up(); print(time.perf_counter() - s)"
+)
+
+
+def _importtime() -> dict[str, int]:
+    """返回 {模块: 累计导入微秒}"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True, check=True,
+    )
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            cumulative[match.group(4)] = int(match.group(2))
+    return cumulative
+
+
+def _warmup_seconds() -> float:
+    proc = subprocess.run([sys.executable, "-c", _WARMUP_SNIPPET], capture_output=True, text=True, check=True)
+    return float(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    samples = [_importtime() for _ in range(args.runs)]
+    totals = [s.get("app.main", 0) / 1e6 for s in samples]
+    warmups = [_warmup_seconds() for _ in range(args.runs)]
+
+    print(f"import app.main: {statistics.median(totals):.3f}s (median of {args.runs})")
+    print(f"warm_up():       {statistics.median(warmups):.3f}s (langchain_openai + langgraph 导入与图编译)")
+    print(f"\ntop {args.top} modules by cumulative import time:")
+    last = samples[-1]
+    for module, micros in sorted(last.items(), key=lambda kv: kv[1], reverse=True)[1:args.top + 1]:
+        print(f"  {micros / 1000:>8.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
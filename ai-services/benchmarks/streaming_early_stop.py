@@ -0,0 +1,119 @@
+"""流式提前终止基准: 完整生成后切分 vs 流式解析够数即断开
+
+FakeLLM 模拟模型在所需条数之后继续输出（多余的回复/方案、结尾说明），
+分别统计两种方式实际生成的输出 token 与节点耗时。
+
+    python -m benchmarks.streaming_early_stop --runs 5
+    python -m benchmarks.streaming_early_stop --runs 5 --time-scale 0
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.agents import chat_agent, relation_agent
+from app.services import play_service
+
+from .fake_llm import CallLedger, FakeLLM, RecordingLLM
+from .relation_ab import PARTNER_PROFILE, USER_PROFILE
+
+_REPLIES = "\n".join([
+    "辛苦啦，今天早点休息，周末我请你喝奶茶放松一下",
+    "加班到这么晚，晚饭有没有好好吃呀？",
+    "要不要听我讲个今天遇到的小趣事，给你解解压",
+    "累的时候就别硬撑啦，有我陪你聊会儿天",
+    "明天会好一点的，先好好睡一觉吧",
+    "如果你愿意，也可以跟我吐槽一下今天的事",
+    "以上回复都保持了轻松关心的语气，既表达了体贴，又不会给对方压力，适合当前的关系阶段。",
+    "你也可以根据对方的回复继续追问细节，让对话自然延续下去。",
+])
+_PLANS = json.dumps({"plans": [
+    "方案A｜轻量破冰：周六下午在咖啡店见面，先各自分享一件最近的小开心，再沿河散步二十分钟，预算 50-120 元。",
+    "方案B｜升温互动：一起逛一个小型展览，每人挑一件最像对方的作品并说明理由，结束后找一家安静的小馆吃晚餐复盘。",
+    "方案C｜雨天备选：室内桌游或手作体验，先玩一局轻松的合作游戏热身，再一起完成一件小作品作为纪念。",
+    "方案D｜夜间散步：晚饭后在城市步道散步，聊聊各自小时候最难忘的一次旅行。",
+    "方案E｜线上共创：一起做一份周末歌单，每人轮流加歌并写一句推荐语。",
+]}, ensure_ascii=False) + "\n\n以上方案都控制在两小时以内，节奏轻松，适合初识阶段的你们，可以根据天气和对方的兴趣灵活选择。"
+
+
+def _respond(prompt: str) -> str:
+    if "生成3条自然" in prompt:
+        return _REPLIES
+    if "互动玩法策划助手" in prompt:
+        return _PLANS
+    return (
+        "约一次周末下午的咖啡见面，时间控制在一小时内\n"
+        "主动分享一件最近让你开心的小事\n"
+        "聊天时多问开放式问题\n"
+        "===\n" + "你们的关系正在稳步升温。" * 20
+    )
+
+
+def _split_lines(text: str, limit: int) -> list[str]:
+    return [line.strip() for line in text.split("\n") if line.strip()][:limit]
+
+
+async def _baseline(llm, prompt_marker: str) -> None:
+    """改造前: 等待完整输出后再切分"""
+    from langchain_core.messages import HumanMessage
+    resp = await llm.ainvoke([HumanMessage(content=prompt_marker)])
+    _split_lines(resp.content, 5)
+
+
+async def _bench(name: str, runs: int, ledger: CallLedger, baseline, streamed) -> dict:
+    rows = {}
+    for label, fn in (("full", baseline), ("stream", streamed)):
+        latencies, tokens = [], []
+        for _ in range(runs):
+            ledger.reset()
+            started = time.perf_counter()
+            await fn()
+            latencies.append(time.perf_counter() - started)
+            tokens.append(ledger.totals()["output_tokens"])
+        rows[label] = (statistics.median(latencies), statistics.mean(tokens))
+    return {"case": name, **rows}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--time-scale", type=float, default=0.1, help="FakeLLM 延迟缩放系数，0 表示不等待")
+    args = parser.parse_args()
+
+    ledger = CallLedger()
+    fake = FakeLLM("deepseek-chat", _respond, first_token_latency=0.4, decode_per_token=0.015, time_scale=args.time_scale)
+    llm = RecordingLLM(fake, ledger, "deepseek-chat")
+    chat_agent.get_chat_llm = lambda: llm
+    relation_agent.get_chat_llm = lambda: llm
+    play_service.get_chat_llm = lambda: llm
+
+    chat_state = {"strategy": "真诚关心", "enriched_context": "她: 今天加班到好晚"}
+    relation_state = {
+        "recommended_stage": "GETTING_TO_KNOW", "progress_score": 72, "stage_assessment": {},
+        "progress_evaluation": "进展稳定", "user_profile": USER_PROFILE, "partner_profile": PARTNER_PROFILE,
+    }
+    cases = [
+        ("chat.generate_replies", lambda: _baseline(llm, "生成3条自然"),
+         lambda: chat_agent.generate_replies(chat_state)),
+        ("play.generate_plan_set", lambda: _baseline(llm, "互动玩法策划助手"),
+         lambda: play_service.generate_plan_set("date-planner", "周末约会", "INITIAL", USER_PROFILE)),
+        ("relation.generate_advice", lambda: _baseline(llm, "==="),
+         lambda: relation_agent.generate_advice(relation_state)),
+    ]
+    results = [await _bench(name, args.runs, ledger, baseline, streamed) for name, baseline, streamed in cases]
+
+    print(f"{'case':<28}{'full tok':>10}{'stream tok':>12}{'saved':>9}{'full s':>9}{'stream s':>10}")
+    for row in results:
+        (full_s, full_tok), (stream_s, stream_tok) = row["full"], row["stream"]
+        print(
+            f"{row['case']:<28}{full_tok:>10.0f}{stream_tok:>12.0f}{1 - stream_tok / full_tok:>9.0%}"
+            f"{full_s:>9.3f}{stream_s:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,35 @@
+"""生产启动配置: gunicorn 管理多个 Uvicorn worker
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+preload_app 让主进程先导入应用并编译各 Agent 图，fork 出的 worker 以写时复制
+方式共享这些只读对象；max_requests 定期回收 worker，防止内存缓慢增长。
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "app.core.server.ProductionUvicornWorker"
+preload_app = True
+
+# 单次 R1 推理可能超过一分钟，超时需留足余量
+timeout = int(os.getenv("WORKER_TIMEOUT", 180))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("KEEPALIVE", 5))
+
+max_requests = int(os.getenv("MAX_REQUESTS", 5000))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", 500))
+
+accesslog = os.getenv("ACCESS_LOG") or None
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    """preload 后、fork 前在主进程编译全部 Agent 图，worker 直接继承已预热的状态"""
+    if preload_app:
+        from app.core.graphs import warm_up
+
+        warm_up()
@@ -2,30 +2,47 @@ import { Controller, Post, Body, UseGuards } from '@nestjs/common';
 import { ApiTags, ApiOperation, ApiBearerAuth } from '@nestjs/swagger';
 import { AiService } from './ai.service';
 import { JwtAuthGuard } from '../../common/guards/jwt-auth.guard';
+import { CurrentUser } from '../../common/decorators/current-user.decorator';
+import { ChatService } from '../chat/chat.service';
 
 @ApiTags('AI')
 @Controller('ai')
 @UseGuards(JwtAuthGuard)
 @ApiBearerAuth()
 export class AiController {
-  constructor(private aiService: AiService) {}
+  constructor(
+    private aiService: AiService,
+    private chatService: ChatService,
+  ) {}
 
   @Post('chat-suggestions')
   @ApiOperation({
     summary: 'Chat Agent — 情绪识别→策略选择→回复生成→安全过滤',
   })
-  getChatSuggestions(
+  async getChatSuggestions(
+    @CurrentUser('id') userId: string,
     @Body()
     body: {
       context: string;
       userProfile?: any;
       relationshipStage?: string;
+      conversationId?: string;
+      lastMessageId?: string;
     },
   ) {
+    // 预生成建议按会话保存，先确认当前用户属于该会话
+    if (body.conversationId) {
+      await this.chatService.assertConversationMember(
+        body.conversationId,
+        userId,
+      );
+    }
     return this.aiService.getChatSuggestions(
       body.context,
       body.userProfile || {},
       body.relationshipStage || 'INITIAL',
+      userId,
+      { conversationId: body.conversationId, lastMessageId: body.lastMessageId },
     );
   }
 
@@ -34,6 +51,7 @@ export class AiController {
     summary: 'Play Planner — 按关系阶段生成可执行玩法方案',
   })
   getPlayPlans(
+    @CurrentUser('id') userId: string,
     @Body()
     body: {
       mode: string;
@@ -47,6 +65,7 @@ export class AiController {
       body.instruction,
       body.relationshipStage || 'INITIAL',
       body.userProfile || {},
+      userId,
     );
   }
 
@@ -55,13 +74,18 @@ export class AiController {
     summary: 'Match Agent — 画像分析→兼容性评估(R1)→匹配理由',
   })
   analyzeMatch(
+    @CurrentUser('id') userId: string,
     @Body()
     body: {
       userAProfile: any;
       userBProfile: any;
     },
   ) {
-    return this.aiService.analyzeMatch(body.userAProfile, body.userBProfile);
+    return this.aiService.analyzeMatch(
+      body.userAProfile,
+      body.userBProfile,
+      userId,
+    );
   }
 
   @Post('relation-analysis')
@@ -69,12 +93,14 @@ export class AiController {
     summary: 'Relation Agent — 阶段判断(R1)→进展评估→建议生成',
   })
   analyzeRelation(
+    @CurrentUser('id') userId: string,
     @Body()
     body: {
       userProfile: any;
       partnerProfile: any;
       currentStage?: string;
       interactionHistory?: string;
+      relationshipId?: string;
     },
   ) {
     return this.aiService.analyzeRelation(
@@ -82,18 +108,26 @@ export class AiController {
       body.partnerProfile,
       body.currentStage || 'INITIAL',
       body.interactionHistory || '',
+      body.relationshipId,
+      userId,
     );
   }
 
   @Post('analyze-emotion')
   @ApiOperation({ summary: 'DeepSeek V3 情绪分析' })
-  analyzeEmotion(@Body() body: { text: string }) {
-    return this.aiService.analyzeEmotion(body.text);
+  analyzeEmotion(
+    @CurrentUser('id') userId: string,
+    @Body() body: { text: string },
+  ) {
+    return this.aiService.analyzeEmotion(body.text, userId);
   }
 
   @Post('analyze-screenshot')
   @ApiOperation({ summary: 'DeepSeek V3 聊天截图分析' })
-  analyzeScreenshot(@Body() body: { imageUrl: string }) {
-    return this.aiService.analyzeScreenshot(body.imageUrl);
+  analyzeScreenshot(
+    @CurrentUser('id') userId: string,
+    @Body() body: { imageUrl: string },
+  ) {
+    return this.aiService.analyzeScreenshot(body.imageUrl, userId);
   }
 }
@@ -1,8 +1,10 @@
 import { Module } from '@nestjs/common';
 import { AiController } from './ai.controller';
 import { AiService } from './ai.service';
+import { ChatModule } from '../chat/chat.module';
 
 @Module({
+  imports: [ChatModule],
   controllers: [AiController],
   providers: [AiService],
   exports: [AiService],
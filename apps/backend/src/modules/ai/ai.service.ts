@@ -13,6 +13,15 @@ export class AiService {
     );
   }
 
+  /** X-User-Id 供 AI 服务按用户限流，并隔离按用户保存的预生成建议 */
+  private headers(userId?: string): Record<string, string> {
+    const headers: Record<string, string> = {
+      'Content-Type': 'application/json',
+    };
+    if (userId) headers['X-User-Id'] = userId;
+    return headers;
+  }
+
   /**
    * Chat Agent: 情绪识别→上下文→策略→生成→安全过滤
    */
@@ -20,17 +29,21 @@ export class AiService {
     conversationContext: string,
     userProfile: any,
     relationshipStage: string,
+    userId?: string,
+    conversation?: { conversationId?: string; lastMessageId?: string },
   ) {
     try {
       const response = await fetch(
         `${this.aiServiceUrl}/api/v1/chat/suggestions`,
         {
           method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
+          headers: this.headers(userId),
           body: JSON.stringify({
             context: conversationContext,
             user_profile: userProfile,
             relationship_stage: relationshipStage,
+            conversation_id: conversation?.conversationId,
+            last_message_id: conversation?.lastMessageId,
           }),
         },
       );
@@ -47,16 +60,44 @@ export class AiService {
     }
   }
 
+  /**
+   * 会话收到新消息时通知 AI 服务为接收方预生成回复建议（不等待结果，失败忽略）；
+   * 预生成结果按用户隔离，userId 须为将要点开助手的一方
+   */
+  ingestChatMessage(
+    userId: string,
+    conversationId: string,
+    messageId: string,
+    conversationContext: string,
+    userProfile: any,
+    relationshipStage: string,
+  ) {
+    fetch(`${this.aiServiceUrl}/api/v1/chat/ingest`, {
+      method: 'POST',
+      headers: this.headers(userId),
+      body: JSON.stringify({
+        conversation_id: conversationId,
+        message_id: messageId,
+        context: conversationContext,
+        user_profile: userProfile,
+        relationship_stage: relationshipStage,
+      }),
+    }).catch(() => {
+      this.logger.debug('chat ingest failed');
+    });
+  }
+
   async getPlayPlans(
     mode: string,
     instruction: string,
     relationshipStage: string,
     userProfile: any,
+    userId?: string,
   ) {
     try {
       const response = await fetch(`${this.aiServiceUrl}/api/v1/play/plans`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: this.headers(userId),
         body: JSON.stringify({
           mode,
           instruction,
@@ -80,13 +121,13 @@ export class AiService {
   /**
    * Match Agent: 画像分析→兼容性评估(R1)→匹配理由
    */
-  async analyzeMatch(userAProfile: any, userBProfile: any) {
+  async analyzeMatch(userAProfile: any, userBProfile: any, userId?: string) {
     try {
       const response = await fetch(
         `${this.aiServiceUrl}/api/v1/match/analyze`,
         {
           method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
+          headers: this.headers(userId),
           body: JSON.stringify({
             user_a_profile: userAProfile,
             user_b_profile: userBProfile,
@@ -114,18 +155,21 @@ export class AiService {
     partnerProfile: any,
     currentStage: string,
     interactionHistory: string,
+    relationshipId?: string,
+    userId?: string,
   ) {
     try {
       const response = await fetch(
         `${this.aiServiceUrl}/api/v1/relation/analyze`,
         {
           method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
+          headers: this.headers(userId),
           body: JSON.stringify({
             user_profile: userProfile,
             partner_profile: partnerProfile,
             current_stage: currentStage,
             interaction_history: interactionHistory,
+            relationship_id: relationshipId,
           }),
         },
       );
@@ -142,13 +186,13 @@ export class AiService {
     }
   }
 
-  async analyzeEmotion(text: string) {
+  async analyzeEmotion(text: string, userId?: string) {
     try {
       const response = await fetch(
         `${this.aiServiceUrl}/api/v1/analysis/emotion`,
         {
           method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
+          headers: this.headers(userId),
           body: JSON.stringify({ text }),
         },
       );
@@ -160,13 +204,13 @@ export class AiService {
     }
   }
 
-  async analyzeScreenshot(imageUrl: string) {
+  async analyzeScreenshot(imageUrl: string, userId?: string) {
     try {
       const response = await fetch(
         `${this.aiServiceUrl}/api/v1/analysis/screenshot`,
         {
           method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
+          headers: this.headers(userId),
           body: JSON.stringify({ image_url: imageUrl }),
         },
       );
@@ -0,0 +1,40 @@
+import {
+  Body,
+  Controller,
+  Headers,
+  Param,
+  Post,
+  UnauthorizedException,
+} from '@nestjs/common';
+import { ApiExcludeController } from '@nestjs/swagger';
+import { timingSafeEqual } from 'crypto';
+import { UsersService } from './users.service';
+
+/**
+ * 服务间回调接口（AI 服务 → 后端），以共享令牌鉴权，不对客户端开放
+ */
+@ApiExcludeController()
+@Controller('internal/users')
+export class UsersInternalController {
+  constructor(private usersService: UsersService) {}
+
+  @Post(':id/personality-analysis')
+  receivePersonalityAnalysis(
+    @Param('id') userId: string,
+    @Headers('x-ai-callback-token') token: string | undefined,
+    @Body() body: Record<string, any>,
+  ) {
+    if (!this.isValidToken(token)) {
+      throw new UnauthorizedException('Invalid callback token');
+    }
+    return this.usersService.applyAiPersonalityResult(userId, body);
+  }
+
+  private isValidToken(token: string | undefined): boolean {
+    const expected = process.env.AI_CALLBACK_TOKEN;
+    if (!expected || !token) return false;
+    const a = Buffer.from(token);
+    const b = Buffer.from(expected);
+    return a.length === b.length && timingSafeEqual(a, b);
+  }
+}
@@ -502,34 +502,52 @@ export class UsersService {
     return localResult;
   }
 
+  /**
+   * 有回调令牌时使用两阶段模式：即时结果先落库，R1 深度分析完成后由 AI 服务回调
+   */
   private async callAiAnalysis(userId: string, answers: Record<string, any>) {
+    const callbackToken = process.env.AI_CALLBACK_TOKEN;
+    const body = callbackToken
+      ? {
+          answers,
+          mode: 'instant',
+          callback_user_id: userId,
+        }
+      : { answers };
+
     try {
       const resp = await fetch(`${AI_SERVICE_URL}/api/v1/personality/analyze`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ answers }),
+        body: JSON.stringify(body),
       });
 
       if (!resp.ok) return;
 
-      const aiResult = await resp.json();
-
-      await this.prisma.userProfile.update({
-        where: { userId },
-        data: {
-          attachmentType: aiResult.attachment_type,
-          communicationStyle: aiResult.communication_style,
-          personalityTags: JSON.stringify(aiResult.personality_tags || []),
-          aiSummary: aiResult.ai_summary || null,
-        },
-      });
-
-      this.logger.log(`AI personality analysis completed for user ${userId}`);
+      await this.applyAiPersonalityResult(userId, await resp.json());
     } catch {
       this.logger.warn(`AI service unreachable for personality analysis`);
     }
   }
 
+  async applyAiPersonalityResult(userId: string, aiResult: Record<string, any>) {
+    const pending = aiResult.summary_status === 'pending';
+    await this.prisma.userProfile.update({
+      where: { userId },
+      data: {
+        attachmentType: aiResult.attachment_type,
+        communicationStyle: aiResult.communication_style,
+        personalityTags: JSON.stringify(aiResult.personality_tags || []),
+        aiSummary: pending ? undefined : aiResult.ai_summary || null,
+      },
+    });
+
+    this.logger.log(
+      `AI personality analysis ${pending ? 'accepted' : 'completed'} for user ${userId}`,
+    );
+    return { ok: true };
+  }
+
   private calculatePersonalityResult(answers: Record<string, any>) {
     const anxietyKeys = ['q1', 'q2', 'q3', 'q4'];
     const avoidanceKeys = ['q5', 'q6', 'q7', 'q8'];